@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Measures pytsdl.parser.Parser.get_ast() on a TSDL document, or on a
+# synthetic one (made by tsdlgen.py): parsing time, memory retained by
+# the AST (bytes, as traced by tracemalloc), number of nodes, pickled
+# size (as sent by the workers building block ASTs), and the time of
+# its XML rendering (pytsdl.astxml):
+#
+#   ./bench_ast.py /path/to/metadata
+#   ./bench_ast.py --events 5000
+import argparse
+import collections
+import tracemalloc
+import pickle
+import time
+import gc
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+import pytsdl.astxml
+import tsdlgen
+
+
+def _best(fn, runs):
+    best = None
+
+    for i in range(runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Measure the AST of a document')
+    ap.add_argument('path', nargs='?', help='TSDL document')
+    ap.add_argument('-e', '--events', type=int, default=5000,
+                    help='number of events of the synthetic document')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs (best one is kept)')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+
+    if args.path is not None:
+        with open(args.path) as f:
+            tsdl = f.read()
+    else:
+        tsdl = tsdlgen.generate(events=args.events)
+
+    # get_ast() doesn't use the block cache
+    parser = pytsdl.parser.Parser()
+    elapsed = _best(lambda: parser.get_ast(tsdl), args.runs)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ast = parser.get_ast(tsdl)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    counts = collections.Counter()
+
+    for obj in gc.get_objects():
+        if isinstance(obj, pytsdl.parser.Node):
+            counts[type(obj).__name__] += 1
+
+    nodes = pytsdl.parser._count_nodes(ast)
+    pickled = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+    dump = _best(lambda: pickle.dumps(ast, pickle.HIGHEST_PROTOCOL), args.runs)
+    load = _best(lambda: pickle.loads(pickled), args.runs)
+    xml = _best(lambda: pytsdl.astxml.to_xml(ast), args.runs)
+
+    print('{} KiB of TSDL'.format(len(tsdl) // 1024))
+    print('get_ast: {:.1f} ms'.format(elapsed * 1000))
+    print('retained: {} KiB, {} nodes ({:.0f} bytes per node)'.format(retained // 1024,
+                                                                     nodes,
+                                                                     retained / nodes))
+    print('pickled: {} KiB (dump {:.1f} ms, load {:.1f} ms)'.format(len(pickled) // 1024,
+                                                                   dump * 1000,
+                                                                   load * 1000))
+    print('to_xml: {:.1f} ms'.format(xml * 1000))
+
+    for name, count in counts.most_common(10):
+        print('{:>20}: {}'.format(name, count))
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Measures Parser.parse() on the document of another session (same
+# document, but another trace UUID) without a block cache and with
+# the block cache of a parser which parsed the original document:
+#
+#   ./bench_block_cache.py /path/to/metadata
+import argparse
+import uuid
+import time
+import sys
+import os
+import re
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+
+
+_trace_uuid_re = re.compile(r'(\buuid\s*=\s*)"[^"]*"')
+
+
+# `tsdl` as if it described another trace
+def _other_session(tsdl):
+    return _trace_uuid_re.sub(r'\1"{}"'.format(uuid.uuid4()), tsdl, 1)
+
+
+def _bench(tsdl, runs, block_cache_size):
+    parser = pytsdl.parser.Parser(block_cache_size=block_cache_size)
+    parser.parse(tsdl)
+    best = None
+
+    for i in range(runs):
+        session = _other_session(tsdl)
+        start = time.perf_counter()
+        parser.parse(session)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, parser.block_cache
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark the block cache')
+    ap.add_argument('path', help='TSDL document')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs (best is kept)')
+    ap.add_argument('-s', '--size', type=int, default=1024 * 1024,
+                    help='block cache size (characters of block text)')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+
+    with open(args.path) as f:
+        tsdl = f.read()
+
+    cold, _ = _bench(tsdl, args.runs, 0)
+    warm, cache = _bench(tsdl, args.runs, args.size)
+    print('   parse: {:10.4f} s'.format(cold))
+    print('  blocks: {:10.4f} s  ({:.1f}x)'.format(warm, cold / warm))
+    print('    hits: {}  misses: {}'.format(cache.hits, cache.misses))
+
+
+if __name__ == '__main__':
+    _main()
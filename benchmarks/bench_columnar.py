@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Compares decoding the payloads of fixed-layout events into columns
+# with pytsdl.decoder.Decoder (one event record at a time) and with
+# pytsdl.columnar.ColumnarDecoder (NumPy), on the synthetic data stream
+# of bench_decoder.py:
+#
+#   ./bench_columnar.py --packets 100 --events 1000
+import argparse
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+import pytsdl.decoder
+import pytsdl.columnar
+import bench_decoder
+
+
+_EVENT_NAME = 'sched_switch'
+
+
+def _scalar(doc):
+    decoder = pytsdl.decoder.Decoder(doc)
+
+    def decode(data):
+        columns = None
+
+        for ev in decoder.events(data):
+            if ev.name != _EVENT_NAME:
+                continue
+
+            if columns is None:
+                columns = {name: [] for name in ev.fields}
+
+            for name, value in ev.fields.items():
+                columns[name].append(value)
+
+        return len(columns['prev_tid'])
+
+    return decode
+
+
+def _columnar(doc):
+    decoder = pytsdl.columnar.ColumnarDecoder(doc)
+
+    def decode(data):
+        columns = decoder.decode(data, [_EVENT_NAME])
+
+        return len(columns[_EVENT_NAME]['prev_tid'])
+
+    return decode
+
+
+def _bench(name, fn, data, runs):
+    best = None
+    count = None
+
+    for i in range(runs):
+        start = time.perf_counter()
+        count = fn(data)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    print('{:>12}: {:10.4f} s  ({:.0f} {} events/s)'.format(name, best,
+                                                          count / best,
+                                                          _EVENT_NAME))
+
+    return best
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark columnar event decoding')
+    ap.add_argument('-p', '--packets', type=int, default=20,
+                    help='number of packets')
+    ap.add_argument('-e', '--events', type=int, default=1000,
+                    help='number of events per packet')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs (best is kept)')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+    doc = pytsdl.parser.Parser().parse(bench_decoder.METADATA)
+    data = bench_decoder.make_stream(args.packets, args.events)
+    print('{} packets, {} events, {} KiB'.format(args.packets,
+                                                 args.packets * args.events,
+                                                 len(data) // 1024))
+    scalar = _bench('scalar', _scalar(doc), data, args.runs)
+    columnar = _bench('columnar', _columnar(doc), data, args.runs)
+    print('speedup: {:.1f}x'.format(scalar / columnar))
+
+
+if __name__ == '__main__':
+    _main()
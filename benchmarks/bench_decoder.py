@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Measures the throughput of pytsdl.decoder.Decoder (events/second) on
+# a synthetic LTTng-like data stream, walking the type tree for each
+# event ("tree") and with generated decoding functions ("compiled"):
+#
+#   ./bench_decoder.py --packets 100 --events 1000
+import argparse
+import struct
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+import pytsdl.decoder
+
+
+METADATA = '''/* CTF 1.8 */
+typealias integer { size = 8; align = 8; signed = false; } := uint8_t;
+typealias integer { size = 16; align = 8; signed = false; } := uint16_t;
+typealias integer { size = 32; align = 8; signed = false; } := uint32_t;
+typealias integer { size = 64; align = 8; signed = false; } := uint64_t;
+typealias integer { size = 32; align = 8; signed = true; } := int32_t;
+typealias integer { size = 64; align = 8; signed = true; } := int64_t;
+typealias integer { size = 5; align = 1; signed = false; } := uint5_t;
+
+trace {
+    major = 1;
+    minor = 8;
+    byte_order = le;
+    packet.header := struct {
+        uint32_t magic;
+        uint8_t uuid[16];
+        uint32_t stream_id;
+    };
+};
+
+clock {
+    name = monotonic;
+    freq = 1000000000;
+    offset_s = 1410027325;
+    offset = 724524018;
+};
+
+typealias integer {
+    size = 27; align = 1; signed = false;
+    map = clock.monotonic.value;
+} := uint27_clock_monotonic_t;
+
+typealias integer {
+    size = 64; align = 8; signed = false;
+    map = clock.monotonic.value;
+} := uint64_clock_monotonic_t;
+
+stream {
+    id = 0;
+    event.header := struct {
+        enum : uint5_t { compact = 0 ... 30, extended = 31 } id;
+        variant <id> {
+            struct {
+                uint27_clock_monotonic_t timestamp;
+            } compact;
+            struct {
+                uint32_t id;
+                uint64_clock_monotonic_t timestamp;
+            } extended;
+        } v;
+    } align(8);
+    packet.context := struct {
+        uint64_clock_monotonic_t timestamp_begin;
+        uint64_clock_monotonic_t timestamp_end;
+        uint64_t content_size;
+        uint64_t packet_size;
+        uint64_t events_discarded;
+        uint32_t cpu_id;
+    };
+};
+
+event {
+    name = "sched_switch";
+    id = 0;
+    stream_id = 0;
+    fields := struct {
+        integer {
+            size = 8; align = 8; signed = 0; encoding = UTF8;
+        } prev_comm[16];
+        int32_t prev_tid;
+        int32_t prev_prio;
+        int64_t prev_state;
+        integer {
+            size = 8; align = 8; signed = 0; encoding = UTF8;
+        } next_comm[16];
+        int32_t next_tid;
+        int32_t next_prio;
+    };
+};
+
+event {
+    name = "syscall_entry_openat";
+    id = 1;
+    stream_id = 0;
+    fields := struct {
+        int32_t dfd;
+        string filename;
+        uint32_t flags;
+        uint16_t nmodes;
+        uint16_t modes[nmodes];
+    };
+};
+'''
+
+
+_MAGIC = 0xc1fc1fc1
+_HEADER_FMT = '<I16sI'
+_CONTEXT_FMT = '<QQQQQI'
+
+
+def _event(i, ts):
+    if i % 4 == 3:
+        header = struct.pack('<I', 1 | ((ts & 0x7ffffff) << 5))
+        name = b'/usr/lib/libc.so.%d\0' % i
+        payload = struct.pack('<i', -100) + name
+        payload += struct.pack('<IH', 0o644, 2) + struct.pack('<HH', 1, 2)
+
+        return header + payload
+
+    header = struct.pack('<I', (ts & 0x7ffffff) << 5)
+    payload = struct.pack('<16siiq16sii', b'swapper/0', 0, 20, 0, b'bash',
+                          1234, 20)
+
+    return header + payload
+
+
+# Returns the binary content of a data stream file made of `npackets`
+# packets of `nevents` events each, described by METADATA.
+def make_stream(npackets, nevents):
+    packets = []
+    header = struct.pack(_HEADER_FMT, _MAGIC, bytes(16), 0)
+    context_size = struct.calcsize(_CONTEXT_FMT)
+    ts = 1000
+
+    for p in range(npackets):
+        begin = ts
+        events = []
+
+        for i in range(nevents):
+            events.append(_event(i, ts))
+            ts += 97
+
+        events = b''.join(events)
+        content_size = (len(header) + context_size + len(events)) * 8
+        padding = (-content_size // 8) % 4096
+        packet_size = content_size + padding * 8
+        context = struct.pack(_CONTEXT_FMT, begin, ts, content_size,
+                              packet_size, 0, 0)
+        packets.append(header + context + events + bytes(padding))
+
+    return b''.join(packets)
+
+
+def _bench(name, fn, data, nevents, runs):
+    best = None
+
+    for i in range(runs):
+        start = time.perf_counter()
+        count = fn(data)
+        elapsed = time.perf_counter() - start
+
+        if count != nevents:
+            msg = '{}: decoded {} events instead of {}'
+            raise RuntimeError(msg.format(name, count, nevents))
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    msg = '{:>12}: {:10.4f} s  ({:.0f} events/s)'
+    print(msg.format(name, best, nevents / best))
+
+    return best
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark CTF event decoding')
+    ap.add_argument('-p', '--packets', type=int, default=20,
+                    help='number of packets')
+    ap.add_argument('-e', '--events', type=int, default=1000,
+                    help='number of events per packet')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs (best is kept)')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+    doc = pytsdl.parser.Parser().parse(METADATA)
+    data = make_stream(args.packets, args.events)
+    nevents = args.packets * args.events
+
+    def decoder_fn(compiled):
+        decoder = pytsdl.decoder.Decoder(doc, compiled=compiled)
+
+        def decode(data):
+            count = 0
+
+            for ev in decoder.events(data):
+                count += 1
+
+            return count
+
+        return decode
+
+    print('{} packets, {} events, {} KiB'.format(args.packets, nevents,
+                                                 len(data) // 1024))
+    tree = _bench('tree', decoder_fn(False), data, nevents, args.runs)
+    compiled = _bench('compiled', decoder_fn(True), data, nevents, args.runs)
+    print('speedup: {:.1f}x'.format(tree / compiled))
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Measures the startup cost of pytsdl in fresh interpreters: importing
+# its modules, and loading a cached document (a synthetic document made
+# by tsdlgen.py, cached beforehand), as short-lived tools do:
+#
+#   ./bench_import.py --events 1000 --runs 20
+import subprocess
+import argparse
+import tempfile
+import sys
+import os
+
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, _root)
+
+import pytsdl.parser
+import tsdlgen
+
+
+# what each child interpreter runs: prints the time (seconds) taken by
+# the statements of a scenario
+_child = '''
+import time
+import sys
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{stmts}
+print(time.perf_counter() - start)
+'''
+
+
+_scenarios = [
+    ('pytsdl.tsdl', 'import pytsdl.tsdl'),
+    ('pytsdl.parser', 'import pytsdl.parser'),
+    ('pyPEG2 grammar', 'import pytsdl.parser\nimport pytsdl.grammar'),
+    ('cached doc', '''import pytsdl.parser
+with open({path!r}) as f:
+    tsdl = f.read()
+pytsdl.parser.Parser(cache_dir={cache_dir!r}).parse(tsdl)'''),
+]
+
+
+def _run(stmts, runs):
+    times = []
+
+    for i in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', stmts])
+        times.append(float(out))
+
+    times.sort()
+
+    return times[0], times[len(times) // 2]
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark import and startup times')
+    ap.add_argument('-e', '--events', type=int, default=1000,
+                    help='number of event classes of the cached document')
+    ap.add_argument('-r', '--runs', type=int, default=10,
+                    help='number of interpreters per scenario')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'metadata')
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        tsdl = tsdlgen.generate(events=args.events)
+
+        with open(path, 'w') as f:
+            f.write(tsdl)
+
+        pytsdl.parser.Parser(cache_dir=cache_dir).parse(tsdl)
+        print('{} KiB of TSDL, {} runs (best, median)'.format(len(tsdl) // 1024,
+                                                          args.runs))
+
+        for name, stmts in _scenarios:
+            stmts = stmts.format(path=path, cache_dir=cache_dir)
+            code = _child.format(root=_root, stmts=stmts)
+            best, median = _run(code, args.runs)
+            print('{:>15}: {:8.1f} ms  {:8.1f} ms'.format(name, best * 1000,
+                                                           median * 1000))
+
+
+if __name__ == '__main__':
+    _main()
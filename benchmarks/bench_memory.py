@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Measures the memory retained by a parsed pytsdl.tsdl.Doc (bytes, as
+# traced by tracemalloc) and counts its objects, for a given TSDL
+# document or for a synthetic LTTng kernel-like document:
+#
+#   ./bench_memory.py /path/to/metadata
+#   ./bench_memory.py --events 2000
+#
+# With --compare, also measures the document without interning
+# structurally identical scalar types (see
+# pytsdl.parser._DocCreatorVisitor._intern_type()), side by side.
+import argparse
+import collections
+import tracemalloc
+import gc
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+import pytsdl.tsdl
+
+
+_HEAD = '''/* CTF 1.8 */
+typealias integer { size = 8; align = 8; signed = false; } := uint8_t;
+typealias integer { size = 16; align = 8; signed = false; } := uint16_t;
+typealias integer { size = 32; align = 8; signed = false; } := uint32_t;
+typealias integer { size = 64; align = 8; signed = false; } := uint64_t;
+typealias integer { size = 32; align = 8; signed = true; } := int32_t;
+typealias integer { size = 64; align = 8; signed = true; } := int64_t;
+typealias integer { size = 5; align = 1; signed = false; } := uint5_t;
+typealias integer { size = 27; align = 1; signed = false; } := uint27_t;
+
+trace {
+    major = 1;
+    minor = 8;
+    byte_order = le;
+    packet.header := struct {
+        uint32_t magic;
+        uint8_t uuid[16];
+        uint32_t stream_id;
+    };
+};
+
+clock {
+    name = monotonic;
+    freq = 1000000000;
+};
+
+stream {
+    id = 0;
+    event.header := struct {
+        enum : uint5_t { compact = 0 ... 30, extended = 31 } id;
+        variant <id> {
+            struct {
+                uint27_t timestamp;
+            } compact;
+            struct {
+                uint32_t id;
+                uint64_t timestamp;
+            } extended;
+        } v;
+    } align(8);
+    packet.context := struct {
+        uint64_t timestamp_begin;
+        uint64_t timestamp_end;
+        uint64_t content_size;
+        uint64_t packet_size;
+        uint64_t events_discarded;
+        uint32_t cpu_id;
+    };
+};
+'''
+
+
+_EVENT = '''
+event {{
+    name = "syscall_entry_{id}";
+    id = {id};
+    stream_id = 0;
+    fields := struct {{
+        integer {{ size = 32; align = 8; signed = 1; encoding = none; base = 10; }} fd;
+        integer {{ size = 64; align = 8; signed = 0; encoding = none; base = 16; }} buf;
+        integer {{ size = 64; align = 8; signed = 0; encoding = none; base = 10; }} count;
+        integer {{ size = 8; align = 8; signed = 1; encoding = UTF8; base = 10; }} comm[16];
+        int32_t tid;
+        uint64_t flags;
+        uint16_t nargs;
+        uint64_t args[nargs];
+        string filename;
+    }};
+}};
+'''
+
+
+# Returns a synthetic TSDL document with `nevents` LTTng kernel-like
+# event classes.
+def make_metadata(nevents):
+    return _HEAD + ''.join(_EVENT.format(id=i) for i in range(nevents))
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Measure the memory of a '
+                                             'parsed document')
+    ap.add_argument('path', nargs='?', help='TSDL document')
+    ap.add_argument('-e', '--events', type=int, default=2000,
+                    help='number of events of the synthetic document')
+    ap.add_argument('-c', '--compare', action='store_true',
+                    help='also measure the document without interned types')
+
+    return ap.parse_args()
+
+
+# Returns the memory retained by the document parsed from `tsdl`
+# (bytes), its number of events, and the number of objects of each
+# class of pytsdl.tsdl it's made of.
+def _measure(tsdl, intern=True):
+    visitor_cls = pytsdl.parser._DocCreatorVisitor
+    intern_added = visitor_cls._intern_added
+
+    if not intern:
+        visitor_cls._intern_added = lambda self, trace, added: None
+
+    try:
+        parser = pytsdl.parser.Parser()
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        doc = parser.parse(tsdl)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+    finally:
+        visitor_cls._intern_added = intern_added
+
+    counts = collections.Counter()
+    ids = set()
+
+    for obj in gc.get_objects():
+        if type(obj).__module__ == 'pytsdl.tsdl' and id(obj) not in ids:
+            ids.add(id(obj))
+            counts[type(obj).__name__] += 1
+
+    nevents = sum(len(s.events) for s in doc.streams.values())
+
+    return retained, nevents, counts
+
+
+def _print_row(name, values):
+    print('{:>16}'.format(name) +
+          ''.join('{:>16}'.format(value) for value in values))
+
+
+def _main():
+    args = _parse_args()
+
+    if args.path is not None:
+        with open(args.path) as f:
+            tsdl = f.read()
+    else:
+        tsdl = make_metadata(args.events)
+
+    results = [('interned', _measure(tsdl))]
+
+    if args.compare:
+        results.append(('not interned', _measure(tsdl, intern=False)))
+
+    nevents = results[0][1][1]
+    print('{} KiB of TSDL, {} events'.format(len(tsdl) // 1024, nevents))
+    _print_row('', [name for name, result in results])
+    _print_row('bytes per Doc', [result[0] for name, result in results])
+    _print_row('bytes per event', ['{:.0f}'.format(result[0] / nevents)
+                                   for name, result in results])
+    cls_names = set()
+
+    for name, result in results:
+        cls_names.update(result[2])
+
+    for cls_name in sorted(cls_names):
+        _print_row(cls_name, [result[2][cls_name] for name, result in results])
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Measures the scaling of pytsdl.parallel.ParallelDecoder with the
+# number of worker processes, compared to a single pytsdl.decoder.Decoder,
+# on synthetic data stream files (one per simulated CPU) made by
+# bench_decoder.py:
+#
+#   ./bench_parallel.py --streams 16 --packets 200 --events 1000 -j 16
+import argparse
+import tempfile
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+import pytsdl.decoder
+import pytsdl.parallel
+import bench_decoder
+
+
+# what each worker sends back for each event record
+def _timestamp(ev):
+    return ev.timestamp
+
+
+def _serial(doc, paths):
+    decoder = pytsdl.decoder.Decoder(doc)
+    count = 0
+
+    for path in paths:
+        for ev in decoder.decode_file(path):
+            _timestamp(ev)
+            count += 1
+
+    return count
+
+
+def _parallel(workers, paths, ordered):
+    count = 0
+
+    with pytsdl.parallel.ParallelDecoder(bench_decoder.METADATA,
+                                         workers=workers) as decoder:
+        for value in decoder.map(paths, _timestamp, ordered=ordered):
+            count += 1
+
+    return count
+
+
+def _bench(name, fn, nevents, runs):
+    best = None
+
+    for i in range(runs):
+        start = time.perf_counter()
+        count = fn()
+        elapsed = time.perf_counter() - start
+
+        if count != nevents:
+            raise RuntimeError('{}: decoded {} events instead of {}'.format(name, count, nevents))
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark parallel decoding')
+    ap.add_argument('-s', '--streams', type=int, default=4,
+                    help='number of data stream files')
+    ap.add_argument('-p', '--packets', type=int, default=50,
+                    help='number of packets per data stream file')
+    ap.add_argument('-e', '--events', type=int, default=1000,
+                    help='number of events per packet')
+    ap.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                    help='maximum number of worker processes')
+    ap.add_argument('-o', '--ordered', action='store_true',
+                    help='merge results in timestamp order')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs (best is kept)')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+    doc = pytsdl.parser.Parser().parse(bench_decoder.METADATA)
+    nevents = args.streams * args.packets * args.events
+
+    with tempfile.TemporaryDirectory() as trace_dir:
+        paths = []
+        data = bench_decoder.make_stream(args.packets, args.events)
+
+        for i in range(args.streams):
+            path = os.path.join(trace_dir, 'channel0_{}'.format(i))
+            paths.append(path)
+
+            with open(path, 'wb') as f:
+                f.write(data)
+
+        print('{} streams, {} events, {} MiB, {} CPUs'.format(args.streams,
+                                                             nevents,
+                                                             len(data) * args.streams >> 20,
+                                                             os.cpu_count()))
+        serial = _bench('serial', lambda: _serial(doc, paths), nevents,
+                        args.runs)
+        print('{:>10}: {:10.4f} s  ({:.0f} events/s)'.format('serial', serial,
+                                                           nevents / serial))
+        workers = 1
+
+        while True:
+            elapsed = _bench('parallel',
+                             lambda: _parallel(workers, paths, args.ordered),
+                             nevents, args.runs)
+            name = '{} worker{}'.format(workers, 's' if workers > 1 else '')
+            print('{:>10}: {:10.4f} s  ({:.0f} events/s, {:.2f}x)'.format(name,
+                                                                        elapsed,
+                                                                        nevents / elapsed,
+                                                                        serial / elapsed))
+
+            if workers >= args.jobs:
+                break
+
+            workers = min(workers * 2, args.jobs)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Measures the scaling of pytsdl.parser.Parser.parse_many() with the
+# number of worker processes, compared to parsing the same metadata
+# files one after the other, on a synthetic corpus made by tsdlgen.py:
+# `--files` metadata files (one per simulated trace), of which only
+# `--distinct` have different contents (other traces of the same
+# tracer and session setup):
+#
+#   ./bench_parse_many.py --files 200 --distinct 50 --events 300 -j 16
+import argparse
+import pathlib
+import tempfile
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+import tsdlgen
+
+
+def _serial(paths):
+    parser = pytsdl.parser.Parser()
+
+    return [parser.parse_metadata_file(path) for path in paths]
+
+
+def _parallel(workers, paths):
+    parser = pytsdl.parser.Parser()
+
+    return list(parser.parse_many(paths, workers=workers))
+
+
+def _bench(name, fn, nfiles, runs):
+    best = None
+
+    for i in range(runs):
+        start = time.perf_counter()
+        docs = fn()
+        elapsed = time.perf_counter() - start
+
+        for doc in docs:
+            if isinstance(doc, Exception):
+                raise RuntimeError('{}: {}'.format(name, doc))
+
+        if len(docs) != nfiles:
+            raise RuntimeError('{}: parsed {} files instead of {}'.format(name, len(docs), nfiles))
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark parsing many metadata files')
+    ap.add_argument('-f', '--files', type=int, default=64,
+                    help='number of metadata files')
+    ap.add_argument('-u', '--distinct', type=int, default=16,
+                    help='number of distinct metadata files')
+    ap.add_argument('-e', '--events', type=int, default=200,
+                    help='number of event classes per document')
+    ap.add_argument('-d', '--domain', choices=['kernel', 'ust'],
+                    default='kernel', help='tracing domain to mimic')
+    ap.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                    help='maximum number of worker processes')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs (best is kept)')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+    distinct = max(1, min(args.distinct, args.files))
+    texts = [tsdlgen.generate(events=args.events, domain=args.domain,
+                              seed=seed) for seed in range(distinct)]
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        paths = []
+        size = 0
+
+        for i in range(args.files):
+            path = pathlib.Path(corpus_dir, 'metadata_{}'.format(i))
+            path.write_text(texts[i % distinct])
+            size += path.stat().st_size
+            paths.append(path)
+
+        print('{} files ({} distinct), {} KiB, {} CPUs'.format(args.files,
+                                                              distinct,
+                                                              size >> 10,
+                                                              os.cpu_count()))
+        serial = _bench('serial', lambda: _serial(paths), args.files,
+                        args.runs)
+        print('{:>10}: {:10.4f} s  ({:.1f} files/s)'.format('serial', serial,
+                                                          args.files / serial))
+        workers = 1
+
+        while True:
+            elapsed = _bench('parallel', lambda: _parallel(workers, paths),
+                             args.files, args.runs)
+            name = '{} worker{}'.format(workers, 's' if workers > 1 else '')
+            print('{:>10}: {:10.4f} s  ({:.1f} files/s, {:.2f}x)'.format(name,
+                                                                       elapsed,
+                                                                       args.files / elapsed,
+                                                                       serial / elapsed))
+
+            if workers >= args.jobs:
+                break
+
+            workers = min(workers * 2, args.jobs)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Compares the parsing engines of pytsdl.parser.Parser.get_ast() on a
+# TSDL document:
+#
+#   ./bench_parser.py /path/to/metadata
+#
+# With --cache, also measures Parser.parse() with a warm document cache.
+# With --stream, compares the time and peak memory (as traced by
+# tracemalloc) of Parser.parse() and Parser.parse_stream().
+# With --lazy, compares Parser.parse() with and without lazy event
+# parsing, up to getting the fields of one event.
+# With --jobs, measures Parser.parse() with up to this many processes
+# building the ASTs of the top-level blocks.
+import argparse
+import tempfile
+import tracemalloc
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+
+
+def _bench(engine, tsdl, runs):
+    parser = pytsdl.parser.Parser(engine=engine)
+    best = None
+
+    for i in range(runs):
+        start = time.perf_counter()
+        parser.get_ast(tsdl)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def _bench_cache(tsdl, runs):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        parser = pytsdl.parser.Parser(cache_dir=cache_dir)
+
+        # cold run fills the cache
+        start = time.perf_counter()
+        parser.parse(tsdl)
+        cold = time.perf_counter() - start
+        warm = None
+
+        for i in range(runs):
+            start = time.perf_counter()
+            parser.parse(tsdl)
+            elapsed = time.perf_counter() - start
+
+            if warm is None or elapsed < warm:
+                warm = elapsed
+
+    return cold, warm
+
+
+def _bench_stream(path):
+    parser = pytsdl.parser.Parser()
+    results = []
+
+    def parse():
+        with open(path) as f:
+            return parser.parse(f.read())
+
+    def parse_stream():
+        with open(path) as f:
+            return parser.parse_stream(f)
+
+    for fn in [parse, parse_stream]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append((elapsed, peak))
+
+    return results
+
+
+def _bench_lazy(tsdl, runs):
+    results = []
+
+    for lazy in [False, True]:
+        parser = pytsdl.parser.Parser(lazy=lazy)
+        best = None
+
+        for i in range(runs):
+            start = time.perf_counter()
+            doc = parser.parse(tsdl)
+            stream = next(iter(doc.streams.values()))
+            stream.events[-1].fields
+            elapsed = time.perf_counter() - start
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        results.append(best)
+
+    return results
+
+
+def _bench_workers(tsdl, runs, jobs):
+    results = []
+    workers = 1
+
+    while True:
+        with pytsdl.parser.Parser(ast_workers=workers) as parser:
+            # starts the worker processes
+            parser.parse(tsdl)
+            best = None
+
+            for i in range(runs):
+                start = time.perf_counter()
+                parser.parse(tsdl)
+                elapsed = time.perf_counter() - start
+
+                if best is None or elapsed < best:
+                    best = elapsed
+
+        results.append((workers, best))
+
+        if workers >= jobs:
+            return results
+
+        workers = min(workers * 2, jobs)
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark TSDL parsing engines')
+    ap.add_argument('path', help='TSDL document')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs per engine (best is kept)')
+    ap.add_argument('-e', '--engines', default='native,pypeg2',
+                    help='comma-separated list of engines to compare')
+    ap.add_argument('-c', '--cache', action='store_true',
+                    help='also measure parsing with a warm document cache')
+    ap.add_argument('-s', '--stream', action='store_true',
+                    help='also compare parsing the whole text and streaming it')
+    ap.add_argument('-l', '--lazy', action='store_true',
+                    help='also compare eager and lazy event parsing')
+    ap.add_argument('-j', '--jobs', type=int,
+                    help='also measure parsing with up to this many AST workers')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+
+    with open(args.path) as f:
+        tsdl = f.read()
+
+    kib = len(tsdl) / 1024
+    results = {}
+
+    for engine in args.engines.split(','):
+        results[engine] = _bench(engine, tsdl, args.runs)
+        print('{:>8}: {:10.4f} s  ({:.1f} KiB/s)'.format(engine,
+                                                         results[engine],
+                                                         kib / results[engine]))
+
+    if 'native' in results and 'pypeg2' in results:
+        print('speedup: {:.1f}x'.format(results['pypeg2'] / results['native']))
+
+    if args.cache:
+        cold, warm = _bench_cache(tsdl, args.runs)
+        print('   parse: {:10.4f} s'.format(cold))
+        print('  cached: {:10.4f} s  ({:.1f}x)'.format(warm, cold / warm))
+
+    if args.stream:
+        whole, stream = _bench_stream(args.path)
+        fmt = '{:>8}: {:10.4f} s  (peak: {:.1f} MiB)'
+        print(fmt.format('whole', whole[0], whole[1] / 1024 / 1024))
+        print(fmt.format('stream', stream[0], stream[1] / 1024 / 1024))
+
+    if args.lazy:
+        eager, lazy = _bench_lazy(tsdl, args.runs)
+        print('   eager: {:10.4f} s'.format(eager))
+        print('    lazy: {:10.4f} s  ({:.1f}x)'.format(lazy, eager / lazy))
+
+    if args.jobs:
+        results = _bench_workers(tsdl, args.runs, args.jobs)
+        serial = results[0][1]
+
+        for workers, elapsed in results:
+            name = '{} worker{}'.format(workers, 's' if workers > 1 else '')
+            print('{:>10}: {:10.4f} s  ({:.2f}x)'.format(name, elapsed,
+                                                       serial / elapsed))
+
+
+if __name__ == '__main__':
+    _main()
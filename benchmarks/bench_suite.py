@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Benchmark suite: measures pytsdl.parser.Parser.get_ast(),
+# Parser.parse(), Parser.parse_stream() and object model operations
+# (Stream.get_event(), Stream.get_event_by_id() and its batch version,
+# Enum.label_of()) on synthetic documents of various sizes (see
+# tsdlgen.py), and writes the results as JSON, to compare versions:
+#
+#   ./bench_suite.py --sizes 1x100,4x500 -o results.json
+#
+# A size is "STREAMSxEVENTS" (event classes per stream). Times are the
+# best of a few runs.
+import argparse
+import datetime
+import platform
+import subprocess
+import random
+import json
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+import tsdlgen
+
+
+def _best(fn, runs):
+    best = None
+
+    for i in range(runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def _throughput(seconds, nbytes, nevents):
+    return {
+        'seconds': seconds,
+        'kib_per_s': nbytes / 1024 / seconds,
+        'events_per_s': nevents / seconds,
+    }
+
+
+def _ops(seconds, count):
+    return {
+        'seconds': seconds,
+        'ops': count,
+        'ops_per_s': count / seconds,
+    }
+
+
+def _bench_parsing(tsdl, engines, runs, nevents):
+    nbytes = len(tsdl.encode())
+    results = {}
+
+    for engine in engines:
+        parser = pytsdl.parser.Parser(engine=engine)
+        seconds = _best(lambda: parser.get_ast(tsdl), runs)
+        results['get_ast.' + engine] = _throughput(seconds, nbytes, nevents)
+        seconds = _best(lambda: parser.parse(tsdl), runs)
+        results['parse.' + engine] = _throughput(seconds, nbytes, nevents)
+
+    parser = pytsdl.parser.Parser()
+    chunks = [tsdl[i:i + 65536] for i in range(0, len(tsdl), 65536)]
+    seconds = _best(lambda: parser.parse_stream(chunks), runs)
+    results['parse_stream.native'] = _throughput(seconds, nbytes, nevents)
+
+    return results
+
+
+def _bench_model(doc, runs, nops):
+    rnd = random.Random(0)
+    results = {}
+    streams = list(doc.streams.values())
+    keys = []
+
+    for i in range(nops):
+        stream = rnd.choice(streams)
+        event = rnd.choice(stream.events)
+        keys.append((stream, rnd.choice([event.id, event.name])))
+
+    def get_events():
+        for stream, key in keys:
+            stream.get_event(key)
+
+    results['get_event'] = _ops(_best(get_events, runs), nops)
+
+    # event header IDs, one at a time and in batches of a stream
+    ids = {stream: [] for stream in streams}
+
+    for stream, key in keys:
+        ids[stream].append(stream.get_event(key).id)
+
+    def get_events_by_id():
+        for stream, stream_ids in ids.items():
+            get_event_by_id = stream.get_event_by_id
+
+            for id in stream_ids:
+                get_event_by_id(id)
+
+    def get_events_by_id_batch():
+        for stream, stream_ids in ids.items():
+            stream.get_events_by_id(stream_ids)
+
+    results['get_event_by_id'] = _ops(_best(get_events_by_id, runs), nops)
+    results['get_events_by_id'] = _ops(_best(get_events_by_id_batch, runs),
+                                       nops)
+
+    # event header ID (two ranges) and the ret_t/task_state_t fields of
+    # events (ranges and single values)
+    enums = [streams[0].event_header['id']]
+
+    for stream in streams:
+        for event in stream.events:
+            for field in event.fields.fields.values():
+                if type(field) is pytsdl.tsdl.Enum and \
+                        all(field is not e for e in enums):
+                    enums.append(field)
+
+    lookups = []
+
+    for i in range(nops):
+        enum = rnd.choice(enums)
+        low, high = rnd.choice(list(enum.labels.values()))
+        lookups.append((enum, rnd.randint(low, high)))
+
+    def label_of():
+        for enum, value in lookups:
+            enum.label_of(value)
+
+    results['label_of'] = _ops(_best(label_of, runs), nops)
+
+    return results
+
+
+def _git_revision():
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    try:
+        out = subprocess.check_output(['git', 'describe', '--always',
+                                       '--dirty'], cwd=cwd,
+                                      stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return out.decode().strip()
+
+
+def _parse_size(size):
+    streams, events = size.lower().split('x')
+
+    return int(streams), int(events)
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Run the pytsdl benchmark suite')
+    ap.add_argument('-s', '--sizes', default='1x100,2x500,4x1000',
+                    help='comma-separated list of document sizes (STREAMSxEVENTS)')
+    ap.add_argument('-d', '--domain', choices=['kernel', 'ust'],
+                    default='kernel', help='tracing domain to mimic')
+    ap.add_argument('-e', '--engines', default='native',
+                    help='comma-separated list of parser engines')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs per benchmark (best is kept)')
+    ap.add_argument('-n', '--ops', type=int, default=100000,
+                    help='number of operations of the object model benchmarks')
+    ap.add_argument('-o', '--output', help='output JSON file (default: stdout)')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+    engines = args.engines.split(',')
+    documents = []
+
+    for size in args.sizes.split(','):
+        streams, events = _parse_size(size)
+        tsdl = tsdlgen.generate(streams, events, args.domain)
+        nevents = streams * events
+        doc = pytsdl.parser.Parser().parse(tsdl)
+        results = _bench_parsing(tsdl, engines, args.runs, nevents)
+        results.update(_bench_model(doc, args.runs, args.ops))
+        documents.append({
+            'streams': streams,
+            'events': nevents,
+            'bytes': len(tsdl.encode()),
+            'results': results,
+        })
+        print('{}: {:.3f} s'.format(size, results['parse.' + engines[0]]['seconds']),
+              file=sys.stderr)
+
+    report = {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'domain': args.domain,
+        'runs': args.runs,
+        'documents': documents,
+    }
+    out = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output is None:
+        print(out)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Measures the visit phase of pytsdl.parser.Parser.parse() (creating
+# objects, resolving aliases, structures and variants) on a synthetic
+# document made of deeply nested, struct-heavy event payloads, each
+# nesting level declaring its own type aliases and named structures
+# and using the ones of all the enclosing levels:
+#
+#   ./bench_symbols.py --events 200 --depth 12 --fields 20
+import argparse
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytsdl.parser
+
+
+_HEAD = '''/* CTF 1.8 */
+typealias integer { size = 8; align = 8; signed = false; } := uint8_t;
+typealias integer { size = 16; align = 8; signed = false; } := uint16_t;
+typealias integer { size = 32; align = 8; signed = false; } := uint32_t;
+typealias integer { size = 64; align = 8; signed = false; } := uint64_t;
+typealias integer { size = 5; align = 1; signed = false; } := uint5_t;
+
+trace {
+    major = 1;
+    minor = 8;
+    byte_order = le;
+    packet.header := struct {
+        uint32_t magic;
+        uint32_t stream_id;
+    };
+};
+
+clock {
+    name = monotonic;
+    freq = 1000000000;
+};
+
+struct point {
+    uint32_t x;
+    uint32_t y;
+};
+
+stream {
+    id = 0;
+    event.header := struct {
+        uint16_t id;
+        uint64_t timestamp;
+    };
+};
+'''
+
+
+_TOP_ALIASES = ['uint8_t', 'uint16_t', 'uint32_t', 'uint64_t']
+
+
+def _level(depth, level, nfields):
+    indent = '    ' * (level + 2)
+    lines = [
+        # local alias and structure, shadowing the ones of the
+        # enclosing level
+        '{}typealias integer {{ size = {}; align = 8; signed = false; }} := local_t;'.format(indent, 8 << (level % 4)),
+        '{}typealias integer {{ size = 32; align = 8; signed = true; }} := level{}_t;'.format(indent, level),
+        '{}struct local {{ uint8_t a; local_t b; }};'.format(indent),
+    ]
+
+    for i in range(nfields):
+        # aliases of the top level and of all the enclosing levels
+        if i % 3 == 0:
+            t = _TOP_ALIASES[i % len(_TOP_ALIASES)]
+        elif i % 3 == 1:
+            t = 'level{}_t'.format(i % (level + 1))
+        else:
+            t = 'local_t'
+
+        lines.append('{}{} f{};'.format(indent, t, i))
+
+    lines.append('{}struct point p;'.format(indent))
+    lines.append('{}struct local l;'.format(indent))
+
+    if level + 1 < depth:
+        lines.append('{}struct {{'.format(indent))
+        lines.append(_level(depth, level + 1, nfields))
+        lines.append('{}}} nested;'.format(indent))
+
+    return '\n'.join(lines)
+
+
+# Returns a document with `nevents` events, the payload of each one
+# having `depth` nesting levels of `nfields` alias fields.
+def make_metadata(nevents, depth, nfields):
+    parts = [_HEAD]
+
+    for i in range(nevents):
+        parts.append('''
+event {{
+    name = "event{id}";
+    id = {id};
+    stream_id = 0;
+    fields := struct {{
+{body}
+    }};
+}};
+'''.format(id=i, body=_level(depth, 0, nfields)))
+
+    return ''.join(parts)
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark alias/structure resolution')
+    ap.add_argument('-e', '--events', type=int, default=200,
+                    help='number of events')
+    ap.add_argument('-d', '--depth', type=int, default=12,
+                    help='nesting depth of event payloads')
+    ap.add_argument('-f', '--fields', type=int, default=20,
+                    help='number of alias fields per nesting level')
+    ap.add_argument('-r', '--runs', type=int, default=3,
+                    help='number of runs (best is kept)')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+    tsdl = make_metadata(args.events, args.depth, args.fields)
+    parser = pytsdl.parser.Parser(stats=True)
+    parser.parse(tsdl)
+    stats = parser.stats
+    ast = parser.get_ast(tsdl)
+    best = None
+
+    # only the (non-instrumented) visit of the AST
+    for i in range(args.runs):
+        start = time.perf_counter()
+        ast.accept(pytsdl.parser._DocCreatorVisitor())
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    print('{} KiB of TSDL, {} lookups, max scope depth: {}'.format(len(tsdl) // 1024,
+                                                                   stats.lookups,
+                                                                   stats.max_scope_depth))
+    print('visit: {:.4f} s ({:.0f} lookups/s)'.format(best,
+                                                      stats.lookups / best))
+
+
+if __name__ == '__main__':
+    _main()
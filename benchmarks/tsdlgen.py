@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Generates realistic synthetic TSDL documents of configurable size,
+# mirroring the metadata of LTTng kernel and user space traces: typealias
+# chains (integer aliases used by enumeration and structure aliases),
+# clock-mapped integers, compact/extended event headers, nested
+# structures, enumerations with ranges, variants and sequences.
+#
+#   ./tsdlgen.py --streams 4 --events 500 > metadata
+#
+# The same arguments (including the seed) always generate the same
+# document.
+import argparse
+import random
+import sys
+
+
+_HEAD = '''/* CTF 1.8 */
+
+typealias integer { size = 8; align = 8; signed = false; } := uint8_t;
+typealias integer { size = 16; align = 8; signed = false; } := uint16_t;
+typealias integer { size = 32; align = 8; signed = false; } := uint32_t;
+typealias integer { size = 64; align = 8; signed = false; } := uint64_t;
+typealias integer { size = 64; align = 8; signed = false; } := unsigned long;
+typealias integer { size = 5; align = 1; signed = false; } := uint5_t;
+typealias integer { size = 27; align = 1; signed = false; } := uint27_t;
+typealias integer { size = 8; align = 8; signed = true; } := int8_t;
+typealias integer { size = 16; align = 8; signed = true; } := int16_t;
+typealias integer { size = 32; align = 8; signed = true; } := int32_t;
+typealias integer { size = 64; align = 8; signed = true; } := int64_t;
+typealias integer { size = 64; align = 8; signed = true; } := long;
+typealias integer { size = 64; align = 8; signed = false; base = 16; } := uintptr_t;
+typealias floating_point { exp_dig = 8; mant_dig = 24; align = 8; } := float;
+typealias floating_point { exp_dig = 11; mant_dig = 53; align = 8; } := double;
+
+trace {
+    major = 1;
+    minor = 8;
+    uuid = "{uuid}";
+    byte_order = le;
+    packet.header := struct {
+        uint32_t magic;
+        uint8_t  uuid[16];
+        uint32_t stream_id;
+        uint64_t stream_instance_id;
+    } align(8);
+};
+
+env {
+    hostname = "{hostname}";
+    domain = "{domain}";
+    sysname = "Linux";
+    kernel_release = "4.19.0-6-amd64";
+    kernel_version = "#1 SMP Debian 4.19.67-2+deb10u2 (2019-11-11)";
+    tracer_name = "{tracer_name}";
+    tracer_major = 2;
+    tracer_minor = 11;
+    tracer_patchlevel = 0;
+    trace_buffering_scheme = "global";
+};
+
+clock {
+    name = monotonic;
+    uuid = "{clock_uuid}";
+    description = "Monotonic Clock";
+    freq = 1000000000; /* Frequency, in Hz */
+    /* clock value offset from Epoch is: offset * (1/freq) */
+    offset = 1576612329208094873;
+};
+
+typealias integer {
+    size = 27; align = 1; signed = false;
+    map = clock.monotonic.value;
+} := uint27_clock_monotonic_t;
+
+typealias integer {
+    size = 32; align = 8; signed = false;
+    map = clock.monotonic.value;
+} := uint32_clock_monotonic_t;
+
+typealias integer {
+    size = 64; align = 8; signed = false;
+    map = clock.monotonic.value;
+} := uint64_clock_monotonic_t;
+
+typealias enum : uint8_t {
+    "TASK_RUNNING" = 0,
+    "TASK_INTERRUPTIBLE" = 1,
+    "TASK_UNINTERRUPTIBLE" = 2,
+    "TASK_STOPPED" = 4 ... 7,
+    "TASK_DEAD" = 64 ... 127,
+    "TASK_OTHER" = 128 ... 255,
+} := task_state_t;
+
+typealias enum : int32_t {
+    "RET_ERROR" = -4095 ... -1,
+    "RET_OK" = 0,
+    "RET_VALUE" = 1 ... 2147483647,
+} := ret_t;
+
+typealias enum : uint8_t {
+    "TAG_NONE" = 0,
+    "TAG_INT" = 1,
+    "TAG_STRING" = 2,
+    "TAG_DOUBLE" = 3,
+} := tag_t;
+
+typealias struct {
+    ret_t ret;
+    int64_t value;
+} := result_t;
+
+struct packet_context {
+    uint64_clock_monotonic_t timestamp_begin;
+    uint64_clock_monotonic_t timestamp_end;
+    uint64_t content_size;
+    uint64_t packet_size;
+    uint64_t packet_seq_num;
+    unsigned long events_discarded;
+    uint32_t cpu_id;
+};
+
+struct event_header_compact {
+    enum : uint5_t { compact = 0 ... 30, extended = 31 } id;
+    variant <id> {
+        struct {
+            uint27_clock_monotonic_t timestamp;
+        } compact;
+        struct {
+            uint32_t id;
+            uint64_clock_monotonic_t timestamp;
+        } extended;
+    } v;
+} align(8);
+
+struct event_header_large {
+    enum : uint16_t { compact = 0 ... 65534, extended = 65535 } id;
+    variant <id> {
+        struct {
+            uint32_clock_monotonic_t timestamp;
+        } compact;
+        struct {
+            uint32_t id;
+            uint64_clock_monotonic_t timestamp;
+        } extended;
+    } v;
+} align(8);
+'''
+
+
+_STREAM = '''
+stream {{
+    id = {id};
+    event.header := struct {header};
+    packet.context := struct packet_context;{context}
+}};
+'''
+
+
+# user space streams have a per-process event context
+_UST_CONTEXT = '''
+    event.context := struct {
+        int32_t _vpid;
+        int32_t _vtid;
+        integer { size = 8; align = 8; signed = 1; encoding = UTF8; base = 10; } _procname[17];
+    };'''
+
+
+_EVENT = '''
+event {{
+    name = "{name}";
+    id = {id};
+    stream_id = {stream_id};{loglevel}
+    fields := struct {{{fields}
+    }};
+}};
+'''
+
+
+_UUIDS = [
+    '2a6422d0-6cee-11e0-8c08-cb07d7b3a564',
+    '8ca2ea5b-9331-430c-b2bc-414a9989c5f5',
+]
+
+
+def _field(text):
+    return '\n        ' + text
+
+
+# The field templates: each one returns a list of field declarations
+# (`i` makes names unique within an event).
+def _f_int(rnd, i):
+    t = rnd.choice(['int32_t', 'int64_t', 'uint16_t', 'uint32_t',
+                    'uint64_t', 'long', 'unsigned long', 'uintptr_t'])
+
+    return [_field('{} _arg{};'.format(t, i))]
+
+
+def _f_inline_int(rnd, i):
+    size = rnd.choice([8, 16, 32, 64])
+    signed = rnd.randint(0, 1)
+    base = rnd.choice([10, 16])
+
+    return [_field('integer {{ size = {}; align = 8; signed = {}; encoding = none; base = {}; }} _arg{};'.format(size, signed, base, i))]
+
+
+def _f_float(rnd, i):
+    return [_field('{} _arg{};'.format(rnd.choice(['float', 'double']), i))]
+
+
+def _f_string(rnd, i):
+    return [_field('string _str{};'.format(i))]
+
+
+def _f_comm(rnd, i):
+    return [_field('integer {{ size = 8; align = 8; signed = 1; encoding = UTF8; base = 10; }} _comm{}[16];'.format(i))]
+
+
+def _f_enum(rnd, i):
+    t = rnd.choice(['task_state_t', 'ret_t'])
+
+    return [_field('{} _state{};'.format(t, i))]
+
+
+def _f_sequence(rnd, i):
+    t = rnd.choice(['uint8_t', 'uint64_t', 'int32_t'])
+
+    return [
+        _field('unsigned long _len{};'.format(i)),
+        _field('{} _seq{}[_len{}];'.format(t, i, i)),
+    ]
+
+
+def _f_nested(rnd, i):
+    return [_field('''struct {{
+            uint32_t family;
+            uint16_t port;
+            uint8_t addr[16];
+            struct {{
+                uint64_t sec;
+                uint32_t nsec;
+            }} time;
+            result_t result;
+        }} _nested{};'''.format(i))]
+
+
+def _f_variant(rnd, i):
+    return [
+        _field('tag_t _tag{};'.format(i)),
+        _field('''variant <_tag{}> {{
+            struct {{ }} TAG_NONE;
+            int64_t TAG_INT;
+            string TAG_STRING;
+            double TAG_DOUBLE;
+        }} _value{};'''.format(i, i)),
+    ]
+
+
+_FIELD_TEMPLATES = [
+    (_f_int, 8),
+    (_f_inline_int, 3),
+    (_f_float, 1),
+    (_f_string, 2),
+    (_f_comm, 1),
+    (_f_enum, 2),
+    (_f_sequence, 2),
+    (_f_nested, 1),
+    (_f_variant, 1),
+]
+
+
+_SUBSYSTEMS = [
+    'sched', 'syscall_entry', 'syscall_exit', 'irq', 'kmem', 'block',
+    'net', 'timer', 'power', 'writeback', 'lttng_ust_tracef', 'my_app',
+]
+
+
+def _event(rnd, stream_id, event_id, domain):
+    nfields = rnd.randint(1, 10)
+    templates = [t for t, w in _FIELD_TEMPLATES for i in range(w)]
+    fields = []
+
+    for i in range(nfields):
+        fields += rnd.choice(templates)(rnd, i)
+
+    name = '{}_{}_{}'.format(rnd.choice(_SUBSYSTEMS), stream_id, event_id)
+    loglevel = ''
+
+    # only user space events have a log level
+    if domain == 'ust':
+        loglevel = '\n    loglevel = {};'.format(rnd.randint(0, 14))
+
+    return _EVENT.format(name=name, id=event_id, stream_id=stream_id,
+                         loglevel=loglevel, fields=''.join(fields))
+
+
+# Returns a synthetic TSDL document with `streams` streams having
+# `events` event classes each. Kernel streams (the default) only have
+# an event header; user space streams ('ust') also have an event
+# context.
+def generate(streams=1, events=100, domain='kernel', seed=0):
+    rnd = random.Random(seed)
+    tracer_name = 'lttng-modules' if domain == 'kernel' else 'lttng-ust'
+    head = _HEAD.replace('{uuid}', _UUIDS[0])
+    head = head.replace('{clock_uuid}', _UUIDS[1])
+    head = head.replace('{hostname}', 'bench-host')
+    head = head.replace('{domain}', domain)
+    head = head.replace('{tracer_name}', tracer_name)
+    parts = [head]
+
+    for stream_id in range(streams):
+        # LTTng uses the large header when there are many event classes
+        header = 'event_header_compact'
+
+        if events > 31:
+            header = 'event_header_large'
+
+        context = _UST_CONTEXT if domain == 'ust' else ''
+        parts.append(_STREAM.format(id=stream_id, header=header,
+                                    context=context))
+
+    for stream_id in range(streams):
+        for event_id in range(events):
+            parts.append(_event(rnd, stream_id, event_id, domain))
+
+    return ''.join(parts)
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description='Generate a synthetic TSDL document')
+    ap.add_argument('-s', '--streams', type=int, default=1,
+                    help='number of streams')
+    ap.add_argument('-e', '--events', type=int, default=100,
+                    help='number of event classes per stream')
+    ap.add_argument('-d', '--domain', choices=['kernel', 'ust'],
+                    default='kernel', help='tracing domain to mimic')
+    ap.add_argument('--seed', type=int, default=0, help='random seed')
+
+    return ap.parse_args()
+
+
+def _main():
+    args = _parse_args()
+    sys.stdout.write(generate(args.streams, args.events, args.domain,
+                              args.seed))
+
+
+if __name__ == '__main__':
+    _main()
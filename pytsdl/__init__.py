@@ -1 +1,10 @@
-from .parser import Parser
+# pytsdl.Parser is only imported when first accessed, so that the other
+# modules (e.g. pytsdl.tsdl, to load cached documents) can be imported
+# without the parser
+def __getattr__(name):
+    if name == 'Parser':
+        from .parser import Parser
+
+        return Parser
+
+    raise AttributeError("module 'pytsdl' has no attribute '{}'".format(name))
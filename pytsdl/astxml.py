@@ -0,0 +1,216 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from pytsdl.parser import (
+    _List,
+    _SingleValue,
+    Node,
+    LiteralString,
+    ConstInteger,
+    ConstNumber,
+    Identifier,
+    PostfixExpr,
+    UnaryExpr,
+    PrimaryExpr,
+    UnaryExprSubscript,
+    ValueAssignment,
+    Integer,
+    FloatingPoint,
+    String,
+    TypeAlias,
+    EnumeratorValue,
+    ConstNumberRange,
+    EnumeratorRange,
+    Enumerator,
+    Enumerators,
+    Enum,
+    Dot,
+    Arrow,
+    Declarator,
+    TypeField,
+    IdentifierField,
+    StructRef,
+    StructAlign,
+    StructFull,
+    VariantTag,
+    VariantRef,
+    VariantFull,
+    TypeAssignment,
+    TopLevelScope,
+)
+
+
+# Returns the XML rendering of the AST node `node` (what str() returns
+# for a node), e.g.:
+#
+#   <value-assign><id>size</id><unary-expr><const-number>8</const-number></unary-expr></value-assign>
+#
+# Top-level scopes are rendered as elements named after their keyword
+# (`<top>` for the whole document).
+def to_xml(node):
+    chunks = []
+    _write(node, chunks)
+
+    return ''.join(chunks)
+
+
+# Appends the XML rendering of `obj` to `chunks`. Values which aren't
+# nodes are rendered as strings.
+def _write(obj, chunks):
+    writer = _writers.get(type(obj))
+
+    if writer is not None:
+        writer(obj, chunks)
+    elif isinstance(obj, TopLevelScope):
+        _write_elements('<{}>'.format(obj._scope_name), obj.entries,
+                        '</{}>'.format(obj._scope_name), chunks)
+    elif isinstance(obj, (_List, _SingleValue, Node)):
+        # intermediate objects: this is normally never exposed
+        raise RuntimeError()
+    else:
+        chunks.append(str(obj))
+
+
+def _write_elements(start, elements, end, chunks):
+    chunks.append(start)
+
+    for elem in elements:
+        _write(elem, chunks)
+
+    chunks.append(end)
+
+
+# Returns a writer of the nodes of which the values of the properties
+# `names` (if not None) are the children, in this order, of an XML
+# element named `tag`.
+def _element(tag, *names):
+    start = '<{}>'.format(tag)
+    end = '</{}>'.format(tag)
+
+    def write(node, chunks):
+        chunks.append(start)
+
+        for name in names:
+            child = getattr(node, name)
+
+            if child is not None:
+                _write(child, chunks)
+
+        chunks.append(end)
+
+    return write
+
+
+# Returns a writer of the nodes of which the elements (or `entries`) are
+# the children of an XML element named `tag`.
+def _list_element(tag, name='elements'):
+    start = '<{}>'.format(tag)
+    end = '</{}>'.format(tag)
+
+    def write(node, chunks):
+        _write_elements(start, getattr(node, name), end, chunks)
+
+    return write
+
+
+# Returns a writer of empty XML elements named `tag`.
+def _empty_element(tag):
+    xml = '<{} />'.format(tag)
+
+    def write(node, chunks):
+        chunks.append(xml)
+
+    return write
+
+
+def _write_declarator(decl, chunks):
+    chunks.append('<decl>')
+    _write(decl.name, chunks)
+
+    for s in decl.subscripts:
+        _write(s, chunks)
+
+    chunks.append('</decl>')
+
+
+def _write_struct_full(struct, chunks):
+    chunks.append('<struct-full>')
+
+    if struct.name is not None:
+        _write(struct.name, chunks)
+
+    for e in struct.entries:
+        _write(e, chunks)
+
+    if struct.align is not None:
+        _write(struct.align, chunks)
+
+    chunks.append('</struct-full>')
+
+
+def _write_variant_full(variant, chunks):
+    chunks.append('<variant-full>')
+
+    if variant.name is not None:
+        _write(variant.name, chunks)
+
+    if variant.tag is not None:
+        _write(variant.tag, chunks)
+
+    for e in variant.entries:
+        _write(e, chunks)
+
+    chunks.append('</variant-full>')
+
+
+_writers = {
+    LiteralString: _element('literal-string', 'value'),
+    ConstInteger: _element('const-int', 'value'),
+    ConstNumber: _element('const-number', 'value'),
+    Identifier: _element('id', 'value'),
+    PostfixExpr: _list_element('postfix-expr'),
+    UnaryExpr: _element('unary-expr', 'expr'),
+    PrimaryExpr: _element('primary-expr', 'expr'),
+    UnaryExprSubscript: _element('subscript-expr', 'value'),
+    ValueAssignment: _element('value-assign', 'key', 'value'),
+    Integer: _list_element('integer'),
+    FloatingPoint: _list_element('floating-point'),
+    String: _element('string', 'value'),
+    TypeAlias: _element('typealias', 'type', 'name'),
+    EnumeratorValue: _element('enum-value', 'key', 'value'),
+    ConstNumberRange: _element('const-int-range', 'low', 'high'),
+    EnumeratorRange: _element('enum-range', 'key', 'range'),
+    Enumerator: _element('enumerator', 'value'),
+    Enumerators: _list_element('enumerators'),
+    Enum: _element('enum', 'name', 'int_type', 'enumerators'),
+    Dot: _empty_element('dot'),
+    Arrow: _empty_element('arrow'),
+    Declarator: _write_declarator,
+    TypeField: _element('type-field', 'type', 'decl'),
+    IdentifierField: _element('id-field', 'type', 'decl'),
+    StructRef: _element('struct-ref', 'value'),
+    StructAlign: _element('struct-align', 'value'),
+    StructFull: _write_struct_full,
+    VariantTag: _element('tag', 'value'),
+    VariantRef: _element('variant-ref', 'name', 'tag'),
+    VariantFull: _write_variant_full,
+    TypeAssignment: _element('type-assign', 'key', 'type'),
+}
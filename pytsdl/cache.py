@@ -0,0 +1,229 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import collections
+import hashlib
+import pickle
+import os
+import gc
+
+
+# On-disk cache of parsed documents.
+#
+# Each entry is a pickled pytsdl.tsdl.Doc named after the SHA-256 hash
+# of the TSDL text it was created from. Pickling keeps the object graph
+# as is: type objects shared by several fields (aliases, named
+# structures, shallow variant copies) are still shared once loaded.
+#
+# The directory is bounded to `max_size` bytes: when it is exceeded,
+# the least recently used entries (oldest modification times, which
+# are refreshed on each hit) are removed.
+class DocCache:
+    # bump when the object model changes to invalidate older entries
+    _format_version = 9
+    _ext = '.doc'
+
+    def __init__(self, directory, max_size=64 * 1024 * 1024):
+        self._directory = directory
+        self._max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @staticmethod
+    def key_of(tsdl):
+        h = hashlib.sha256()
+        h.update('pytsdl-{}:'.format(DocCache._format_version).encode())
+        h.update(tsdl.encode('utf-8', 'surrogatepass'))
+
+        return h.hexdigest()
+
+    def _path_of(self, key):
+        return os.path.join(self._directory, key + DocCache._ext)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, tsdl):
+        path = self._path_of(DocCache.key_of(tsdl))
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        # unpickling creates tens of thousands of objects for large
+        # documents, which otherwise triggers many useless collections
+        gc_enabled = gc.isenabled()
+        gc.disable()
+
+        try:
+            doc = pickle.loads(data)
+        except Exception:
+            # corrupted or incompatible entry: forget it
+            DocCache._remove(path)
+
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return doc
+
+    def put(self, tsdl, doc):
+        path = self._path_of(DocCache.key_of(tsdl))
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(doc, f, pickle.HIGHEST_PROTOCOL)
+
+            # atomic: concurrent readers never see a partial entry
+            os.replace(tmp_path, path)
+        except OSError:
+            DocCache._remove(tmp_path)
+
+            return
+
+        self._evict()
+
+    def _entries(self):
+        entries = []
+
+        for name in os.listdir(self._directory):
+            if not name.endswith(DocCache._ext):
+                continue
+
+            path = os.path.join(self._directory, name)
+
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((st.st_mtime, st.st_size, path))
+
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(e[1] for e in entries)
+
+        if total <= self._max_size:
+            return
+
+        # least recently used first; always keep the most recent entry
+        entries.sort()
+
+        for mtime, size, path in entries[:-1]:
+            DocCache._remove(path)
+            total -= size
+
+            if total <= self._max_size:
+                break
+
+    def clear(self):
+        for mtime, size, path in self._entries():
+            DocCache._remove(path)
+
+
+# In-memory cache of the ASTs of top-level blocks, keyed by their text
+# (without surrounding whitespace).
+#
+# Parsing a block only depends on its text: aliases, structures and
+# variants are only resolved when visiting the AST. Documents sharing
+# blocks, like the metadata of different sessions of the same tracer
+# version, thus share their ASTs, which are never modified once built.
+#
+# The cache is bounded to `max_size` characters of block text (the AST
+# of a block takes about 25 bytes per character): when it is exceeded,
+# the least recently used entries are removed.
+class BlockCache:
+    def __init__(self, max_size=1024 * 1024):
+        self._max_size = max_size
+        self._size = 0
+        self._entries = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    # total number of characters of the cached blocks
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, block):
+        node = self._entries.get(block)
+
+        if node is None:
+            self._misses += 1
+
+            return None
+
+        self._entries.move_to_end(block)
+        self._hits += 1
+
+        return node
+
+    def put(self, block, node):
+        if len(block) > self._max_size or block in self._entries:
+            return
+
+        self._entries[block] = node
+        self._size += len(block)
+
+        while self._size > self._max_size:
+            block, node = self._entries.popitem(last=False)
+            self._size -= len(block)
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
@@ -0,0 +1,700 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import struct
+import pytsdl.tsdl
+import pytsdl.layout
+import pytsdl.decoder
+
+
+# Python code generation of decoding functions.
+#
+# The layout of an event record never changes once the metadata is
+# parsed, so instead of walking the type tree for each event record,
+# pytsdl.decoder.Decoder can run a Python function generated for each
+# event which:
+#
+#   * computes the offsets of fields at generation time as long as
+#     their position relative to the last dynamic field is known;
+#   * decodes consecutive byte-aligned 8/16/32/64-bit integers and
+#     32/64-bit floating point numbers with a single
+#     struct.unpack_from() call;
+#   * inlines alignment math and bit field extraction.
+#
+# Generated functions decode the same values as
+# pytsdl.decoder.Decoder, and their source is kept for debugging.
+
+
+_int_codes = {
+    8: 'b',
+    16: 'h',
+    32: 'i',
+    64: 'q',
+}
+
+
+_float_codes = {
+    (8, 24): 'f',
+    (11, 53): 'd',
+}
+
+
+# external scopes (decoded before calling the generated function) and
+# the names of the generated function's parameters holding them
+_external_scopes = {
+    'trace.packet.header': 'pkt_header',
+    'stream.packet.context': 'pkt_context',
+    'stream.event.header': 'header',
+}
+
+
+def _read_string(buf, pos):
+    pos = (pos + 7) & -8
+    start = pos >> 3
+    nul = pytsdl.decoder.find_nul(buf, start)
+
+    return (nul + 1) << 3, str(buf[start:nul], 'utf-8', 'replace')
+
+
+def _read_float(buf, pos, exp_dig, mant_dig, byte_order):
+    cursor = pytsdl.decoder.BitCursor(buf, pos)
+
+    try:
+        return cursor.read_float(exp_dig, mant_dig, byte_order)
+    finally:
+        cursor.release()
+
+
+def _no_variant_field(path, tag):
+    fmt = 'no variant field for tag {} = {}'
+
+    raise pytsdl.decoder.DecodeError(fmt.format(path, tag))
+
+
+class CompiledFunction:
+    def __init__(self, name, source, fn):
+        self._name = name
+        self._source = source
+        self._fn = fn
+
+    @property
+    def name(self):
+        return self._name
+
+    # generated Python source
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def fn(self):
+        return self._fn
+
+    def __call__(self, *args):
+        return self._fn(*args)
+
+
+# A field which is already generated, and which may be the target of a
+# variant tag or of a sequence length. `frame` is the dictionary of the
+# fields of a structure.
+class _Sym:
+    def __init__(self, t, expr, frame=None):
+        self.t = t
+        self.expr = expr
+        self.frame = frame
+
+
+class _Generator:
+    def __init__(self, doc, stream):
+        self._doc = doc
+        self._stream = stream
+        self._lines = []
+        self._indent = 1
+        self._nvars = 0
+        self._consts = {}
+        self._scope_frames = {}
+        self._frames = []
+
+        # The current position is `pos + self._off` bits, where `pos`
+        # is a runtime variable known to be aligned on
+        # `self._pos_align` bits.
+        self._off = 0
+        self._pos_align = 1
+
+        # pending merged struct.unpack_from() call: list of
+        # (byte offset, format, count, kind, target)
+        self._run = []
+        self._run_bo = None
+        self._deferred = []
+
+    def _new_var(self):
+        self._nvars += 1
+
+        return '_v{}'.format(self._nvars)
+
+    def _const(self, obj):
+        name = '_c{}'.format(len(self._consts))
+        self._consts[name] = obj
+
+        return name
+
+    def _emit(self, line):
+        self._lines.append('    ' * self._indent + line)
+
+    def _defer(self, line):
+        if self._run:
+            self._deferred.append((self._indent, line))
+        else:
+            self._emit(line)
+
+    def _flush(self):
+        if not self._run:
+            return
+
+        bo = '>' if self._run_bo is pytsdl.tsdl.ByteOrder.BE else '<'
+        start = self._run[0][0]
+        fmt = bo
+        cur = start
+        targets = []
+        simple = True
+
+        for byte_off, code, count, kind, target in self._run:
+            if byte_off > cur:
+                fmt += '{}x'.format(byte_off - cur)
+
+            fmt += code
+            cur = byte_off + struct.calcsize(bo + code)
+            targets.append((count, kind, target))
+
+            if kind != 'scalar':
+                simple = False
+
+        src = "_unpack_from('{}', buf, (pos >> 3) + {})".format(fmt, start)
+
+        if simple:
+            names = ', '.join(t[2] for t in targets)
+
+            if len(targets) == 1:
+                names += ','
+
+            self._emit('{} = {}'.format(names, src))
+        else:
+            self._emit('_t = {}'.format(src))
+            index = 0
+
+            for count, kind, target in targets:
+                if kind == 'scalar':
+                    self._emit('{} = _t[{}]'.format(target, index))
+                    index += 1
+                elif kind == 'text':
+                    self._emit('{} = _text(_t[{}])'.format(target, index))
+                    index += 1
+                else:
+                    self._emit('{} = list(_t[{}:{}])'.format(target, index,
+                                                             index + count))
+                    index += count
+
+        self._run = []
+        self._run_bo = None
+        indent = self._indent
+
+        for line_indent, line in self._deferred:
+            self._indent = line_indent
+            self._emit(line)
+
+        self._indent = indent
+        self._deferred = []
+
+    # makes `pos` the actual current position
+    def _sync(self):
+        self._flush()
+
+        if self._off:
+            self._emit('pos += {}'.format(self._off))
+            self._pos_align = min(self._pos_align, self._off & -self._off)
+            self._off = 0
+
+    def _align(self, align):
+        if align <= 1:
+            return
+
+        if align <= self._pos_align:
+            self._off = (self._off + align - 1) & -align
+
+            return
+
+        self._flush()
+        self._emit('pos = (pos + {}) & {}'.format(self._off + align - 1,
+                                                  -align))
+        self._off = 0
+        self._pos_align = align
+
+    def _byte_aligned(self):
+        return self._pos_align >= 8 and not self._off & 7
+
+    def _add_to_run(self, code, count, kind, target, byte_order):
+        if self._run_bo is not None and byte_order is not None and \
+                byte_order is not self._run_bo:
+            self._flush()
+
+        if byte_order is not None and self._run_bo is None:
+            self._run_bo = byte_order
+
+        self._run.append((self._off >> 3, code, count, kind, target))
+
+    # struct format of a byte-aligned scalar type, or None
+    def _scalar_code(self, t):
+        tt = type(t)
+
+        if tt is pytsdl.tsdl.Enum:
+            t = t.integer
+            tt = type(t)
+
+        if tt is pytsdl.tsdl.Integer:
+            code = _int_codes.get(t.size)
+
+            if code is None:
+                return None, None
+
+            if not t.signed:
+                code = code.upper()
+
+            bo = t.byte_order if t.size > 8 else None
+
+            return code, bo
+
+        if tt is pytsdl.tsdl.FloatingPoint:
+            return _float_codes.get((t.exp_dig, t.mant_dig)), t.byte_order
+
+        return None, None
+
+    # struct format of byte-aligned array/sequence elements, or None:
+    # elements mapped to a clock need individual clock updates
+    def _element_code(self, t):
+        it = t.integer if type(t) is pytsdl.tsdl.Enum else t
+
+        if type(it) is pytsdl.tsdl.Integer and it.map is not None:
+            return None, None
+
+        return self._scalar_code(t)
+
+    @staticmethod
+    def _size_of_code(code):
+        return struct.calcsize('<' + code) * 8
+
+    def _gen(self, t, target):
+        tt = type(t)
+
+        if tt is pytsdl.tsdl.Integer:
+            self._gen_integer(t, target)
+        elif tt is pytsdl.tsdl.Enum:
+            self._gen_integer(t.integer, target)
+        elif tt is pytsdl.tsdl.FloatingPoint:
+            self._gen_floating_point(t, target)
+        elif tt is pytsdl.tsdl.String:
+            self._gen_string(t, target)
+        elif tt is pytsdl.tsdl.Struct:
+            self._gen_struct(t, target)
+        elif tt is pytsdl.tsdl.Variant:
+            self._gen_variant(t, target)
+        elif tt is pytsdl.tsdl.Array:
+            self._gen_array(t, target)
+        elif tt is pytsdl.tsdl.Sequence:
+            self._gen_sequence(t, target)
+        else:
+            raise TypeError('cannot generate code for {}'.format(t))
+
+    def _gen_integer(self, t, target):
+        self._align(t.align)
+        code, bo = self._scalar_code(t)
+        size = t.size
+
+        if code is not None and self._byte_aligned():
+            self._add_to_run(code, 1, 'scalar', target, bo)
+            self._off += size
+            self._gen_clock_update(t, target)
+
+            return
+
+        big_endian = t.byte_order is pytsdl.tsdl.ByteOrder.BE
+        order = 'big' if big_endian else 'little'
+        self._flush()
+
+        if self._byte_aligned() and not size & 7:
+            start = self._off >> 3
+            fmt = "{} = _from_bytes(buf[(pos >> 3) + {}:(pos >> 3) + {}], '{}', signed={})"
+            self._emit(fmt.format(target, start, start + (size >> 3), order,
+                                  t.signed))
+        elif self._pos_align >= 8:
+            # bit field at a known bit offset
+            start = self._off >> 3
+            bit = self._off & 7
+            last = (self._off + size + 7) >> 3
+
+            if big_endian:
+                shift = ((last - start) << 3) - bit - size
+            else:
+                shift = bit
+
+            fmt = "{} = (_from_bytes(buf[(pos >> 3) + {}:(pos >> 3) + {}], '{}') >> {}) & {}"
+            self._emit(fmt.format(target, start, last, order, shift,
+                                  (1 << size) - 1))
+
+            if t.signed:
+                self._emit('if {} >> {}:'.format(target, size - 1))
+                self._emit('    {} -= {}'.format(target, 1 << size))
+        else:
+            fmt = '{} = _unpack_bits(buf, pos + {}, {}, {}, {})'
+            self._emit(fmt.format(target, self._off, size, t.signed,
+                                  big_endian))
+
+        self._off += size
+        self._gen_clock_update(t, target)
+
+    # integers mapped to a clock update the clock value, clk[0]
+    def _gen_clock_update(self, t, target):
+        if t.map is None:
+            return
+
+        self._defer('clk[0] = _update_clock(clk[0], {}, {})'.format(target,
+                                                                    t.size))
+
+    def _gen_floating_point(self, t, target):
+        self._align(t.align)
+        code, bo = self._scalar_code(t)
+
+        if code is not None and self._byte_aligned():
+            self._add_to_run(code, 1, 'scalar', target, bo)
+            self._off += t.exp_dig + t.mant_dig
+
+            return
+
+        self._flush()
+        fmt = '{} = _read_float(buf, pos + {}, {}, {}, {})'
+        self._emit(fmt.format(target, self._off, t.exp_dig, t.mant_dig,
+                              self._const(t.byte_order)))
+        self._off += t.exp_dig + t.mant_dig
+
+    def _gen_string(self, t, target):
+        self._sync()
+        self._emit('pos, {} = _read_string(buf, pos)'.format(target))
+        self._pos_align = 8
+
+    def _gen_struct(self, t, target):
+        self._align(pytsdl.layout.layout_of(t).align)
+        frame = {}
+
+        if not self._frames:
+            self._scope_frames[self._scope_name] = frame
+
+        self._frames.append(frame)
+        names = []
+
+        for name, ft in t.fields.items():
+            var = self._new_var()
+            sym = _Sym(ft, var)
+            self._gen(ft, var)
+
+            if type(ft) is pytsdl.tsdl.Struct:
+                sym.frame = self._last_frame
+
+            frame[name] = sym
+            names.append('{!r}: {}'.format(name, var))
+
+        self._last_frame = self._frames.pop()
+        self._defer('{} = {{{}}}'.format(target, ', '.join(names)))
+
+    @staticmethod
+    def _is_text(element):
+        return pytsdl.decoder.Decoder._is_text(element)
+
+    def _gen_loop(self, element, count_expr, target):
+        self._sync()
+        self._emit('{} = []'.format(target))
+        self._emit('for _ in range({}):'.format(count_expr))
+        self._indent += 1
+        self._pos_align = 1
+        elem_var = self._new_var()
+        self._gen(element, elem_var)
+        self._sync()
+        self._emit('{}.append({})'.format(target, elem_var))
+        self._indent -= 1
+        self._pos_align = 1
+
+    def _gen_array(self, t, target):
+        element = t.element
+        elem_align = pytsdl.layout.layout_of(element).align
+
+        if self._is_text(element):
+            self._align(max(elem_align, 8))
+            self._add_to_run('{}s'.format(t.length), 1, 'text', target, None)
+            self._off += t.length * 8
+
+            return
+
+        self._align(elem_align)
+
+        if self._byte_aligned():
+
+            code, bo = self._element_code(element)
+
+            if code is not None and self._size_of_code(code) % elem_align == 0:
+                self._add_to_run('{}{}'.format(t.length, code), t.length,
+                                 'list', target, bo)
+                self._off += t.length * self._size_of_code(code)
+
+                return
+
+        self._gen_loop(element, t.length, target)
+
+    def _gen_sequence(self, t, target):
+        length_sym = self._lookup(t.length)
+
+        if type(length_sym.t) not in (pytsdl.tsdl.Integer, pytsdl.tsdl.Enum):
+            path = '.'.join(t.length)
+            msg = 'sequence length is not an integer: {}'.format(path)
+            raise pytsdl.decoder.DecodeError(msg)
+
+        element = t.element
+        elem_align = pytsdl.layout.layout_of(element).align
+        length = length_sym.expr
+
+        if self._is_text(element):
+            self._align(max(elem_align, 8))
+            self._sync()
+            fmt = '{} = _text(bytes(buf[pos >> 3:(pos >> 3) + {}]))'
+            self._emit(fmt.format(target, length))
+            self._emit('pos += {} << 3'.format(length))
+            self._pos_align = 8
+
+            return
+
+        self._align(elem_align)
+        self._sync()
+
+        if self._pos_align >= 8:
+            code, bo = self._element_code(element)
+
+            if code is not None and self._size_of_code(code) % elem_align == 0:
+                size = self._size_of_code(code)
+                bo = '>' if bo is pytsdl.tsdl.ByteOrder.BE else '<'
+                fmt = "{} = list(_unpack_from('{}%d{}' % {}, buf, pos >> 3))"
+                self._emit(fmt.format(target, bo, code, length))
+                self._emit('pos += {} * {}'.format(length, size))
+
+                if size & -size < self._pos_align:
+                    self._pos_align = size & -size
+
+                return
+
+        self._gen_loop(element, length, target)
+
+    def _gen_variant(self, t, target):
+        if t.tag is None:
+            # only accepted by non-strict parsers
+            raise pytsdl.decoder.DecodeError('variant has no tag')
+
+        tag_sym = self._lookup(t.tag)
+        path = '.'.join(t.tag)
+
+        if type(tag_sym.t) is not pytsdl.tsdl.Enum:
+            msg = 'variant tag is not an enumeration: {}'.format(path)
+            raise pytsdl.decoder.DecodeError(msg)
+
+        # each branch starts at the same static offset
+        self._flush()
+        label_of = self._const(tag_sym.t.label_of)
+        label_var = self._new_var()
+        self._emit('{} = {}({})'.format(label_var, label_of, tag_sym.expr))
+        pos_align = self._pos_align
+        off = self._off
+        end_align = pos_align
+        keyword = 'if'
+
+        for name, ft in t.fields.items():
+            self._emit('{} {} == {!r}:'.format(keyword, label_var, name))
+            self._indent += 1
+            self._pos_align = pos_align
+            self._off = off
+            self._gen(ft, target)
+            self._sync()
+            end_align = min(end_align, self._pos_align)
+            self._indent -= 1
+            keyword = 'elif'
+
+        if keyword == 'elif':
+            self._emit('else:')
+            self._indent += 1
+
+        self._emit('_no_variant_field({!r}, {})'.format(path, tag_sym.expr))
+
+        if keyword == 'elif':
+            self._indent -= 1
+
+        self._pos_align = end_align
+
+    @staticmethod
+    def _walk(sym, path):
+        for name in path:
+            if sym.frame is None or name not in sym.frame:
+                return None
+
+            sym = sym.frame[name]
+
+        return sym
+
+    @staticmethod
+    def _walk_external(t, expr, path):
+        for name in path:
+            if type(t) is not pytsdl.tsdl.Struct or name not in t.fields:
+                return None
+
+            t = t.fields[name]
+            expr += '[{!r}]'.format(name)
+
+        return _Sym(t, expr)
+
+    def _external_scope_type(self, scope_name):
+        if scope_name == 'trace.packet.header':
+            if self._doc.trace is None:
+                return None
+
+            return self._doc.trace.packet_header
+
+        if scope_name == 'stream.packet.context':
+            return self._stream.packet_context
+
+        return self._stream.event_header
+
+    # same lookup rules as pytsdl.decoder.Decoder._lookup()
+    def _lookup(self, path):
+        self._flush()
+        sym = None
+
+        for prefix, scope_name in pytsdl.decoder.Decoder._scope_paths:
+            if tuple(path[0:len(prefix)]) != prefix:
+                continue
+
+            rest = path[len(prefix):]
+
+            if scope_name in self._scope_frames:
+                root = _Sym(None, None, self._scope_frames[scope_name])
+                sym = self._walk(root, rest)
+            elif scope_name in _external_scopes:
+                t = self._external_scope_type(scope_name)
+
+                if t is not None:
+                    sym = self._walk_external(t, _external_scopes[scope_name],
+                                              rest)
+
+            break
+        else:
+            for frame in reversed(self._frames):
+                if path[0] in frame:
+                    sym = self._walk(_Sym(None, None, frame), path)
+
+                    if sym is not None:
+                        break
+
+        if sym is None:
+            msg = 'cannot find field: {}'.format('.'.join(path))
+            raise pytsdl.decoder.DecodeError(msg)
+
+        return sym
+
+    def gen_scope(self, scope_name, t):
+        self._scope_name = scope_name
+        self._frames = []
+
+        if t is None:
+            return 'None'
+
+        target = self._new_var()
+        self._gen(t, target)
+
+        return target
+
+    def finish(self, name, params, results):
+        self._sync()
+        self._emit('return pos, {}'.format(', '.join(results)))
+        source = 'def {}(buf, pos, {}):\n'.format(name, ', '.join(params))
+        source += '\n'.join(self._lines) + '\n'
+        namespace = {
+            '_unpack_from': struct.unpack_from,
+            '_from_bytes': int.from_bytes,
+            '_unpack_bits': pytsdl.decoder.unpack_bits,
+            '_text': pytsdl.decoder.text_from_bytes,
+            '_read_string': _read_string,
+            '_read_float': _read_float,
+            '_no_variant_field': _no_variant_field,
+            '_update_clock': pytsdl.decoder.update_clock,
+        }
+        namespace.update(self._consts)
+        exec(compile(source, '<pytsdl:{}>'.format(name), 'exec'), namespace)
+
+        return CompiledFunction(name, source, namespace[name])
+
+
+# Returns the pytsdl.codegen.CompiledFunction decoding the event header
+# of `stream`:
+#
+#   fn(buf, pos, pkt_header, pkt_context, clk) -> (pos, header)
+#
+# `clk` is a single-item list holding the current clock value, updated
+# by the integers mapped to a clock.
+#
+# The result is cached on the stream object.
+def compile_event_header(doc, stream):
+    if stream._compiled_header is not None:
+        return stream._compiled_header
+
+    gen = _Generator(doc, stream)
+    header = gen.gen_scope('stream.event.header', stream.event_header)
+    name = 'decode_stream_{}_event_header'.format(stream.id)
+    fn = gen.finish(name, ['pkt_header', 'pkt_context', 'clk'], [header])
+    stream._compiled_header = fn
+
+    return fn
+
+
+# Returns the pytsdl.codegen.CompiledFunction decoding the stream event
+# context, the event context and the payload of `event`, which belongs
+# to `stream`:
+#
+#   fn(buf, pos, pkt_header, pkt_context, header, clk) ->
+#       (pos, stream_context, context, fields)
+#
+# The result is cached on the event object.
+def compile_event(doc, stream, event):
+    if event._compiled is not None:
+        return event._compiled
+
+    gen = _Generator(doc, stream)
+    stream_context = gen.gen_scope('stream.event.context',
+                                   stream.event_context)
+    context = gen.gen_scope('event.context', event.context)
+    fields = gen.gen_scope('event.fields', event.fields)
+    name = 'decode_stream_{}_event_{}'.format(stream.id, event.id)
+    fn = gen.finish(name, ['pkt_header', 'pkt_context', 'header', 'clk'],
+                    [stream_context, context, fields])
+    event._compiled = fn
+
+    return fn
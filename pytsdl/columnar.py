@@ -0,0 +1,334 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import array
+import struct
+import mmap
+import os
+import pytsdl.tsdl
+import pytsdl.layout
+import pytsdl.decoder
+import pytsdl.codegen
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Columnar decoding of fixed-layout events with NumPy.
+#
+# The payload of an event is vectorizable when it's a statically sized
+# structure of which all the members are byte-aligned 8/16/32/64-bit
+# integers (or enumerations), 32/64-bit floating point numbers, and
+# arrays/structures of those. Such a payload maps to a NumPy structured
+# data type; the decoder only needs to find where each event record's
+# payload starts, and then copies all the payloads of a given event
+# into a structured array at once.
+#
+# Text arrays (arrays of 8-bit encoded integers) become NumPy bytes
+# (`S<length>`) columns.
+
+
+def _check_numpy():
+    if numpy is None:
+        raise ImportError('NumPy is needed for columnar decoding')
+
+
+def _bo_char(byte_order):
+    if byte_order is pytsdl.tsdl.ByteOrder.BE:
+        return '>'
+
+    return '<'
+
+
+_float_kinds = {
+    (8, 24): 'f4',
+    (11, 53): 'f8',
+}
+
+
+def _dtype_of_integer(t):
+    if t.size not in (8, 16, 32, 64):
+        return None
+
+    kind = 'i' if t.signed else 'u'
+
+    return numpy.dtype('{}{}{}'.format(_bo_char(t.byte_order), kind,
+                                       t.size // 8))
+
+
+def _dtype_of_floating_point(t):
+    kind = _float_kinds.get((t.exp_dig, t.mant_dig))
+
+    if kind is None:
+        return None
+
+    return numpy.dtype(_bo_char(t.byte_order) + kind)
+
+
+def _dtype_of_array(t):
+    element = t.element
+
+    if pytsdl.decoder.Decoder._is_text(element):
+        return numpy.dtype('S{}'.format(t.length))
+
+    el = pytsdl.layout.layout_of(element)
+
+    # a subarray cannot have padding between elements
+    if not el.static or el.size % el.align:
+        return None
+
+    edtype = dtype_of(element)
+
+    if edtype is None:
+        return None
+
+    return numpy.dtype((edtype, (t.length,)))
+
+
+def _dtype_of_struct(t):
+    layout = pytsdl.layout.layout_of(t)
+
+    if not layout.static or layout.size & 7:
+        return None
+
+    names = []
+    formats = []
+    offsets = []
+
+    for name, ft in t.fields.items():
+        offset = layout.offsets[name]
+
+        if offset & 7:
+            return None
+
+        fdtype = dtype_of(ft)
+
+        if fdtype is None:
+            return None
+
+        names.append(name)
+        formats.append(fdtype)
+        offsets.append(offset >> 3)
+
+    return numpy.dtype({
+        'names': names,
+        'formats': formats,
+        'offsets': offsets,
+        'itemsize': layout.size >> 3,
+    })
+
+
+# Returns the NumPy data type of a type, or None if it's not
+# vectorizable.
+def dtype_of(t):
+    _check_numpy()
+    tt = type(t)
+
+    if tt is pytsdl.tsdl.Integer:
+        return _dtype_of_integer(t)
+    elif tt is pytsdl.tsdl.Enum:
+        return _dtype_of_integer(t.integer)
+    elif tt is pytsdl.tsdl.FloatingPoint:
+        return _dtype_of_floating_point(t)
+    elif tt is pytsdl.tsdl.Array:
+        return _dtype_of_array(t)
+    elif tt is pytsdl.tsdl.Struct:
+        return _dtype_of_struct(t)
+
+    return None
+
+
+# Event records are found with the generated event header decoding
+# functions (see pytsdl.codegen). When the stream event context and
+# the event context are also statically sized, the position of the
+# payload of a vectorizable event is computed without decoding them;
+# otherwise the event record is decoded, and its payload is the last
+# `size` bits.
+#
+# Events which are not vectorizable are skipped.
+class ColumnarDecoder:
+    def __init__(self, doc):
+        _check_numpy()
+        self._doc = doc
+        self._decoder = pytsdl.decoder.Decoder(doc)
+        self._dtypes = {}
+
+    @property
+    def doc(self):
+        return self._doc
+
+    # NumPy structured data type of the payload of `event`, or None if
+    # it's not vectorizable.
+    def dtype_of_event(self, event):
+        key = id(event)
+
+        if key in self._dtypes:
+            return self._dtypes[key]
+
+        dtype = None
+
+        if event.fields is not None:
+            dtype = dtype_of(event.fields)
+
+        self._dtypes[key] = dtype
+
+        return dtype
+
+    # Returns (offsets, dtype) for each vectorizable event name
+    # (filtered by `names` when not None), where offsets is an array of
+    # the byte offsets of the payloads in `data`.
+    def _scan(self, data, names):
+        plans = {}
+        get_plan = plans.get
+        get_event = self._decoder._get_event
+        doc = self._doc
+        cursor = pytsdl.decoder.BitCursor(data)
+        buf = cursor.buf
+
+        try:
+            for packet in self._decoder.packets(data):
+                stream = packet.stream
+                header_fn = pytsdl.codegen.compile_event_header(doc,
+                                                                stream).fn
+                pos = packet.events_pos
+                end = (packet.offset << 3) + packet.content_size
+                pkt_header = packet.header
+                pkt_context = packet.context
+                clk = [0]
+
+                while pos < end:
+                    start = pos
+
+                    try:
+                        pos, header = header_fn(buf, pos, pkt_header,
+                                                pkt_context, clk)
+                        event = get_event(stream, header)
+                        plan = get_plan(event)
+
+                        if plan is None:
+                            plan = self._plan(stream, event, names)
+                            plans[event] = plan
+
+                        steps, fn, size, payload_offsets = plan
+
+                        if fn is None:
+                            for align, ssize in steps:
+                                pos = ((pos + align - 1) & -align) + ssize
+                        else:
+                            pos = fn(buf, pos, pkt_header, pkt_context,
+                                     header, clk)[0]
+                    except (struct.error, IndexError, ValueError):
+                        fmt = 'not enough data for event at bit {} of packet at offset {}'
+                        raise pytsdl.decoder.DecodeError(fmt.format(start,
+                                                                    packet.offset))
+
+                    if pos > end:
+                        fmt = 'event {} exceeds packet content at offset {}'
+                        raise pytsdl.decoder.DecodeError(fmt.format(event.name,
+                                                                    packet.offset))
+
+                    # the payload is the last scope of the event record
+                    if payload_offsets is not None:
+                        payload_offsets.append((pos - size) >> 3)
+        finally:
+            cursor.release()
+
+        offsets = {}
+
+        for event, plan in plans.items():
+            if plan[3] is not None:
+                offsets[event.name] = (plan[3], self.dtype_of_event(event))
+
+        return offsets
+
+    # Returns (steps, fn, size, payload_offsets) for an event:
+    #
+    #   * steps: (alignment, size) of each scope after the header, if
+    #     they are all statically sized
+    #   * fn: generated decoding function of the event record (after
+    #     its header) if it's not statically sized, else None
+    #   * size: size (bits) of the payload if collected, else 0
+    #   * payload_offsets: array receiving the byte offsets of the
+    #     payloads if collected, else None
+    def _plan(self, stream, event, names):
+        dtype = self.dtype_of_event(event)
+        collect = dtype is not None and (names is None or event.name in names)
+        steps = []
+        fn = None
+
+        for t in (stream.event_context, event.context, event.fields):
+            if t is None:
+                continue
+
+            layout = pytsdl.layout.layout_of(t)
+
+            if not layout.static:
+                fn = pytsdl.codegen.compile_event(self._doc, stream, event).fn
+                break
+
+            steps.append((layout.align, layout.size))
+
+        size = 0
+        payload_offsets = None
+
+        if collect:
+            size = dtype.itemsize << 3
+            payload_offsets = array.array('q')
+
+        return steps, fn, size, payload_offsets
+
+    # Decodes the payloads of the vectorizable events of a data stream
+    # (any object supporting the buffer protocol) and returns a dict
+    # mapping event names to dicts of columns (NumPy arrays, one
+    # element per event record, in stream order), indexed by payload
+    # field name. `names` restricts decoding to some event names.
+    def decode(self, data, names=None):
+        if names is not None:
+            names = set(names)
+
+        columns = {}
+        raw = numpy.frombuffer(data, dtype=numpy.uint8)
+
+        for name, (offsets, dtype) in self._scan(data, names).items():
+            offsets = numpy.frombuffer(offsets, dtype=numpy.int64)
+            itemsize = dtype.itemsize
+
+            # gather all the payloads at once, through a view of all the
+            # `itemsize`-byte windows of `raw` (without copying it), then
+            # reinterpret them
+            windows = numpy.lib.stride_tricks.as_strided(
+                raw, shape=(len(raw) - itemsize + 1, itemsize),
+                strides=(1, 1), writeable=False)
+            records = windows[offsets].view(dtype).reshape(len(offsets))
+            columns[name] = {f: records[f] for f in dtype.names}
+
+        return columns
+
+    # Like decode(), but with a memory-mapped data stream file.
+    def decode_file(self, path, names=None):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return {}
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return self.decode(m, names)
@@ -0,0 +1,802 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import struct
+import mmap
+import os
+import pytsdl.tsdl
+import pytsdl.layout
+import pytsdl.resolve
+import pytsdl.codegen
+
+
+CTF_MAGIC = 0xc1fc1fc1
+
+
+class DecodeError(RuntimeError):
+    def __init__(self, str):
+        super().__init__(str)
+
+
+# Returns the value of the `size`-bit integer starting at bit `pos` of
+# `buf`, whatever its alignment.
+def unpack_bits(buf, pos, size, signed, big_endian):
+    start = pos >> 3
+    last = (pos + size + 7) >> 3
+
+    if big_endian:
+        raw = int.from_bytes(buf[start:last], 'big')
+        raw >>= ((last - start) << 3) - (pos & 7) - size
+    else:
+        raw = int.from_bytes(buf[start:last], 'little')
+        raw >>= pos & 7
+
+    value = raw & ((1 << size) - 1)
+
+    if signed and value >> (size - 1):
+        value -= 1 << size
+
+    return value
+
+
+# Returns the new value of a clock of which the `size` low-order bits
+# are updated to `value` (an integer field mapped to this clock):
+# partial-width clock values (e.g. 27-bit compact timestamps) wrap
+# around when they're lower than the current low-order bits.
+def update_clock(cur, value, size):
+    if size >= 64:
+        return value
+
+    mask = (1 << size) - 1
+    new = (cur & ~mask) | value
+
+    if value < (cur & mask):
+        new += mask + 1
+
+    return new
+
+
+# Returns the index of the first null byte of `buf` from index `start`.
+def find_nul(buf, start):
+    total = len(buf)
+    chunk_start = start
+    chunk_len = 64
+
+    # look for the null terminator chunk by chunk so as to never copy
+    # more than twice the string's length
+    while chunk_start < total:
+        chunk = bytes(buf[chunk_start:chunk_start + chunk_len])
+        nul = chunk.find(b'\0')
+
+        if nul >= 0:
+            return nul + chunk_start
+
+        chunk_start += chunk_len
+        chunk_len <<= 1
+
+    raise DecodeError('unterminated string at byte {}'.format(start))
+
+
+# Decodes the content of an array or sequence of encoded 8-bit
+# integers, which ends at its first null byte, if any.
+def text_from_bytes(raw):
+    nul = raw.find(b'\0')
+
+    if nul >= 0:
+        raw = raw[:nul]
+
+    return str(raw, 'utf-8', 'replace')
+
+
+# Bit position cursor over a binary buffer.
+#
+# The same cursor is reused for all the packets and events of a data
+# stream: only its position (in bits from the beginning of the buffer)
+# changes.
+class BitCursor:
+    _float_formats = {
+        (8, 24): 'f',
+        (11, 53): 'd',
+    }
+
+    def __init__(self, data, pos=0):
+        self._view = memoryview(data)
+        self._buf = self._view.cast('B')
+        self._size = len(self._buf) * 8
+        self.pos = pos
+
+    def release(self):
+        self._buf.release()
+        self._view.release()
+
+    @property
+    def buf(self):
+        return self._buf
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def remaining(self):
+        return self._size - self.pos
+
+    def align(self, align):
+        self.pos = (self.pos + align - 1) & -align
+
+    def skip(self, bits):
+        self.pos += bits
+
+    def _check(self, end):
+        if end > self._size:
+            fmt = 'not enough data: need {} bits at bit {}, have {}'
+            raise DecodeError(fmt.format(end - self.pos, self.pos, self._size))
+
+    def read_int(self, size, signed, byte_order):
+        pos = self.pos
+        end = pos + size
+
+        if end > self._size:
+            self._check(end)
+
+        big_endian = byte_order is pytsdl.tsdl.ByteOrder.BE
+        self.pos = end
+
+        if not pos & 7 and not size & 7:
+            # byte-aligned, whole bytes: fast path
+            return int.from_bytes(self._buf[pos >> 3:end >> 3],
+                                  'big' if big_endian else 'little',
+                                  signed=signed)
+
+        return unpack_bits(self._buf, pos, size, signed, big_endian)
+
+    def read_float(self, exp_dig, mant_dig, byte_order):
+        fmt = self._float_formats.get((exp_dig, mant_dig))
+
+        if fmt is None:
+            msg = 'unsupported floating point number: {} exponent digits, ' \
+                  '{} mantissa digits'
+            raise DecodeError(msg.format(exp_dig, mant_dig))
+
+        size = exp_dig + mant_dig
+        bo = '>' if byte_order is pytsdl.tsdl.ByteOrder.BE else '<'
+
+        if self.pos & 7:
+            raw = self.read_int(size, False, byte_order)
+
+            data = raw.to_bytes(size >> 3, 'big' if bo == '>' else 'little')
+
+            return struct.unpack(bo + fmt, data)[0]
+
+        end = self.pos + size
+
+        if end > self._size:
+            self._check(end)
+
+        value = struct.unpack_from(bo + fmt, self._buf, self.pos >> 3)[0]
+        self.pos = end
+
+        return value
+
+    def read_bytes(self, nbytes):
+        self.align(8)
+        start = self.pos >> 3
+        end = self.pos + (nbytes << 3)
+
+        if end > self._size:
+            self._check(end)
+
+        self.pos = end
+
+        return self._buf[start:start + nbytes]
+
+    def read_string(self):
+        self.align(8)
+        start = self.pos >> 3
+        nul = find_nul(self._buf, start)
+        self.pos = (nul + 1) << 3
+
+        return str(self._buf[start:nul], 'utf-8', 'replace')
+
+
+class Packet:
+    def __init__(self, stream, offset, header, context, size, content_size,
+                 events_pos):
+        self._stream = stream
+        self._offset = offset
+        self._header = header
+        self._context = context
+        self._size = size
+        self._content_size = content_size
+        self._events_pos = events_pos
+
+    # pytsdl.tsdl.Stream of this packet
+    @property
+    def stream(self):
+        return self._stream
+
+    # offset of this packet within the data stream (bytes)
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def header(self):
+        return self._header
+
+    @property
+    def context(self):
+        return self._context
+
+    # total size of this packet, padding included (bits)
+    @property
+    def size(self):
+        return self._size
+
+    # size of the packet content (bits)
+    @property
+    def content_size(self):
+        return self._content_size
+
+    # absolute position of the first event within the data stream (bits)
+    @property
+    def events_pos(self):
+        return self._events_pos
+
+
+class EventRecord:
+    def __init__(self, packet, event, timestamp, header, stream_context,
+                 context, fields):
+        self._packet = packet
+        self._event = event
+        self._timestamp = timestamp
+        self._header = header
+        self._stream_context = stream_context
+        self._context = context
+        self._fields = fields
+
+    @property
+    def packet(self):
+        return self._packet
+
+    # pytsdl.tsdl.Event of this record
+    @property
+    def event(self):
+        return self._event
+
+    @property
+    def name(self):
+        return self._event.name
+
+    # value of the stream's clock (cycles) once the event header is
+    # decoded: the packet's beginning timestamp, updated by the integers
+    # mapped to a clock (see update_clock())
+    @property
+    def timestamp(self):
+        return self._timestamp
+
+    @property
+    def header(self):
+        return self._header
+
+    @property
+    def stream_context(self):
+        return self._stream_context
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def fields(self):
+        return self._fields
+
+    def __getitem__(self, key):
+        return self._fields[key]
+
+
+# Decodes the binary packets and events of a CTF data stream, as
+# described by a pytsdl.tsdl.Doc.
+#
+# Decoded values are plain Python objects:
+#
+#   * integers and enumerations: int
+#   * floating point numbers: float
+#   * strings and arrays/sequences of encoded 8-bit integers: str
+#   * arrays and sequences: list
+#   * structures: dict (field name -> value)
+#   * variants: value of the selected field
+#
+# When `compiled` is true, event headers and event records are decoded
+# by functions generated by pytsdl.codegen instead of walking the type
+# tree for each record.
+class Decoder:
+    _scope_paths = pytsdl.resolve.scope_paths
+
+    def __init__(self, doc, compiled=True):
+        self._doc = doc
+        self._compiled = compiled
+        self._decode_map = {
+            pytsdl.tsdl.Integer: self._decode_integer,
+            pytsdl.tsdl.Enum: self._decode_enum,
+            pytsdl.tsdl.FloatingPoint: self._decode_floating_point,
+            pytsdl.tsdl.String: self._decode_string,
+            pytsdl.tsdl.Struct: self._decode_struct,
+            pytsdl.tsdl.Variant: self._decode_variant,
+            pytsdl.tsdl.Array: self._decode_array,
+            pytsdl.tsdl.Sequence: self._decode_sequence,
+        }
+        self._cursor = None
+        self._clock = 0
+        self._scopes = {}
+        self._frames = []
+
+    @property
+    def doc(self):
+        return self._doc
+
+    @property
+    def compiled(self):
+        return self._compiled
+
+    # Effective alignment of a type (bits), see pytsdl.layout.
+    @staticmethod
+    def align_of(t):
+        return pytsdl.layout.layout_of(t).align
+
+    def decode(self, t, cursor):
+        self._cursor = cursor
+
+        return self._decode(t)
+
+    def _decode(self, t):
+        return self._decode_map[type(t)](t)
+
+    def _decode_integer(self, t):
+        cursor = self._cursor
+
+        if t.align > 1:
+            cursor.align(t.align)
+
+        value = cursor.read_int(t.size, t.signed, t.byte_order)
+
+        if t.map is not None:
+            self._clock = update_clock(self._clock, value, t.size)
+
+        return value
+
+    def _decode_enum(self, t):
+        return self._decode_integer(t.integer)
+
+    def _decode_floating_point(self, t):
+        cursor = self._cursor
+
+        if t.align > 1:
+            cursor.align(t.align)
+
+        return cursor.read_float(t.exp_dig, t.mant_dig, t.byte_order)
+
+    def _decode_string(self, t):
+        return self._cursor.read_string()
+
+    def _decode_struct(self, t):
+        align = self.align_of(t)
+
+        if align > 1:
+            self._cursor.align(align)
+
+        value = {}
+        self._frames.append((t, value))
+
+        try:
+            for name, ft in t.fields.items():
+                value[name] = self._decode_map[type(ft)](ft)
+        finally:
+            self._frames.pop()
+
+        return value
+
+    @staticmethod
+    def _is_text(element):
+        return (type(element) is pytsdl.tsdl.Integer and element.size == 8 and
+                element.encoding is not pytsdl.tsdl.Encoding.NONE)
+
+    def _decode_text(self, length):
+        return text_from_bytes(bytes(self._cursor.read_bytes(length)))
+
+    def _decode_elements(self, element, length):
+        if Decoder._is_text(element):
+            return self._decode_text(length)
+
+        # arrays and sequences are aligned on their element's alignment,
+        # even when empty
+        align = self.align_of(element)
+
+        if align > 1:
+            self._cursor.align(align)
+
+        decode = self._decode_map[type(element)]
+
+        return [decode(element) for i in range(length)]
+
+    def _decode_array(self, t):
+        return self._decode_elements(t.element, t.length)
+
+    def _decode_sequence(self, t):
+        ref = t.length_ref
+
+        if ref:
+            return self._decode_elements(t.element, self._ref_value(ref))
+
+        length_type, length = self._lookup(t.length)
+
+        if type(length) is not int:
+            path = '.'.join(t.length)
+            msg = 'sequence length is not an integer: {}'
+            raise DecodeError(msg.format(path))
+
+        return self._decode_elements(t.element, length)
+
+    def _decode_variant(self, t):
+        ref = t.tag_ref
+
+        if ref:
+            tag = self._ref_value(ref)
+            ft = t.field_of(tag)
+
+            if ft is None:
+                path = '.'.join(t.tag)
+                msg = 'no variant field for tag {} = {}'
+                raise DecodeError(msg.format(path, tag))
+
+            return self._decode_map[type(ft)](ft)
+
+        if t.tag is None:
+            # only accepted by non-strict parsers
+            raise DecodeError('variant has no tag')
+
+        tag_type, tag = self._lookup(t.tag)
+
+        if type(tag_type) is not pytsdl.tsdl.Enum:
+            path = '.'.join(t.tag)
+            msg = 'variant tag is not an enumeration: {}'
+            raise DecodeError(msg.format(path))
+
+        label = tag_type.label_of(tag)
+
+        if label is None or label not in t.fields:
+            path = '.'.join(t.tag)
+            msg = 'no variant field for tag {} = {}'
+            raise DecodeError(msg.format(path, tag))
+
+        ft = t.fields[label]
+
+        return self._decode_map[type(ft)](ft)
+
+    @staticmethod
+    def _walk(t, value, path):
+        for name in path:
+            if type(t) is not pytsdl.tsdl.Struct or name not in value:
+                return None, None
+
+            t = t.fields[name]
+            value = value[name]
+
+        return t, value
+
+    # Returns the already decoded value of the field targeted by a
+    # resolved variant tag or sequence length (see pytsdl.resolve).
+    def _ref_value(self, ref):
+        scope = ref.scope
+
+        if scope is None:
+            value = self._frames[-1 - ref.level][1]
+        else:
+            value = self._scopes[scope][1]
+
+            if value is None:
+                # scope currently being decoded
+                value = self._frames[0][1]
+
+        for name in ref.path:
+            value = value[name]
+
+        return value
+
+    # Finds the type and the already decoded value of the field
+    # targeted by a variant tag or a sequence length (when it's not
+    # resolved).
+    def _lookup(self, path):
+        for prefix, scope_name in Decoder._scope_paths:
+            if tuple(path[0:len(prefix)]) == prefix:
+                if scope_name not in self._scopes:
+                    break
+
+                t, value = self._scopes[scope_name]
+
+                if value is None:
+                    # scope currently being decoded
+                    if not self._frames or self._frames[0][0] is not t:
+                        break
+
+                    value = self._frames[0][1]
+
+                t, value = Decoder._walk(t, value, path[len(prefix):])
+
+                if t is not None:
+                    return t, value
+
+                break
+        else:
+            # relative path: innermost structure first
+            for t, value in reversed(self._frames):
+                if path[0] in value:
+                    t, value = Decoder._walk(t, value, path)
+
+                    if t is not None:
+                        return t, value
+
+        raise DecodeError('cannot find field: {}'.format('.'.join(path)))
+
+    def _decode_scope(self, scope_name, t):
+        if t is None:
+            return None
+
+        # value is only known once decoded: register the scope type
+        # now so that absolute lookups within it keep working
+        self._scopes[scope_name] = (t, None)
+        self._frames = []
+        value = self._decode(t)
+        self._scopes[scope_name] = (t, value)
+
+        return value
+
+    def _decode_packet(self, cursor, offset):
+        doc = self._doc
+        self._cursor = cursor
+        self._scopes = {}
+        start = offset << 3
+        cursor.pos = start
+
+        header = None
+
+        if doc.trace is not None:
+            header = self._decode_scope('trace.packet.header',
+                                        doc.trace.packet_header)
+
+        stream_id = 0
+
+        if type(header) is dict:
+            magic = header.get('magic')
+
+            if magic is not None and magic != CTF_MAGIC:
+                fmt = 'wrong packet magic number at offset {}: {:#x}'
+                raise DecodeError(fmt.format(offset, magic))
+
+            stream_id = header.get('stream_id', 0)
+
+        if stream_id not in doc.streams:
+            raise DecodeError('unknown stream ID: {}'.format(stream_id))
+
+        stream = doc.streams[stream_id]
+        context = self._decode_scope('stream.packet.context',
+                                     stream.packet_context)
+        size = cursor.size - start
+        content_size = None
+
+        if type(context) is dict:
+            size = context.get('packet_size', size)
+            content_size = context.get('content_size')
+
+        if content_size is None:
+            content_size = size
+
+        if size <= 0 or size & 7 or start + size > cursor.size:
+            msg = 'wrong packet size at offset {}: {}'
+            raise DecodeError(msg.format(offset, size))
+
+        if content_size > size:
+            fmt = 'wrong packet content size at offset {}: {}'
+            raise DecodeError(fmt.format(offset, content_size))
+
+        return Packet(stream, offset, header, context, size, content_size,
+                      cursor.pos)
+
+    # Yields the pytsdl.decoder.Packet objects of a data stream, without
+    # decoding their events. data may be any object supporting the
+    # buffer protocol (bytes, bytearray, mmap.mmap, ...).
+    def packets(self, data):
+        cursor = BitCursor(data)
+
+        try:
+            offset = 0
+            total = len(cursor.buf)
+
+            while offset < total:
+                packet = self._decode_packet(cursor, offset)
+                yield packet
+                offset += packet.size >> 3
+        finally:
+            cursor.release()
+
+    # Returns the pytsdl.decoder.Packet at byte offset `offset` of a
+    # data stream, e.g. found with pytsdl.index.PacketIndex.
+    def packet_at(self, data, offset):
+        cursor = BitCursor(data)
+
+        try:
+            return self._decode_packet(cursor, offset)
+        finally:
+            cursor.release()
+
+    @staticmethod
+    def _event_id(header):
+        if type(header) is not dict:
+            return None
+
+        event_id = header.get('id')
+
+        # LTTng-style extended header: the real ID is within the
+        # selected structure of variant "v"
+        v = header.get('v')
+
+        if type(v) is dict and 'id' in v:
+            event_id = v['id']
+
+        return event_id
+
+    def _get_event(self, stream, header):
+        event_id = Decoder._event_id(header)
+
+        if event_id is None:
+            if len(stream.events) == 1:
+                return stream.events[0]
+
+            raise DecodeError('cannot find event ID in event header')
+
+        try:
+            return stream.get_event_by_id(event_id)
+        except KeyError:
+            fmt = 'unknown event ID in stream {}: {}'
+            raise DecodeError(fmt.format(stream.id, event_id))
+
+    # initial clock value of the events of a packet
+    @staticmethod
+    def _clock_begin(packet):
+        if type(packet.context) is dict:
+            return packet.context.get('timestamp_begin', 0)
+
+        return 0
+
+    def _packet_events_compiled(self, packet, cursor):
+        doc = self._doc
+        stream = packet.stream
+        header_fn = pytsdl.codegen.compile_event_header(doc, stream).fn
+        buf = cursor.buf
+        pos = packet.events_pos
+        end = (packet.offset << 3) + packet.content_size
+        pkt_header = packet.header
+        pkt_context = packet.context
+        get_event = self._get_event
+        clk = [Decoder._clock_begin(packet)]
+
+        while pos < end:
+            try:
+                pos, header = header_fn(buf, pos, pkt_header, pkt_context,
+                                        clk)
+                timestamp = clk[0]
+                event = get_event(stream, header)
+                compiled = event._compiled
+
+                if compiled is None:
+                    compiled = pytsdl.codegen.compile_event(doc, stream, event)
+
+                pos, stream_context, context, fields = compiled.fn(buf, pos,
+                                                                   pkt_header,
+                                                                   pkt_context,
+                                                                   header, clk)
+            except (struct.error, IndexError, ValueError):
+                fmt = 'not enough data for event at bit {} of packet ' \
+                      'at offset {}'
+                raise DecodeError(fmt.format(pos, packet.offset))
+
+            cursor.pos = pos
+
+            if pos > end:
+                fmt = 'event {} exceeds packet content at offset {}'
+                raise DecodeError(fmt.format(event.name, packet.offset))
+
+            yield EventRecord(packet, event, timestamp, header,
+                              stream_context, context, fields)
+
+    def _packet_events(self, packet, cursor):
+        if self._compiled:
+            yield from self._packet_events_compiled(packet, cursor)
+
+            return
+
+        stream = packet.stream
+        self._cursor = cursor
+        cursor.pos = packet.events_pos
+        end = (packet.offset << 3) + packet.content_size
+        scopes = {
+            'stream.packet.context': (stream.packet_context, packet.context),
+        }
+
+        if self._doc.trace is not None:
+            scopes['trace.packet.header'] = (self._doc.trace.packet_header,
+                                             packet.header)
+
+        self._clock = Decoder._clock_begin(packet)
+
+        while cursor.pos < end:
+            self._scopes = scopes.copy()
+            header = self._decode_scope('stream.event.header',
+                                        stream.event_header)
+            timestamp = self._clock
+            event = self._get_event(stream, header)
+            stream_context = self._decode_scope('stream.event.context',
+                                                stream.event_context)
+            context = self._decode_scope('event.context', event.context)
+            fields = self._decode_scope('event.fields', event.fields)
+
+            if cursor.pos > end:
+                fmt = 'event {} exceeds packet content at offset {}'
+                raise DecodeError(fmt.format(event.name, packet.offset))
+
+            yield EventRecord(packet, event, timestamp, header,
+                              stream_context, context, fields)
+
+    # Yields the pytsdl.decoder.EventRecord objects of a single packet
+    # previously returned by packets() for the same data.
+    def packet_events(self, packet, data):
+        cursor = BitCursor(data)
+
+        try:
+            yield from self._packet_events(packet, cursor)
+        finally:
+            cursor.release()
+
+    # Yields all the pytsdl.decoder.EventRecord objects of a data
+    # stream, packet by packet.
+    def events(self, data):
+        cursor = BitCursor(data)
+
+        try:
+            offset = 0
+            total = len(cursor.buf)
+
+            while offset < total:
+                packet = self._decode_packet(cursor, offset)
+                yield from self._packet_events(packet, cursor)
+                offset += packet.size >> 3
+        finally:
+            cursor.release()
+
+    # Yields all the pytsdl.decoder.EventRecord objects of a data
+    # stream file, which is memory-mapped.
+    def decode_file(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                yield from self.events(m)
@@ -0,0 +1,232 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import re
+import pypeg2
+from pytsdl.parser import (
+    LiteralString,
+    ConstDecInteger,
+    ConstOctInteger,
+    ConstHexInteger,
+    ConstInteger,
+    ConstNumber,
+    Identifier,
+    PostfixExpr,
+    UnaryExpr,
+    PrimaryExpr,
+    UnaryExprSubscript,
+    ValueAssignment,
+    Integer,
+    FloatingPoint,
+    String,
+    Type,
+    TypeAlias,
+    EnumeratorValue,
+    ConstNumberRange,
+    EnumeratorRange,
+    Enumerator,
+    Enumerators,
+    EnumName,
+    Enum,
+    Dot,
+    Arrow,
+    TypeField,
+    IdentifierField,
+    Field,
+    StructVariantEntries,
+    StructRef,
+    StructAlign,
+    StructFull,
+    Struct,
+    VariantTag,
+    VariantRef,
+    VariantFull,
+    Variant,
+    TypeAssignment,
+    Env,
+    Trace,
+    Clock,
+    Stream,
+    Event,
+    Top,
+)
+
+
+# The pyPEG2 grammar of the AST nodes of pytsdl.parser, used by the
+# 'pypeg2' parsing engine (the native engine, pytsdl.rdparser, builds
+# the very same AST without it).
+#
+# Importing this module sets the `grammar` attribute of each node
+# class, so pytsdl.parser.Parser only imports it (and pyPEG2) on the
+# first parse with this engine.
+
+LiteralString.grammar = re.compile(r'"(\\.|[^"])*"')
+
+ConstDecInteger.grammar = re.compile(r'[0-9]+')
+
+ConstOctInteger.grammar = '0', re.compile(r'[0-9]+')
+
+ConstHexInteger.grammar = pypeg2.contiguous(['0x', '0X'], re.compile(r'[0-9a-fA-F]+'))
+
+ConstInteger.grammar = [ConstHexInteger, ConstOctInteger, ConstDecInteger]
+
+ConstNumber.grammar = pypeg2.optional(re.compile(r'[+-]')), ConstInteger
+
+Identifier.grammar = re.compile(r'^(?!(?:struct|variant|enum|integer|floating_point|string|typealias))[A-Za-z_][A-Za-z_0-9]*')
+
+UnaryExprSubscript.grammar = '[', UnaryExpr, ']'
+
+ValueAssignment.grammar = Identifier, '=', UnaryExpr
+
+Integer.grammar = 'integer', '{', pypeg2.some((ValueAssignment, ';')), '}'
+
+FloatingPoint.grammar = 'floating_point', '{', pypeg2.some((ValueAssignment, ';')), '}'
+
+String.grammar = (
+    'string',
+    pypeg2.optional((
+        '{', ValueAssignment, ';', '}'
+    ))
+)
+
+TypeAlias.grammar = 'typealias', Type, ':=', pypeg2.some(Identifier)
+
+EnumeratorValue.grammar = [Identifier, LiteralString], '=', ConstInteger
+
+ConstNumberRange.grammar = ConstNumber, '...', ConstNumber
+
+EnumeratorRange.grammar = [Identifier, LiteralString], '=', ConstNumberRange
+
+Enumerator.grammar = [
+    EnumeratorRange,
+    EnumeratorValue,
+    Identifier,
+    LiteralString,
+]
+
+Enumerators.grammar = pypeg2.csl(Enumerator), pypeg2.optional(',')
+
+EnumName.grammar = Identifier
+
+Enum.grammar = (
+    'enum',
+    pypeg2.optional(EnumName),
+    ':',
+    [
+        pypeg2.some(Identifier),
+        Integer,
+    ],
+    '{',
+    Enumerators,
+    '}'
+)
+
+Dot.grammar = '.'
+
+Arrow.grammar = '->'
+
+PrimaryExpr.grammar = [
+    Identifier,
+    ConstNumber,
+    LiteralString,
+    ('(', UnaryExpr, ')'),
+]
+
+PostfixExpr.grammar = (
+    Identifier,
+    pypeg2.maybe_some(
+        [
+            (Arrow, Identifier),
+            (Dot, Identifier),
+            UnaryExprSubscript
+        ]
+    )
+)
+
+UnaryExpr.grammar = [
+    PostfixExpr,
+    PrimaryExpr,
+]
+
+TypeField.grammar = Type, Identifier, pypeg2.maybe_some(UnaryExprSubscript)
+
+IdentifierField.grammar = pypeg2.some(Identifier), pypeg2.maybe_some(UnaryExprSubscript)
+
+Field.grammar = [TypeField, IdentifierField]
+
+StructRef.grammar = 'struct', Identifier
+
+StructAlign.grammar = 'align', '(', ConstInteger, ')'
+
+StructFull.grammar = (
+    'struct',
+    pypeg2.optional(Identifier),
+    '{', StructVariantEntries, '}',
+    pypeg2.optional(StructAlign)
+)
+
+Struct.grammar = [StructFull, StructRef]
+
+VariantTag.grammar = '<', UnaryExpr, '>'
+
+VariantRef.grammar = 'variant', Identifier, VariantTag
+
+VariantFull.grammar = (
+    'variant',
+    pypeg2.optional(Identifier),
+    pypeg2.optional(VariantTag),
+    '{', StructVariantEntries, '}'
+)
+
+Variant.grammar = [VariantFull, VariantRef]
+
+TypeAssignment.grammar = UnaryExpr, ':=', Type
+
+_common_scope_entries = [
+    TypeAlias,
+    StructFull,
+    VariantFull,
+]
+
+_scope_entries = pypeg2.maybe_some((
+    [ValueAssignment, TypeAssignment] + _common_scope_entries,
+    ';'
+))
+
+StructVariantEntries.grammar = pypeg2.maybe_some((
+    [Field] + _common_scope_entries,
+    ';'
+))
+
+Type.grammar = [Struct, Variant, Enum, Integer, FloatingPoint, String]
+
+for scope in [Env, Trace, Clock, Stream, Event]:
+    scope.grammar = (scope._scope_name, '{', _scope_entries, '}')
+
+Top.grammar = pypeg2.maybe_some((
+    [Env, Trace, Clock, Stream, Event] + _common_scope_entries, ';'
+))
+
+
+# Returns the root node class of the pyPEG2 grammar of a whole TSDL
+# document (its `grammar` attribute set by this module).
+def get_grammar():
+    return Top
@@ -0,0 +1,289 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import collections
+import bisect
+import struct
+import mmap
+import os
+import pytsdl.decoder
+
+
+# Packet index entry. `offset` is in bytes from the beginning of the
+# data stream file, `size` and `content_size` are in bits. The other
+# fields are the values of the packet context fields having the same
+# names (timestamps are raw clock values), or None when the packet
+# context doesn't have them.
+PacketIndexEntry = collections.namedtuple('PacketIndexEntry', [
+    'offset',
+    'size',
+    'content_size',
+    'stream_id',
+    'timestamp_begin',
+    'timestamp_end',
+    'events_discarded',
+    'cpu_id',
+])
+
+
+_context_fields = [
+    'timestamp_begin',
+    'timestamp_end',
+    'events_discarded',
+    'cpu_id',
+]
+
+
+# Index file format (all integers are little-endian):
+#
+#   header:  magic (8 bytes), version (u32), number of entries (u32),
+#            size of the indexed data stream file (u64)
+#   entries: the fields of PacketIndexEntry, in order (u64 each, two's
+#            complement for negative values, 0 for None), then a u64
+#            mask: bit i is set when field i is None, and bit 8 + i
+#            when it's negative
+#
+# Packet context fields may be signed, so that entry values can be any
+# integer within [-2^63, 2^64 - 1].
+_magic = b'PTSDLIDX'
+_version = 2
+_header_fmt = struct.Struct('<8sIIQ')
+_entry_fmt = struct.Struct('<9Q')
+_none = 0xffffffffffffffff
+_nfields = len(PacketIndexEntry._fields)
+_min_value = -(1 << 63)
+
+
+class PacketIndexError(RuntimeError):
+    def __init__(self, str):
+        super().__init__(str)
+
+
+# Index of the packets of a data stream file.
+#
+# Building it only decodes the trace packet header and the stream packet
+# context of each packet: the next packet is always `packet_size` bits
+# further. Packets of a data stream are in time order, so that finding
+# the packets of a time range is a binary search on their end
+# timestamps.
+class PacketIndex:
+    def __init__(self, entries, data_size=None):
+        self._entries = list(entries)
+        self._data_size = data_size
+        self._ends = None
+
+    @property
+    def entries(self):
+        return self._entries
+
+    # size (bytes) of the indexed data stream, if known
+    @property
+    def data_size(self):
+        return self._data_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    @staticmethod
+    def _entry_from_packet(packet):
+        context = packet.context
+        values = []
+
+        for name in _context_fields:
+            value = None
+
+            if type(context) is dict:
+                value = context.get(name)
+
+            values.append(value)
+
+        return PacketIndexEntry(packet.offset, packet.size,
+                                packet.content_size, packet.stream.id,
+                                *values)
+
+    # Builds the index of a data stream (any object supporting the
+    # buffer protocol) described by `doc`.
+    @staticmethod
+    def build(doc, data):
+        decoder = pytsdl.decoder.Decoder(doc)
+        entries = [PacketIndex._entry_from_packet(p)
+                   for p in decoder.packets(data)]
+
+        return PacketIndex(entries, len(memoryview(data).cast('B')))
+
+    # Builds the index of a memory-mapped data stream file.
+    @staticmethod
+    def build_file(doc, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return PacketIndex([], 0)
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return PacketIndex.build(doc, m)
+
+    # Default index file path of a data stream file: a hidden file in
+    # the same directory, which CTF readers ignore.
+    @staticmethod
+    def path_of(stream_path):
+        head, tail = os.path.split(stream_path)
+
+        return os.path.join(head, '.{}.idx'.format(tail))
+
+    @staticmethod
+    def _pack_entry(entry):
+        values = []
+        mask = 0
+
+        for i, value in enumerate(entry):
+            if value is None:
+                mask |= 1 << i
+                value = 0
+            elif not _min_value <= value <= _none:
+                msg = 'packet index value out of range: {}: {}'
+                raise ValueError(msg.format(entry._fields[i], value))
+            elif value < 0:
+                mask |= 1 << (_nfields + i)
+                value &= _none
+
+            values.append(value)
+
+        return _entry_fmt.pack(*values, mask)
+
+    @staticmethod
+    def _unpack_entry(values):
+        mask = values[-1]
+        entry = []
+
+        for i, value in enumerate(values[:-1]):
+            if mask & (1 << i):
+                value = None
+            elif mask & (1 << (_nfields + i)):
+                value -= 1 << 64
+
+            entry.append(value)
+
+        return PacketIndexEntry(*entry)
+
+    def save(self, path):
+        data_size = self._data_size if self._data_size is not None else _none
+        chunks = [_header_fmt.pack(_magic, _version, len(self._entries),
+                                   data_size)]
+
+        for entry in self._entries:
+            chunks.append(PacketIndex._pack_entry(entry))
+
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(chunks))
+
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if len(data) < _header_fmt.size:
+            raise PacketIndexError('truncated packet index: {}'.format(path))
+
+        magic, version, count, data_size = _header_fmt.unpack_from(data)
+
+        if magic != _magic or version != _version:
+            raise PacketIndexError('not a packet index: {}'.format(path))
+
+        if len(data) != _header_fmt.size + count * _entry_fmt.size:
+            raise PacketIndexError('truncated packet index: {}'.format(path))
+
+        entries = []
+
+        for values in _entry_fmt.iter_unpack(data[_header_fmt.size:]):
+            entries.append(PacketIndex._unpack_entry(values))
+
+        if data_size == _none:
+            data_size = None
+
+        return PacketIndex(entries, data_size)
+
+    # Loads the index of a data stream file from its default path if
+    # it's up to date, or builds it. With `save`, a built index is saved
+    # to the default path, next to the data stream file (nothing is
+    # written in the trace directory otherwise).
+    @staticmethod
+    def open(doc, stream_path, save=False):
+        index_path = PacketIndex.path_of(stream_path)
+        data_size = os.path.getsize(stream_path)
+
+        try:
+            if os.path.getmtime(index_path) >= os.path.getmtime(stream_path):
+                index = PacketIndex.load(index_path)
+
+                if index.data_size == data_size:
+                    return index
+        except (OSError, PacketIndexError):
+            pass
+
+        index = PacketIndex.build_file(doc, stream_path)
+
+        if save:
+            index.save(index_path)
+
+        return index
+
+    def _get_ends(self):
+        if self._ends is None:
+            ends = []
+
+            for entry in self._entries:
+                if entry.timestamp_end is None:
+                    raise PacketIndexError('packets have no end timestamps')
+
+                ends.append(entry.timestamp_end)
+
+            self._ends = ends
+
+        return self._ends
+
+    # Index of the first packet which may contain events at or after
+    # `timestamp` (len(self) if none).
+    def find(self, timestamp):
+        return bisect.bisect_left(self._get_ends(), timestamp)
+
+    # Entries of the packets which may contain events within
+    # [begin, end] (raw clock values).
+    def packets_between(self, begin, end):
+        entries = []
+
+        for entry in self._entries[self.find(begin):]:
+            ts_begin = entry.timestamp_begin
+
+            if ts_begin is not None and ts_begin > end:
+                break
+
+            entries.append(entry)
+
+        return entries
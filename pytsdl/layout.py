@@ -0,0 +1,184 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import collections
+import pytsdl.tsdl
+
+
+# Static layout of a type:
+#
+#   * align: effective alignment (bits); a structure is aligned on the
+#     largest alignment of its fields, and of its own align() attribute
+#   * static: true if the type always has the same size
+#   * size: size (bits) when static, None otherwise
+#   * offsets: for structures, static offsets (bits) of the fields,
+#     relative to the beginning of the structure, up to and including
+#     the first dynamically sized field (None for other types)
+#
+# Sequences, strings and variants are dynamically sized, as well as
+# any array or structure containing one of them.
+class Layout:
+    __slots__ = ('_align', '_size', '_offsets')
+
+    def __init__(self, align, size=None, offsets=None):
+        self._align = align
+        self._size = size
+        self._offsets = offsets
+
+    @property
+    def align(self):
+        return self._align
+
+    @property
+    def static(self):
+        return self._size is not None
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    def offset_of(self, name):
+        if self._offsets is None:
+            return None
+
+        return self._offsets.get(name)
+
+    def __repr__(self):
+        return 'Layout(align={}, size={}, offsets={})'.format(
+            self._align, self._size,
+            None if self._offsets is None else dict(self._offsets))
+
+
+def align_up(at, align):
+    return (at + align - 1) // align * align
+
+
+def _layout_of_struct(t):
+    align = t.align if t.align is not None else 1
+    offsets = collections.OrderedDict()
+    at = 0
+
+    for name, ft in t.fields.items():
+        fl = layout_of(ft)
+        align = max(align, fl.align)
+
+        if at is None:
+            continue
+
+        at = align_up(at, fl.align)
+        offsets[name] = at
+
+        if fl.static:
+            at += fl.size
+        else:
+            # following offsets depend on this field's size
+            at = None
+
+    return Layout(align, at, offsets)
+
+
+def _layout_of_array(t):
+    el = layout_of(t.element)
+
+    if not el.static:
+        return Layout(el.align)
+
+    if t.length == 0:
+        return Layout(el.align, 0)
+
+    # each element is aligned, but not the end of the last one
+    stride = align_up(el.size, el.align)
+
+    return Layout(el.align, stride * (t.length - 1) + el.size)
+
+
+# Returns the layout of a type, computing (and caching) it if needed.
+def layout_of(t):
+    layout = t.layout
+
+    if layout is not None:
+        return layout
+
+    tt = type(t)
+
+    if tt is pytsdl.tsdl.Integer:
+        layout = Layout(t.align, t.size)
+    elif tt is pytsdl.tsdl.FloatingPoint:
+        layout = Layout(t.align, t.exp_dig + t.mant_dig)
+    elif tt is pytsdl.tsdl.Enum:
+        layout = layout_of(t.integer)
+    elif tt is pytsdl.tsdl.String:
+        layout = Layout(8)
+    elif tt is pytsdl.tsdl.Array:
+        layout = _layout_of_array(t)
+    elif tt is pytsdl.tsdl.Sequence:
+        layout = Layout(layout_of(t.element).align)
+    elif tt is pytsdl.tsdl.Struct:
+        layout = _layout_of_struct(t)
+    else:
+        # variants are aligned on their selected field
+        for ft in t.fields.values():
+            layout_of(ft)
+
+        layout = Layout(1)
+
+    t.layout = layout
+
+    return layout
+
+
+def _analyze_scope(t):
+    if t is not None:
+        layout_of(t)
+
+
+# Computes the layouts of all the types of a document's scopes.
+def analyze(doc):
+    if doc.trace is not None:
+        _analyze_scope(doc.trace.packet_header)
+
+    for stream in doc.streams.values():
+        analyze_stream(stream)
+
+
+# Computes the layouts of all the types of a stream's scopes, including
+# the ones of its events.
+def analyze_stream(stream):
+    analyze_stream_scopes(stream)
+    analyze_events(stream.events)
+
+
+# Computes the layouts of the types of a stream's own scopes, not
+# including the ones of its events.
+def analyze_stream_scopes(stream):
+    _analyze_scope(stream.packet_context)
+    _analyze_scope(stream.event_header)
+    _analyze_scope(stream.event_context)
+
+
+def analyze_events(events):
+    for event in events:
+        _analyze_scope(event.context)
+        _analyze_scope(event.fields)
@@ -0,0 +1,309 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import collections
+import re
+
+
+# Token kinds are plain strings:
+#
+#   * 'id': identifier (value is its name)
+#   * 'num': integer constant (value is its text, e.g. '0x3b')
+#   * 'str': literal string (value is its text, quotes included)
+#   * 'eof': end of input
+#
+# Keywords and punctuators use themselves as their kind, e.g. 'struct',
+# '{', ':=' or '...', so that the parser only has to compare kinds.
+Token = collections.namedtuple('Token', ['kind', 'value', 'pos'])
+
+
+KEYWORDS = frozenset([
+    'struct',
+    'variant',
+    'enum',
+    'integer',
+    'floating_point',
+    'string',
+    'typealias',
+])
+
+
+_token_re = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>/\*.*?\*/|//[^\n]*)
+  | (?P<id>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<num>0[xX][0-9a-fA-F]+|[0-9]+)
+  | (?P<str>"(?:\\.|[^"\\])*")
+  | (?P<punct>:=|->|\.\.\.|[{}()\[\];:=<>,.+-])
+''', re.VERBOSE | re.DOTALL)
+
+
+class LexError(RuntimeError):
+    def __init__(self, msg, pos):
+        self._pos = pos
+        super().__init__(msg)
+
+    @property
+    def pos(self):
+        return self._pos
+
+
+def line_col(text, pos):
+    line = text.count('\n', 0, pos) + 1
+    col = pos - (text.rfind('\n', 0, pos) + 1) + 1
+
+    return line, col
+
+
+def tokenize(text, pos=0, end=None):
+    match = _token_re.match
+    keywords = KEYWORDS
+
+    if end is None:
+        end = len(text)
+
+    while pos < end:
+        m = match(text, pos, end)
+
+        if m is None:
+            if text.startswith('/*', pos):
+                raise LexError('unterminated comment', pos)
+
+            if text.startswith('"', pos):
+                raise LexError('unterminated literal string', pos)
+
+            msg = 'unexpected character: {}'.format(repr(text[pos]))
+            raise LexError(msg, pos)
+
+        kind = m.lastgroup
+        value = m.group()
+
+        if kind == 'id':
+            if value in keywords:
+                kind = value
+
+            yield Token(kind, value, pos)
+        elif kind == 'punct':
+            yield Token(value, value, pos)
+        elif kind == 'num' or kind == 'str':
+            yield Token(kind, value, pos)
+
+        pos = m.end()
+
+    yield Token('eof', None, end)
+
+
+_block_normal_re = re.compile(r'[{};"]|/[*/]?')
+_block_string_re = re.compile(r'(?:\\.|[^"\\])*')
+
+
+# Returns the position of the ';' ending the scope entry starting at
+# `pos` in `text`, ignoring what's within braces, comments and literal
+# strings, or of the '}' closing the scope if it comes first. Returns
+# `end` if there's neither before `end`.
+def find_entry_end(text, pos, end):
+    search = _block_normal_re.search
+    depth = 0
+
+    while True:
+        m = search(text, pos, end)
+
+        if m is None:
+            return end
+
+        tok = m.group()
+        pos = m.end()
+
+        if tok == '{':
+            depth += 1
+        elif tok == '}':
+            if depth == 0:
+                return m.start()
+
+            depth -= 1
+        elif tok == ';':
+            if depth == 0:
+                return m.start()
+        elif tok == '"':
+            pos = _block_string_re.match(text, pos, end).end() + 1
+        elif tok == '/*':
+            pos = text.find('*/', pos, end)
+
+            if pos < 0:
+                return end
+
+            pos += 2
+        elif tok == '//':
+            pos = text.find('\n', pos, end)
+
+            if pos < 0:
+                return end
+
+
+# Finds the ends of top-level blocks (their terminating ';' at brace
+# depth 0) in TSDL text fed in arbitrary chunks, ignoring what's within
+# comments and literal strings, which may span chunks.
+class _BlockScanner:
+    _NORMAL = 0
+    _SLASH = 1
+    _COMMENT = 2
+    _COMMENT_STAR = 3
+    _LINE_COMMENT = 4
+    _STRING = 5
+    _STRING_ESCAPE = 6
+
+    def __init__(self):
+        self._state = _BlockScanner._NORMAL
+        self._depth = 0
+
+    # Returns the positions following the top-level blocks ending in
+    # `chunk`.
+    def feed(self, chunk):
+        ends = []
+        state = self._state
+        pos = 0
+        size = len(chunk)
+
+        while pos < size:
+            if state == _BlockScanner._NORMAL:
+                m = _block_normal_re.search(chunk, pos)
+
+                if m is None:
+                    break
+
+                tok = m.group()
+                pos = m.end()
+
+                if tok == '{':
+                    self._depth += 1
+                elif tok == '}':
+                    self._depth -= 1
+                elif tok == ';':
+                    if self._depth == 0:
+                        ends.append(pos)
+                elif tok == '"':
+                    state = _BlockScanner._STRING
+                elif tok == '/*':
+                    state = _BlockScanner._COMMENT
+                elif tok == '//':
+                    state = _BlockScanner._LINE_COMMENT
+                elif pos == size:
+                    # maybe the beginning of a comment
+                    state = _BlockScanner._SLASH
+            elif state == _BlockScanner._SLASH:
+                if chunk[pos] == '*':
+                    state = _BlockScanner._COMMENT
+                    pos += 1
+                elif chunk[pos] == '/':
+                    state = _BlockScanner._LINE_COMMENT
+                    pos += 1
+                else:
+                    state = _BlockScanner._NORMAL
+            elif state == _BlockScanner._COMMENT:
+                end = chunk.find('*/', pos)
+
+                if end < 0:
+                    if chunk.endswith('*'):
+                        state = _BlockScanner._COMMENT_STAR
+
+                    break
+
+                state = _BlockScanner._NORMAL
+                pos = end + 2
+            elif state == _BlockScanner._COMMENT_STAR:
+                state = _BlockScanner._COMMENT
+
+                if chunk[pos] == '/':
+                    state = _BlockScanner._NORMAL
+                    pos += 1
+            elif state == _BlockScanner._LINE_COMMENT:
+                end = chunk.find('\n', pos)
+
+                if end < 0:
+                    break
+
+                state = _BlockScanner._NORMAL
+                pos = end + 1
+            elif state == _BlockScanner._STRING:
+                pos = _block_string_re.match(chunk, pos).end()
+
+                if pos == size:
+                    break
+
+                if chunk[pos] == '"':
+                    state = _BlockScanner._NORMAL
+                else:
+                    # backslash ending the chunk
+                    state = _BlockScanner._STRING_ESCAPE
+
+                pos += 1
+            else:
+                state = _BlockScanner._STRING
+                pos += 1
+
+        self._state = state
+
+        return ends
+
+
+# Splits TSDL text, given as an iterable of str chunks, into top-level
+# blocks, each one ending with its terminating ';' (the text following
+# the last one, if any, is the last block). Generates (block, line,
+# col) tuples, `line` and `col` being the position of the first
+# character of `block` within the whole text.
+#
+# Only the current block is kept in memory.
+def split_blocks(chunks):
+    scanner = _BlockScanner()
+    parts = []
+    line = 1
+    col = 1
+
+    def new_block(parts):
+        nonlocal line, col
+
+        block = ''.join(parts)
+        block_line = line
+        block_col = col
+        nl = block.count('\n')
+
+        if nl:
+            line += nl
+            col = len(block) - block.rfind('\n')
+        else:
+            col += len(block)
+
+        return block, block_line, block_col
+
+    for chunk in chunks:
+        start = 0
+
+        for end in scanner.feed(chunk):
+            parts.append(chunk[start:end])
+            yield new_block(parts)
+            parts = []
+            start = end
+
+        if start < len(chunk):
+            parts.append(chunk[start:])
+
+    if parts:
+        yield new_block(parts)
@@ -0,0 +1,126 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import heapq
+import os
+import pytsdl.tsdl
+import pytsdl.decoder
+
+
+def _mapped_clock_name(t):
+    if t is None:
+        return None
+
+    tt = type(t)
+
+    if tt is pytsdl.tsdl.Integer:
+        if t.map is not None:
+            return t.map[1]
+    elif tt is pytsdl.tsdl.Enum:
+        return _mapped_clock_name(t.integer)
+    elif tt is pytsdl.tsdl.Array or tt is pytsdl.tsdl.Sequence:
+        return _mapped_clock_name(t.element)
+    elif tt is pytsdl.tsdl.Struct or tt is pytsdl.tsdl.Variant:
+        for ft in t.fields.values():
+            name = _mapped_clock_name(ft)
+
+            if name is not None:
+                return name
+
+    return None
+
+
+# Returns the pytsdl.tsdl.Clock of which the event timestamps of
+# `stream` are values (the clock of the first integer mapped to a clock
+# in its event header or in its packet context), or None.
+def stream_clock(doc, stream):
+    for t in (stream.event_header, stream.packet_context):
+        name = _mapped_clock_name(t)
+
+        if name is not None:
+            return doc.clocks.get(name)
+
+    return None
+
+
+# Converts event record timestamps (clock values) to nanoseconds
+# using the clock of their stream. Timestamps of streams without any
+# clock are left as is.
+class TimestampConverter:
+    def __init__(self, doc):
+        self._doc = doc
+        self._clocks = {}
+
+    def clock_of(self, stream):
+        if stream.id not in self._clocks:
+            self._clocks[stream.id] = stream_clock(self._doc, stream)
+
+        return self._clocks[stream.id]
+
+    def ns_of(self, ev):
+        clock = self.clock_of(ev.packet.stream)
+
+        if clock is None:
+            return ev.timestamp
+
+        return clock.cycles_to_ns(ev.timestamp)
+
+
+def _source_events(doc, source, compiled):
+    decoder = pytsdl.decoder.Decoder(doc, compiled)
+
+    if type(source) is str or isinstance(source, os.PathLike):
+        return decoder.decode_file(source)
+
+    return decoder.events(source)
+
+
+# Yields (ns, ev) for all the pytsdl.decoder.EventRecord objects `ev`
+# of several data streams, in global time order, `ns` being the event's
+# timestamp in nanoseconds (see TimestampConverter).
+#
+# Each source is either a data stream file path or an object supporting
+# the buffer protocol. Sources are decoded lazily, each with its own
+# decoder; only the next event record of each source is kept, in a
+# heap. Events having the same timestamp come in source order.
+def merge_events(doc, sources, compiled=True):
+    converter = TimestampConverter(doc)
+    ns_of = converter.ns_of
+    heap = []
+
+    for i, source in enumerate(sources):
+        it = _source_events(doc, source, compiled)
+
+        for ev in it:
+            heap.append((ns_of(ev), i, ev, it))
+            break
+
+    heapq.heapify(heap)
+
+    while heap:
+        ns, i, ev, it = heap[0]
+        yield ns, ev
+
+        for next_ev in it:
+            heapq.heapreplace(heap, (ns_of(next_ev), i, next_ev, it))
+            break
+        else:
+            heapq.heappop(heap)
@@ -0,0 +1,228 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import collections
+import codecs
+import struct
+import mmap
+import os
+import uuid
+import pytsdl.tsdl
+
+
+METADATA_PACKET_MAGIC = 0x75d11d57
+
+
+# Header of a packet of a packetized metadata stream (see CTF 1.8,
+# section 7.1). `offset` is in bytes from the beginning of the stream,
+# `content_size` and `packet_size` are in bits (header included).
+MetadataPacketHeader = collections.namedtuple('MetadataPacketHeader', [
+    'offset',
+    'uuid',
+    'checksum',
+    'content_size',
+    'packet_size',
+    'compression_scheme',
+    'encryption_scheme',
+    'checksum_scheme',
+    'major',
+    'minor',
+])
+
+
+# The header is packed and uses the native byte order of the trace,
+# which is found with the magic number.
+_header_fmts = {
+    pytsdl.tsdl.ByteOrder.LE: struct.Struct('<I16sIIIBBBBB'),
+    pytsdl.tsdl.ByteOrder.BE: struct.Struct('>I16sIIIBBBBB'),
+}
+_header_size = _header_fmts[pytsdl.tsdl.ByteOrder.LE].size
+
+
+class MetadataError(RuntimeError):
+    def __init__(self, str):
+        super().__init__(str)
+
+
+_magic_fmts = {
+    pytsdl.tsdl.ByteOrder.LE: struct.Struct('<I'),
+    pytsdl.tsdl.ByteOrder.BE: struct.Struct('>I'),
+}
+
+
+# Returns the byte order of a packetized metadata stream (any object
+# supporting the buffer protocol), or None if it's plain text.
+def packetized_byte_order(data):
+    with memoryview(data) as view:
+        if view.nbytes < 4:
+            return None
+
+        for bo, fmt in _magic_fmts.items():
+            if fmt.unpack_from(view)[0] == METADATA_PACKET_MAGIC:
+                return bo
+
+    return None
+
+
+# Reader of metadata streams, either plain TSDL text or a sequence of
+# binary packets wrapping it.
+#
+# Packet headers are unpacked and payloads are decoded directly from a
+# memoryview over the data (e.g. a memory map of the metadata file), so
+# that no intermediate copy of the packetized stream or of the whole
+# payload is made: the text is produced one packet at a time.
+class MetadataReader:
+    def __init__(self):
+        self._byte_order = None
+        self._uuid = None
+        self._headers = []
+
+    @property
+    def packetized(self):
+        return self._byte_order is not None
+
+    # native byte order of the trace, for a packetized stream
+    @property
+    def byte_order(self):
+        return self._byte_order
+
+    # UUID common to all the packets read so far
+    @property
+    def uuid(self):
+        return self._uuid
+
+    # headers of the packets read so far
+    @property
+    def headers(self):
+        return self._headers
+
+    def _read_header(self, view, offset):
+        if view.nbytes - offset < _header_size:
+            raise MetadataError('truncated metadata packet header at offset {}'.format(offset))
+
+        fields = _header_fmts[self._byte_order].unpack_from(view, offset)
+        header = MetadataPacketHeader(offset, uuid.UUID(bytes=fields[1]),
+                                      *fields[2:])
+
+        if fields[0] != METADATA_PACKET_MAGIC:
+            raise MetadataError('wrong metadata packet magic at offset {}'.format(offset))
+
+        if (header.major, header.minor) != (1, 8):
+            fmt = 'unsupported metadata packet version at offset {}: {}.{}'
+            raise MetadataError(fmt.format(offset, header.major,
+                                           header.minor))
+
+        if header.compression_scheme != 0 or header.encryption_scheme != 0:
+            fmt = 'compressed/encrypted metadata packet at offset {} is not supported'
+            raise MetadataError(fmt.format(offset))
+
+        if header.checksum_scheme != 0:
+            fmt = 'metadata packet checksum at offset {} is not supported'
+            raise MetadataError(fmt.format(offset))
+
+        if header.content_size % 8 or header.packet_size % 8 or \
+                header.content_size < _header_size * 8 or \
+                header.packet_size < header.content_size:
+            fmt = 'wrong metadata packet sizes at offset {}: {}/{} bits'
+            raise MetadataError(fmt.format(offset, header.content_size,
+                                           header.packet_size))
+
+        if offset + header.packet_size // 8 > view.nbytes:
+            raise MetadataError('truncated metadata packet at offset {}'.format(offset))
+
+        if self._uuid is None:
+            self._uuid = header.uuid
+        elif header.uuid != self._uuid:
+            fmt = 'metadata packet at offset {} has a different UUID: {}'
+            raise MetadataError(fmt.format(offset, header.uuid))
+
+        return header
+
+    # Generates the TSDL text of the metadata stream `data` (any object
+    # supporting the buffer protocol), in chunks (one per packet for a
+    # packetized stream).
+    def text_chunks(self, data):
+        try:
+            yield from self._text_chunks(data)
+        except UnicodeDecodeError as e:
+            raise MetadataError('invalid metadata text: {}'.format(e))
+
+    def _text_chunks(self, data):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        self._byte_order = packetized_byte_order(data)
+        self._uuid = None
+        self._headers = []
+
+        with memoryview(data) as data_view, data_view.cast('B') as view:
+            if not self.packetized:
+                yield codecs.utf_8_decode(view, 'strict', True)[0]
+
+                return
+
+            offset = 0
+
+            while offset < view.nbytes:
+                header = self._read_header(view, offset)
+                self._headers.append(header)
+                end = offset + header.content_size // 8
+
+                with view[offset + _header_size:end] as payload:
+                    chunk = decoder.decode(payload)
+
+                if chunk:
+                    yield chunk
+
+                offset += header.packet_size // 8
+
+            chunk = decoder.decode(b'', True)
+
+            if chunk:
+                yield chunk
+
+    # Like text_chunks(), but with a metadata file, which is mapped into
+    # memory while the chunks are generated.
+    def file_text_chunks(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield from self.text_chunks(b'')
+
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                yield from self.text_chunks(m)
+
+    # Returns the whole TSDL text of the metadata stream `data`.
+    def read_text(self, data):
+        return ''.join(self.text_chunks(data))
+
+    # Returns the TSDL text of a metadata file, packetized or not.
+    def read_file(self, path):
+        return ''.join(self.file_text_chunks(path))
+
+    # Makes sure the UUID of the packets, if any, is the UUID of the
+    # trace described by `doc`.
+    def validate_uuid(self, doc):
+        if self._uuid is None or doc.trace is None or doc.trace.uuid is None:
+            return
+
+        if self._uuid != doc.trace.uuid:
+            fmt = 'metadata packets UUID ({}) is not the trace UUID ({})'
+            raise MetadataError(fmt.format(self._uuid, doc.trace.uuid))
@@ -0,0 +1,564 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import concurrent.futures
+import collections
+import hashlib
+import pickle
+import heapq
+import mmap
+import gc
+import os
+import pytsdl.parser
+import pytsdl.rdparser
+import pytsdl.lexer
+import pytsdl.metadata
+import pytsdl.decoder
+import pytsdl.index
+import pytsdl.merge
+
+
+# decoder and timestamp converter of the current worker process (see
+# _init_worker())
+_worker_decoder = None
+_worker_converter = None
+
+
+def _init_worker(tsdl):
+    global _worker_decoder
+    global _worker_converter
+
+    doc = pytsdl.parser.Parser().parse(tsdl)
+    _worker_decoder = pytsdl.decoder.Decoder(doc)
+    _worker_converter = pytsdl.merge.TimestampConverter(doc)
+
+
+def _decode_packets(path, offsets, fn, ordered):
+    decoder = _worker_decoder
+    ns_of = _worker_converter.ns_of
+    results = []
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            for offset in offsets:
+                packet = decoder.packet_at(m, offset)
+
+                for ev in decoder.packet_events(packet, m):
+                    value = fn(ev)
+
+                    if value is None:
+                        continue
+
+                    if ordered:
+                        results.append((ns_of(ev), value))
+                    else:
+                        results.append(value)
+
+    return results
+
+
+# Default function of ParallelDecoder.map(): event name, timestamp
+# (clock value) and payload of an event record.
+def event_values(ev):
+    return ev.name, ev.timestamp, ev.fields
+
+
+# A task: consecutive packets of a data stream file.
+_Task = collections.namedtuple('_Task', ['stream', 'path', 'offsets',
+                                         'timestamp'])
+
+
+# Decodes data stream files with a pool of worker processes.
+#
+# Work is partitioned by packet: the packets of each data stream file
+# are found with a pytsdl.index.PacketIndex, and each task decodes
+# `packets_per_task` consecutive packets. Worker processes only receive
+# the TSDL text once, when they start, and parse it themselves.
+#
+# Since event records cannot be sent back to the parent process as is,
+# a picklable function (`fn`) runs on each of them in the workers, and
+# only its results are sent back.
+#
+# The pool is started by the first map(), and kept until close() (also
+# called when leaving a `with` block).
+class ParallelDecoder:
+    def __init__(self, tsdl, workers=None, packets_per_task=16):
+        self._tsdl = tsdl
+        self._doc = pytsdl.parser.Parser().parse(tsdl)
+        self._workers = workers or os.cpu_count() or 1
+        self._packets_per_task = packets_per_task
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def doc(self):
+        return self._doc
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def packets_per_task(self):
+        return self._packets_per_task
+
+    def _tasks(self, paths):
+        tasks = []
+        n = self._packets_per_task
+
+        for stream, path in enumerate(paths):
+            index = pytsdl.index.PacketIndex.open(self._doc, path)
+
+            for i in range(0, len(index), n):
+                entries = index[i:i + n]
+                offsets = [e.offset for e in entries]
+                tasks.append(_Task(stream, path, offsets,
+                                   entries[0].timestamp_begin or 0))
+
+        # submitted by beginning time, so that results merged in time
+        # order arrive roughly in the order they're needed
+        tasks.sort(key=lambda t: (t.timestamp, t.stream))
+
+        return tasks
+
+    # Yields the results of fn(ev) for all the event records `ev` of
+    # the data stream files `paths`, except None results.
+    #
+    # When `ordered` is false, the results of the events of a given
+    # packet are in order, but packets come in any order, which is
+    # fine for aggregations. Otherwise, all the results are merged in
+    # timestamp order (see pytsdl.merge.TimestampConverter).
+    #
+    # At most a few tasks per worker are pending at any time.
+    def map(self, paths, fn=event_values, ordered=False):
+        tasks = self._tasks(paths)
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self._workers, initializer=_init_worker,
+                initargs=(self._tsdl,))
+
+        executor = self._executor
+        futures = {}
+        ahead = self._workers * 2
+        submitted = [0]
+
+        def future_of(i):
+            last = min(i + ahead, len(tasks) - 1)
+
+            while submitted[0] <= last:
+                task = tasks[submitted[0]]
+                futures[submitted[0]] = executor.submit(_decode_packets,
+                                                        task.path,
+                                                        task.offsets, fn,
+                                                        ordered)
+                submitted[0] += 1
+
+            return futures.pop(i)
+
+        try:
+            if not ordered:
+                for i in range(len(tasks)):
+                    yield from future_of(i).result()
+
+                return
+
+            def stream_results(stream):
+                for i, task in enumerate(tasks):
+                    if task.stream == stream:
+                        yield from future_of(i).result()
+
+            iters = [stream_results(s) for s in range(len(paths))]
+
+            for timestamp, value in heapq.merge(*iters,
+                                                key=lambda r: r[0]):
+                yield value
+        finally:
+            # when the results aren't all consumed
+            for future in futures.values():
+                future.cancel()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+# parser of the current worker process of parse_many() (see
+# _init_parse_worker())
+_worker_parser = None
+
+
+def _init_parse_worker(engine, cache_dir, cache_max_size, strict):
+    global _worker_parser
+
+    _worker_parser = pytsdl.parser.Parser(engine, cache_dir, cache_max_size,
+                                          strict=strict)
+
+
+# Parses `data`, TSDL text (str) or a metadata stream (bytes), and
+# returns the pickled document, or the error.
+def _parse_doc(data):
+    try:
+        if type(data) is str:
+            doc = _worker_parser.parse(data)
+        else:
+            doc = _worker_parser.parse_metadata(data)
+    except (pytsdl.parser.ParseError, pytsdl.metadata.MetadataError) as e:
+        return e
+
+    return pickle.dumps(doc, pickle.HIGHEST_PROTOCOL)
+
+
+def _unpickle(data):
+    # see pytsdl.cache.DocCache.get()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        return pickle.loads(data)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+# Returns the data to parse of an input of parse_many(), and a key
+# which is the same for identical inputs.
+def _read_input(source):
+    if isinstance(source, str):
+        data = source
+        key = data.encode('utf-8', 'surrogatepass')
+    elif isinstance(source, os.PathLike):
+        with open(source, 'rb') as f:
+            data = f.read()
+
+        key = data
+    else:
+        data = memoryview(source).tobytes()
+        key = data
+
+    return data, (type(data), hashlib.sha256(key).digest())
+
+
+# Parses many documents with a pool of `workers` processes (the number
+# of CPUs by default), each one using a parser like `parser` (same
+# engine and document cache, if any), yielding, for each input, either
+# its document (pytsdl.tsdl.Doc) or its error (pytsdl.parser.ParseError,
+# pytsdl.metadata.MetadataError, or OSError when reading a file).
+#
+# An input is either TSDL text (str, see Parser.parse()), a metadata
+# stream (bytes-like object, see Parser.parse_metadata()), or the path
+# of a metadata file (os.PathLike object, like pathlib.Path, see
+# Parser.parse_metadata_file()).
+#
+# Identical inputs are only parsed once, and their results are the same
+# object, when they are read while the result of the first one isn't
+# yielded yet, that is, within a window of about twice as many inputs
+# as workers. A result is dropped as soon as it's yielded for the last
+# input it's known for, so that an input repeated further is parsed
+# again (or loaded from the document cache of the workers, if any).
+# Documents are always built completely (never lazily), and sent back
+# pickled, like when cached.
+#
+# When `ordered` is true, results are in input order, each one yielded
+# as soon as it and the ones before it are available. Otherwise, they
+# are (index of input, result) pairs, in completion order.
+#
+# Inputs are read (and files, opened) as the work progresses: at most a
+# few documents per worker are being parsed at any time.
+def parse_many(parser, sources, workers=None, ordered=True):
+    workers = workers or os.cpu_count() or 1
+    cache = parser.cache
+    initargs = (parser.engine, None, 0, parser.strict)
+
+    if cache is not None:
+        initargs = (parser.engine, cache.directory, cache.max_size,
+                    parser.strict)
+
+    executor = concurrent.futures.ProcessPoolExecutor(workers,
+                                                      initializer=_init_parse_worker,
+                                                      initargs=initargs)
+    sources = enumerate(sources)
+    ahead = workers * 2
+
+    # future of each distinct input
+    futures = {}
+
+    # loaded result of each future
+    results = {}
+
+    # key (see _read_input()) of each future of `futures`
+    keys = {}
+
+    # number of entries of `pending` of each future
+    uses = collections.Counter()
+
+    # (index of input, future), not yielded yet, in input order
+    pending = collections.deque()
+
+    # futures not done yet
+    running = set()
+
+    def result_of(future):
+        result = results.get(future)
+
+        if result is None:
+            result = future.result()
+
+            if type(result) is bytes:
+                result = _unpickle(result)
+
+            results[future] = result
+
+        return result
+
+    # Returns the result of `future` for one of its pending inputs,
+    # forgetting it if it's the last one.
+    def take(future):
+        result = result_of(future)
+        uses[future] -= 1
+
+        if not uses[future]:
+            del uses[future]
+            del results[future]
+            key = keys.pop(future, None)
+
+            if key is not None:
+                del futures[key]
+
+        return result
+
+    try:
+        while True:
+            while len(running) < ahead:
+                entry = next(sources, None)
+
+                if entry is None:
+                    break
+
+                index, source = entry
+
+                try:
+                    data, key = _read_input(source)
+                except OSError as e:
+                    future = concurrent.futures.Future()
+                    future.set_result(e)
+                else:
+                    future = futures.get(key)
+
+                    if future is None:
+                        future = executor.submit(_parse_doc, data)
+                        futures[key] = future
+                        keys[future] = key
+                        running.add(future)
+
+                pending.append((index, future))
+                uses[future] += 1
+
+            if not pending:
+                return
+
+            if ordered:
+                index, future = pending.popleft()
+                yield take(future)
+            else:
+                if not any(future.done() for index, future in pending):
+                    concurrent.futures.wait(running,
+                                            return_when=concurrent.futures.FIRST_COMPLETED)
+
+                ready = []
+                not_ready = collections.deque()
+
+                for entry in pending:
+                    if entry[1].done():
+                        ready.append(entry)
+                    else:
+                        not_ready.append(entry)
+
+                pending = not_ready
+
+                for index, future in ready:
+                    yield index, take(future)
+
+            running = {future for future in running if not future.done()}
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Parses the top-level blocks `blocks` ((text, line, col) tuples, see
+# ParallelBlockParser), returning the pickled list of their AST entries
+# (None for a block without any).
+def _parse_blocks(blocks, lazy):
+    parser = pytsdl.rdparser.RecursiveDescentParser(lazy=lazy)
+    entries = []
+
+    for text, line, col in blocks:
+        top = parser.parse(text, line, col)
+
+        if top.entries:
+            entries.append(top.entries[0])
+        else:
+            entries.append(None)
+
+    return pickle.dumps(entries, pickle.HIGHEST_PROTOCOL)
+
+
+# Builds the ASTs of the top-level blocks of TSDL documents with a pool
+# of worker processes (see pytsdl.parser.Parser(ast_workers=...)).
+#
+# A document is split into top-level blocks (see
+# pytsdl.lexer.find_entry_end()), which are syntactically independent,
+# and consecutive blocks are grouped into about `tasks_per_worker` tasks
+# of similar text sizes per worker. Workers send back the pickled ASTs
+# of their blocks, which are reassembled in order into the AST of the
+# whole document. Visiting it is left to the caller, since resolving
+# names depends on the order of the blocks.
+#
+# The pool is started by the first parse, and kept until close() (also
+# called when leaving a `with` block).
+class ParallelBlockParser:
+    def __init__(self, workers=None, tasks_per_worker=4):
+        self._workers = workers or os.cpu_count() or 1
+        self._tasks_per_worker = tasks_per_worker
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def tasks_per_worker(self):
+        return self._tasks_per_worker
+
+    # Yields the beginning and end positions of the top-level blocks of
+    # `tsdl` (with their terminating ';'), and the line and column of
+    # their first character.
+    @staticmethod
+    def _blocks(tsdl, line, col):
+        end = len(tsdl)
+        pos = 0
+
+        while pos < end:
+            block_end = pytsdl.lexer.find_entry_end(tsdl, pos, end)
+
+            if block_end < end:
+                block_end += 1
+
+            yield pos, block_end, line, col
+            newlines = tsdl.count('\n', pos, block_end)
+
+            if newlines:
+                line += newlines
+                col = block_end - tsdl.rfind('\n', pos, block_end)
+            else:
+                col += block_end - pos
+
+            pos = block_end
+
+    def _tasks(self, blocks):
+        ntasks = self._workers * self._tasks_per_worker
+        task_size = sum(len(block[1]) for block in blocks) / ntasks
+        tasks = []
+        task = []
+        size = 0
+
+        for block in blocks:
+            task.append(block)
+            size += len(block[1])
+
+            if size >= task_size:
+                tasks.append(task)
+                task = []
+                size = 0
+
+        if task:
+            tasks.append(task)
+
+        return tasks
+
+    # Returns the AST (Top node) of `tsdl`, like
+    # pytsdl.rdparser.RecursiveDescentParser.parse(), of which `lazy`
+    # and `memo` have the same meaning. The parse error of the first
+    # invalid block, if any, is raised.
+    def parse(self, tsdl, line=1, col=1, lazy=False, memo=None):
+        entries = []
+
+        # (index of entry, text, line, col) of each block to parse
+        blocks = []
+
+        for pos, end, block_line, block_col in self._blocks(tsdl, line, col):
+            text = tsdl[pos:end]
+
+            if memo is not None:
+                entry = memo.get(text.strip())
+
+                if entry is not None:
+                    entries.append(entry)
+                    continue
+
+            blocks.append((len(entries), text, block_line, block_col))
+            entries.append(None)
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self._workers)
+
+        tasks = self._tasks(blocks)
+        futures = []
+
+        try:
+            for task in tasks:
+                task_blocks = [block[1:] for block in task]
+                futures.append(self._executor.submit(_parse_blocks,
+                                                     task_blocks, lazy))
+
+            for task, future in zip(tasks, futures):
+                task_entries = _unpickle(future.result())
+
+                for block, entry in zip(task, task_entries):
+                    entries[block[0]] = entry
+
+                    if memo is None or entry is None:
+                        continue
+
+                    # see RecursiveDescentParser._block()
+                    if not lazy or type(entry) is not pytsdl.parser.Event:
+                        memo.put(block[1].strip(), entry)
+        finally:
+            for future in futures:
+                future.cancel()
+
+        return pytsdl.parser.Top([e for e in entries if e is not None])
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
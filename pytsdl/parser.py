@@ -21,13 +21,42 @@
 # THE SOFTWARE.
 import enum
 import re
+import codecs
 import copy
-import uuid
-import pypeg2
+import time
 import pytsdl.tsdl
+import pytsdl.layout
+import pytsdl.resolve
 
 
-class _List:
+# Base of the AST nodes, and of the intermediate objects of the pyPEG2
+# grammar.
+#
+# A big document has hundreds of thousands of nodes, hence the slots.
+# A node is pickled as the tuple of its slot values (block ASTs are
+# pickled by the workers of pytsdl.parallel.ParallelBlockParser), and
+# rendered as XML by pytsdl.astxml when converted to a string.
+class _AstObject:
+    __slots__ = ()
+
+    def __str__(self):
+        import pytsdl.astxml
+
+        return pytsdl.astxml.to_xml(self)
+
+    def __getstate__(self):
+        return tuple([getattr(self, name) for name in _slot_names(type(self))])
+
+    def __setstate__(self, state):
+        for name, value in zip(_slot_names(type(self)), state):
+            setattr(self, name, value)
+
+
+class _List(_AstObject):
+    __slots__ = (
+        '_elements',
+    )
+
     def __init__(self, elements):
         self._elements = elements
 
@@ -42,12 +71,12 @@ class _List:
     def __getitem__(self, i):
         return self._elements[i]
 
-    def __str__(self):
-        # this is normally never exposed
-        raise RuntimeError()
 
+class _SingleValue(_AstObject):
+    __slots__ = (
+        '_value',
+    )
 
-class _SingleValue:
     def __init__(self, value):
         self._value = value
 
@@ -55,12 +84,10 @@ class _SingleValue:
     def value(self):
         return self._value
 
-    def __str__(self):
-        # this is normally never exposed
-        raise RuntimeError()
 
+class Node(_AstObject):
+    __slots__ = ()
 
-class Node:
     def accept(self, visitor):
         method = 'visit_{}'.format(self.__class__.__name__)
 
@@ -78,23 +105,20 @@ class Node:
 #   "hello"
 #   "he\tll\x3b;o\n"
 class LiteralString(_SingleValue, Node):
-    grammar = re.compile(r'"(\\.|[^"])*"')
+    __slots__ = ()
 
     def __init__(self, string):
         string = string[1:-1]
         string = bytes(string, 'utf-8').decode('unicode_escape')
         super().__init__(string)
 
-    def __str__(self):
-        return '<literal-string>{}</literal-string>'.format(self.value)
-
 
 # examples:
 #
 #   12
 #   934
 class ConstDecInteger(_SingleValue):
-    grammar = re.compile(r'[0-9]+')
+    __slots__ = ()
 
     def __init__(self, dec_str):
         super().__init__(int(dec_str))
@@ -105,7 +129,7 @@ class ConstDecInteger(_SingleValue):
 #   023
 #   0177
 class ConstOctInteger(_SingleValue):
-    grammar = '0', re.compile(r'[0-9]+')
+    __slots__ = ()
 
     def __init__(self, oct_str):
         super().__init__(int(oct_str, 8))
@@ -117,7 +141,7 @@ class ConstOctInteger(_SingleValue):
 #   0xCAFE
 #   0XbAbE1
 class ConstHexInteger(_SingleValue):
-    grammar = pypeg2.contiguous(['0x', '0X'], re.compile(r'[0-9a-fA-F]+'))
+    __slots__ = ()
 
     def __init__(self, hex_str):
         super().__init__(int(hex_str, 16))
@@ -133,14 +157,11 @@ class ConstHexInteger(_SingleValue):
 #   0xCAFE
 #   0XbAbE1
 class ConstInteger(_SingleValue):
-    grammar = [ConstHexInteger, ConstOctInteger, ConstDecInteger]
+    __slots__ = ()
 
     def __init__(self, integer):
         super().__init__(integer.value)
 
-    def __str__(self):
-        return '<const-int>{}</const-int>'.format(self.value)
-
 
 # examples:
 #
@@ -152,7 +173,7 @@ class ConstInteger(_SingleValue):
 #   -0xCAFE
 #   0XbAbE1
 class ConstNumber(_SingleValue, Node):
-    grammar = pypeg2.optional(re.compile(r'[+-]')), ConstInteger
+    __slots__ = ()
 
     def __init__(self, args):
         mul = 1
@@ -165,9 +186,6 @@ class ConstNumber(_SingleValue, Node):
 
         super().__init__(args[0].value * mul)
 
-    def __str__(self):
-        return '<const-number>{}</const-number>'.format(self.value)
-
 
 # examples:
 #
@@ -175,31 +193,24 @@ class ConstNumber(_SingleValue, Node):
 #   _field_name
 #   Bob42
 class Identifier(_SingleValue, Node):
-    grammar = re.compile(r'^(?!(?:struct|variant|enum|integer|floating_point|string|typealias))[A-Za-z_][A-Za-z_0-9]*')
+    __slots__ = ()
 
     def __init__(self, name):
         super().__init__(name)
 
-    def __str__(self):
-        return '<id>{}</id>'.format(self.value)
-
 
 class PostfixExpr(_List, Node):
+    __slots__ = ()
+
     def __init__(self, elements):
         super().__init__(elements)
 
-    def __str__(self):
-        postfix_expr = '<postfix-expr>'
-
-        for elem in self:
-            postfix_expr += str(elem)
-
-        postfix_expr += '</postfix-expr>'
-
-        return postfix_expr
-
 
 class UnaryExpr(Node):
+    __slots__ = (
+        '_expr',
+    )
+
     def __init__(self, expr):
         if type(expr) is PrimaryExpr:
             self._expr = expr.expr
@@ -210,11 +221,12 @@ class UnaryExpr(Node):
     def expr(self):
         return self._expr
 
-    def __str__(self):
-        return '<unary-expr>{}</unary-expr>'.format(str(self._expr))
-
 
 class PrimaryExpr(Node):
+    __slots__ = (
+        '_expr',
+    )
+
     def __init__(self, expr):
         self._expr = expr
 
@@ -222,12 +234,9 @@ class PrimaryExpr(Node):
     def expr(self):
         return self._expr
 
-    def __str__(self):
-        return '<primary-expr>{}</primary-expr>'.format(str(self._expr))
-
 
 class UnaryExprSubscript(_SingleValue, Node):
-    grammar = '[', UnaryExpr, ']'
+    __slots__ = ()
 
     def __init__(self, expr):
         super().__init__(expr)
@@ -236,9 +245,6 @@ class UnaryExprSubscript(_SingleValue, Node):
     def expr(self):
         return self._expr
 
-    def __str__(self):
-        return '<subscript-expr>{}</subscript-expr>'.format(str(self.value))
-
 
 # examples:
 #
@@ -247,7 +253,10 @@ class UnaryExprSubscript(_SingleValue, Node):
 #   key = 0x17
 #   key = -02131
 class ValueAssignment(Node):
-    grammar = Identifier, '=', UnaryExpr
+    __slots__ = (
+        '_key',
+        '_value',
+    )
 
     def __init__(self, args):
         self._key = args[0]
@@ -261,10 +270,6 @@ class ValueAssignment(Node):
     def value(self):
         return self._value
 
-    def __str__(self):
-        return '<value-assign>{}{}</value-assign>'.format(str(self._key),
-                                                          str(self._value))
-
 
 # examples:
 #
@@ -280,21 +285,11 @@ class ValueAssignment(Node):
 #
 #   integer {size = 13;}
 class Integer(_List, Node):
-    grammar = 'integer', '{', pypeg2.some((ValueAssignment, ';')), '}'
+    __slots__ = ()
 
     def __init__(self, assignments):
         super().__init__(assignments)
 
-    def __str__(self):
-        integer = '<integer>'
-
-        for a in self:
-            integer += str(a)
-
-        integer += '</integer>'
-
-        return integer
-
 
 # examples:
 #
@@ -307,21 +302,11 @@ class Integer(_List, Node):
 #
 #   floating_point {exp_dig = 2; mant_dig = 18;}
 class FloatingPoint(_List, Node):
-    grammar = 'floating_point', '{', pypeg2.some((ValueAssignment, ';')), '}'
+    __slots__ = ()
 
     def __init__(self, assignments):
         super().__init__(assignments)
 
-    def __str__(self):
-        float = '<floating-point>'
-
-        for a in self:
-            float += str(a)
-
-        float += '</floating-point>'
-
-        return float
-
 
 # examples:
 #
@@ -331,28 +316,15 @@ class FloatingPoint(_List, Node):
 #       encoding = ASCII;
 #   }
 class String(_SingleValue, Node):
-    grammar = (
-        'string',
-        pypeg2.optional((
-            '{', ValueAssignment, ';', '}'
-        ))
-    )
+    __slots__ = ()
 
     def __init__(self, encoding=None):
         super().__init__(encoding)
 
-    def __str__(self):
-        string = '<string>'
-
-        if self.value is not None:
-            string += str(self.value)
-
-        string += '</string>'
-
-        return string
-
 
 class Type(_SingleValue, Node):
+    __slots__ = ()
+
     def __init__(self, t):
         if type(t) is Struct:
             t = t.value
@@ -380,7 +352,10 @@ class Type(_SingleValue, Node):
 #       ELEVEN,
 #   } := the_great_enum;
 class TypeAlias(Node):
-    grammar = 'typealias', Type, ':=', pypeg2.some(Identifier)
+    __slots__ = (
+        '_type',
+        '_name',
+    )
 
     def __init__(self, args):
         self._type = args[0].value
@@ -397,17 +372,16 @@ class TypeAlias(Node):
     def name(self):
         return self._name
 
-    def __str__(self):
-        return '<typealias>{}{}</typealias>'.format(str(self._type),
-                                                    str(self._name))
-
 
 # examples:
 #
 #   LABEL = 23
 #   "some string" = 42
 class EnumeratorValue(Node):
-    grammar = [Identifier, LiteralString], '=', ConstInteger
+    __slots__ = (
+        '_key',
+        '_value',
+    )
 
     def __init__(self, args):
         self._key = args[0]
@@ -421,10 +395,6 @@ class EnumeratorValue(Node):
     def value(self):
         return self._value
 
-    def __str__(self):
-        return '<enum-value>{}{}</enum-value>'.format(str(self._key),
-                                                      str(self._value))
-
 
 # examples:
 #
@@ -432,9 +402,12 @@ class EnumeratorValue(Node):
 #   1...7
 #   -53 ... 747
 class ConstNumberRange(Node):
-    # eventually replace ConstNumber by ConstInteger here
-    grammar = ConstNumber, '...', ConstNumber
+    __slots__ = (
+        '_low',
+        '_high',
+    )
 
+    # eventually replace ConstNumber by ConstInteger here
     def __init__(self, args):
         self._low = args[0]
         self._high = args[1]
@@ -447,18 +420,16 @@ class ConstNumberRange(Node):
     def high(self):
         return self._high
 
-    def __str__(self):
-        fmt = '<const-int-range>{}{}</const-int-range>'
-
-        return fmt.format(str(self._low), str(self._high))
-
 
 # examples:
 #
 #   LABEL = 23 ... 102
 #   "some string" = -53...747
 class EnumeratorRange(Node):
-    grammar = [Identifier, LiteralString], '=', ConstNumberRange
+    __slots__ = (
+        '_key',
+        '_range',
+    )
 
     def __init__(self, args):
         self._key = args[0]
@@ -472,10 +443,6 @@ class EnumeratorRange(Node):
     def range(self):
         return self._range
 
-    def __str__(self):
-        return '<enum-range>{}{}</enum-range>'.format(str(self._key),
-                                                      str(self._range))
-
 
 # examples:
 #
@@ -486,50 +453,28 @@ class EnumeratorRange(Node):
 #   LABEL = 23 ... 102
 #   "some string" = -53...747
 class Enumerator(_SingleValue, Node):
-    grammar = [
-        EnumeratorRange,
-        EnumeratorValue,
-        Identifier,
-        LiteralString,
-    ]
+    __slots__ = ()
 
     def __init__(self, enumerator):
         super().__init__(enumerator)
 
-    def __str__(self):
-        return '<enumerator>{}{}</enumerator>'.format(str(self.value))
-
 
 # examples:
 #
 #   LABEL, LABEL2 = 23, "some label" = 1...18,
 class Enumerators(_List, Node):
-    grammar = pypeg2.csl(Enumerator), pypeg2.optional(',')
+    __slots__ = ()
 
     def __init__(self, items):
         super().__init__([i.value for i in items])
 
-    def __str__(self):
-        s = '<enumerators>'
-
-        for e in self:
-            s += str(e)
-
-        s += '</enumerators>'
-
-        return s
-
 
 class EnumName(_SingleValue):
-    grammar = Identifier
+    __slots__ = ()
 
     def __init__(self, name):
         super().__init__(name)
 
-    def __str__(self):
-        # this is normally never exposed
-        raise RuntimeError()
-
 
 # examples:
 #
@@ -550,17 +495,10 @@ class EnumName(_SingleValue):
 #       STATE2
 #   }
 class Enum(Node):
-    grammar = (
-        'enum',
-        pypeg2.optional(EnumName),
-        ':',
-        [
-            pypeg2.some(Identifier),
-            Integer,
-        ],
-        '{',
-        Enumerators,
-        '}'
+    __slots__ = (
+        '_name',
+        '_int_type',
+        '_enumerators',
     )
 
     def __init__(self, args):
@@ -593,66 +531,27 @@ class Enum(Node):
     def enumerators(self):
         return self._enumerators
 
-    def __str__(self):
-        enum = '<enum>'
-
-        if self._name is not None:
-            enum += str(self._name)
-
-        enum += str(self._int_type)
-        enum += str(self._enumerators)
-        enum += '</enum>'
-
-        return enum
-
 
 class Dot(Node):
-    grammar = '.'
+    __slots__ = ()
 
     def __init__(self):
         pass
 
-    def __str__(self):
-        return '<dot />'
-
 
 class Arrow(Node):
-    grammar = '->'
+    __slots__ = ()
 
     def __init__(self):
         pass
 
-    def __str__(self):
-        return '<arrow />'
-
-
-PrimaryExpr.grammar = [
-    Identifier,
-    ConstNumber,
-    LiteralString,
-    ('(', UnaryExpr, ')'),
-]
-
 
-PostfixExpr.grammar = (
-    Identifier,
-    pypeg2.maybe_some(
-        [
-            (Arrow, Identifier),
-            (Dot, Identifier),
-            UnaryExprSubscript
-        ]
+class Declarator(Node):
+    __slots__ = (
+        '_name',
+        '_subscripts',
     )
-)
-
-
-UnaryExpr.grammar = [
-    PostfixExpr,
-    PrimaryExpr,
-]
 
-
-class Declarator(Node):
     def __init__(self, name, subscripts):
         self._name = name
         self._subscripts = subscripts
@@ -665,16 +564,6 @@ class Declarator(Node):
     def subscripts(self):
         return self._subscripts
 
-    def __str__(self):
-        decl = '<decl>{}'.format(str(self._name))
-
-        for s in self._subscripts:
-            decl += str(s)
-
-        decl += '</decl>'
-
-        return decl
-
 
 # examples:
 #
@@ -689,7 +578,10 @@ class Declarator(Node):
 #
 #   variant some_variant_ref <tag_ref> my_field
 class TypeField(Node):
-    grammar = Type, Identifier, pypeg2.maybe_some(UnaryExprSubscript)
+    __slots__ = (
+        '_type',
+        '_decl',
+    )
 
     def __init__(self, args):
         self._type = args[0].value
@@ -710,10 +602,6 @@ class TypeField(Node):
     def decl(self):
         return self._decl
 
-    def __str__(self):
-        return '<type-field>{}{}</type-field>'.format(str(self._type),
-                                                      str(self._decl))
-
 
 # examples:
 #
@@ -722,6 +610,11 @@ class TypeField(Node):
 #   unsigned long my_field[other_field]
 #   int a[1][2][a][b][c]
 class IdentifierField(Node):
+    __slots__ = (
+        '_type',
+        '_decl',
+    )
+
     # Here's the hackish way to parse fields like:
     #
     #   int a
@@ -731,8 +624,6 @@ class IdentifierField(Node):
     #
     # We scan for identifiers and assume the last one is the declarator
     # name, not part of the type alias. Then come subscripts.
-    grammar = pypeg2.some(Identifier), pypeg2.maybe_some(UnaryExprSubscript)
-
     def __init__(self, args):
         self._type = []
         subscripts = []
@@ -761,23 +652,17 @@ class IdentifierField(Node):
     def decl(self):
         return self._decl
 
-    def __str__(self):
-        return '<id-field>{}{}</id-field>'.format(str(self._type),
-                                                  str(self._decl))
-
 
 class Field(_SingleValue, Node):
-    grammar = [TypeField, IdentifierField]
+    __slots__ = ()
 
     def __init__(self, field):
         super().__init__(field)
 
-    def __str__(self):
-        # this is normally never exposed
-        raise RuntimeError()
-
 
 class StructVariantEntries(_List):
+    __slots__ = ()
+
     def __init__(self, fields=[]):
         for i in range(len(fields)):
             if type(fields[i]) is Field:
@@ -785,40 +670,34 @@ class StructVariantEntries(_List):
 
         super().__init__(fields)
 
-    def __str__(self):
-        # this is normally never exposed
-        raise RuntimeError()
-
 
 # examples:
 #
 #   struct hello
 #   struct sweet
 class StructRef(_SingleValue, Node):
-    grammar = 'struct', Identifier
+    __slots__ = ()
 
     def __init__(self, name):
         super().__init__(name)
 
-    def __str__(self):
-        return '<struct-ref>{}</struct-ref>'.format(str(self.value))
-
 
 # examples:
 #
 #   align(8)
 #   align(0x20)
 class StructAlign(_SingleValue, Node):
-    grammar = 'align', '(', ConstInteger, ')'
+    __slots__ = ()
 
     def __init__(self, align):
         super().__init__(align)
 
-    def __str__(self):
-        return '<struct-align>{}</struct-align>'.format(str(self.value))
-
 
 class Scope(Node):
+    __slots__ = (
+        '_entries',
+    )
+
     def __init__(self, entries):
         self._entries = entries
 
@@ -844,11 +723,9 @@ class Scope(Node):
 #       int z;
 #   } align(0x10)
 class StructFull(Scope):
-    grammar = (
-        'struct',
-        pypeg2.optional(Identifier),
-        '{', StructVariantEntries, '}',
-        pypeg2.optional(StructAlign)
+    __slots__ = (
+        '_name',
+        '_align',
     )
 
     def __init__(self, args):
@@ -873,54 +750,34 @@ class StructFull(Scope):
     def align(self):
         return self._align
 
-    def __str__(self):
-        struct = '<struct-full>'
-
-        if self._name is not None:
-            struct += str(self._name)
-
-        for e in self.entries:
-            struct += str(e)
-
-        if self._align is not None:
-            struct += str(self._align)
-
-        struct += '</struct-full>'
-
-        return struct
-
 
 class Struct(_SingleValue):
-    grammar = [StructFull, StructRef]
+    __slots__ = ()
 
     def __init__(self, struct):
         super().__init__(struct)
 
-    def __str__(self):
-        # this is normally never exposed
-        raise RuntimeError()
-
 
 # examples:
 #
 #   <field>
 #   <packet.context.some_field>
 class VariantTag(_SingleValue, Node):
-    grammar = '<', UnaryExpr, '>'
+    __slots__ = ()
 
     def __init__(self, expr):
         super().__init__(expr)
 
-    def __str__(self):
-        return '<tag>{}</tag>'.format(str(self.value))
-
 
 # examples:
 #
 #   variant name <field>
 #   variant name <packet.context.some_field>
 class VariantRef(Node):
-    grammar = 'variant', Identifier, VariantTag
+    __slots__ = (
+        '_name',
+        '_tag',
+    )
 
     def __init__(self, args):
         self._name = args[0]
@@ -934,10 +791,6 @@ class VariantRef(Node):
     def tag(self):
         return self._tag
 
-    def __str__(self):
-        return '<variant-ref>{}{}</variant-ref>'.format(str(self._name),
-                                                        str(self._tag))
-
 
 # examples:
 #
@@ -953,11 +806,9 @@ class VariantRef(Node):
 #       struct yeah c[17];
 #   }
 class VariantFull(Scope, Node):
-    grammar = (
-        'variant',
-        pypeg2.optional(Identifier),
-        pypeg2.optional(VariantTag),
-        '{', StructVariantEntries, '}'
+    __slots__ = (
+        '_name',
+        '_tag',
     )
 
     def __init__(self, args):
@@ -986,33 +837,13 @@ class VariantFull(Scope, Node):
     def tag(self, tag):
         self._tag = tag
 
-    def __str__(self):
-        variant = '<variant-full>'
-
-        if self._name is not None:
-            variant += str(self._name)
-
-        if self._tag is not None:
-            variant += str(self._tag)
-
-        for e in self.entries:
-            variant += str(e)
-
-        variant += '</variant-full>'
-
-        return variant
-
 
 class Variant(_SingleValue):
-    grammar = [VariantFull, VariantRef]
+    __slots__ = ()
 
     def __init__(self, variant):
         super().__init__(variant)
 
-    def __str__(self):
-        # this is normally never exposed
-        raise RuntimeError()
-
 
 # examples:
 #
@@ -1031,7 +862,10 @@ class Variant(_SingleValue):
 #       uint32_t stream_id;
 #   }
 class TypeAssignment(Node):
-    grammar = UnaryExpr, ':=', Type
+    __slots__ = (
+        '_key',
+        '_type',
+    )
 
     def __init__(self, args):
         self._key = args[0]
@@ -1049,53 +883,50 @@ class TypeAssignment(Node):
     def type(self, type):
         self._type = type
 
-    def __str__(self):
-        return '<type-assign>{}{}</type-assign>'.format(str(self._key),
-                                                        str(self._type))
 
+# Type of a type assignment within an event block which the native
+# parser, in lazy mode, keeps as the text span `text[pos:end]` to parse
+# it only when needed (`line` and `col` being the position of the first
+# character of `text` within the whole document, for error messages).
+class DeferredType:
+    __slots__ = (
+        '_text',
+        '_pos',
+        '_end',
+        '_line',
+        '_col',
+    )
 
-_common_scope_entries = [
-    TypeAlias,
-    StructFull,
-    VariantFull,
-]
-
-
-_scope_entries = pypeg2.maybe_some((
-    [ValueAssignment, TypeAssignment] + _common_scope_entries,
-    ';'
-))
-
+    def __init__(self, text, pos, end, line=1, col=1):
+        self._text = text
+        self._pos = pos
+        self._end = end
+        self._line = line
+        self._col = col
 
-StructVariantEntries.grammar = pypeg2.maybe_some((
-    [Field] + _common_scope_entries,
-    ';'
-))
+    # Returns the parsed type (see TypeAssignment.type).
+    def parse(self):
+        import pytsdl.rdparser
 
+        parser = pytsdl.rdparser.RecursiveDescentParser()
 
-Type.grammar = [Struct, Variant, Enum, Integer, FloatingPoint, String]
+        return parser.parse_type(self._text, self._pos, self._end,
+                                 self._line, self._col)
 
 
 class TopLevelScope(Scope):
+    __slots__ = ()
+
     @staticmethod
     def _create_scope(clsname, scope_name):
         return type(clsname, (TopLevelScope, Node, object), {
-            'grammar': (scope_name, '{', _scope_entries, '}'),
-            '_scope_name': scope_name
+            '__slots__': (),
+            '_scope_name': scope_name,
         })
 
     def __init__(self, entries=[]):
         super().__init__(entries)
 
-    def __str__(self):
-        entries = ''
-        for e in self.entries:
-            entries += str(e)
-
-        s = '<{sn}>{e}</{sn}>'.format(sn=self._scope_name, e=entries)
-
-        return s
-
 
 Env = TopLevelScope._create_scope('Env', 'env')
 Trace = TopLevelScope._create_scope('Trace', 'trace')
@@ -1105,16 +936,128 @@ Event = TopLevelScope._create_scope('Event', 'event')
 Top = TopLevelScope._create_scope('Top', 'top')
 
 
-Top.grammar = pypeg2.maybe_some((
-    [Env, Trace, Clock, Stream, Event] + _common_scope_entries, ';'
-))
-
-
 class ParseError(RuntimeError):
     def __init__(self, str):
         super().__init__(str)
 
 
+# Symbol table of the type aliases, named structures and named variants
+# visible from the current scope, one namespace for each kind.
+#
+# A namespace maps a name to the stack of its bindings (innermost
+# last), so that a lookup is a single dict access whatever the depth of
+# the current scope. Each scope has an undo log of the bindings it
+# made, so that leaving it only costs those.
+class _SymbolTable:
+    def __init__(self):
+        self._namespaces = {
+            'alias': {},
+            'struct': {},
+            'variant': {},
+        }
+        self._undo_logs = []
+
+        # incremented each time the visible bindings change, to reuse
+        # the last snapshot while they don't (see snapshot())
+        self._version = 0
+        self._snapshot = None
+        self._snapshot_version = None
+
+    @property
+    def depth(self):
+        return len(self._undo_logs)
+
+    def push_scope(self):
+        self._undo_logs.append([])
+
+    def pop_scope(self):
+        undo_log = self._undo_logs.pop()
+
+        if undo_log:
+            self._version += 1
+
+        for kind, name, stack in undo_log:
+            stack.pop()
+
+    def bind(self, kind, name, obj):
+        namespace = self._namespaces[kind]
+        stack = namespace.get(name)
+
+        if stack is None:
+            stack = []
+            namespace[name] = stack
+
+        stack.append(obj)
+        self._undo_logs[-1].append((kind, name, stack))
+        self._version += 1
+
+    # binds all the names of `bindings` (see scope_bindings())
+    def bind_all(self, bindings):
+        for kind, names in bindings.items():
+            for name, obj in names.items():
+                self.bind(kind, name, obj)
+
+    # Returns the innermost binding of `name` of kind `kind`, or None.
+    def lookup(self, kind, name):
+        stack = self._namespaces[kind].get(name)
+
+        if stack:
+            return stack[-1]
+
+        return None
+
+    # Returns the bindings made by the current scope, as a dict of kind
+    # to dict of name to object.
+    def scope_bindings(self):
+        bindings = {kind: {} for kind in self._namespaces}
+
+        for kind, name, stack in self._undo_logs[-1]:
+            bindings[kind][name] = stack[-1]
+
+        return bindings
+
+    # Returns the innermost bindings of all the visible names, in the
+    # same form as scope_bindings(). The returned dicts must not be
+    # modified: they're shared by the snapshots taken while the visible
+    # bindings don't change.
+    def snapshot(self):
+        if self._snapshot_version != self._version:
+            self._snapshot = {}
+
+            for kind, namespace in self._namespaces.items():
+                self._snapshot[kind] = {
+                    name: stack[-1] for name, stack in namespace.items()
+                    if stack
+                }
+
+            self._snapshot_version = self._version
+
+        return self._snapshot
+
+
+# Builds the context and fields of an event parsed lazily (see the
+# `lazy` parameter of Parser) from their AST, resolving their types
+# against the aliases, structures and variants which were visible where
+# they're assigned.
+class _EventBuilder:
+    __slots__ = (
+        '_doc',
+        '_assignments',
+        '_strict',
+    )
+
+    # `assignments` is a list of (key, type AST, visible symbols) tuples
+    # (see _SymbolTable.snapshot()).
+    def __init__(self, doc, assignments, strict=True):
+        self._doc = doc
+        self._assignments = assignments
+        self._strict = strict
+
+    def __call__(self, event):
+        visitor = _DocCreatorVisitor(strict=self._strict)
+        visitor.build_event(self._doc, event, self._assignments)
+
+
 class _DocCreatorVisitor:
     _byte_order_map = {
         'le': pytsdl.tsdl.ByteOrder.LE,
@@ -1148,7 +1091,14 @@ class _DocCreatorVisitor:
         'ASCII': pytsdl.tsdl.Encoding.ASCII,
     }
 
-    def __init__(self):
+    # When `lazy` is true, the context and fields of events are built
+    # on first access (see pytsdl.tsdl.Event.builder).
+    #
+    # When `strict` is false, invalid variant tags and sequence lengths
+    # are only reported when decoding (see pytsdl.resolve).
+    def __init__(self, lazy=False, strict=True):
+        self._lazy = lazy
+        self._strict = strict
         self._value_assignment_map = {
             pytsdl.tsdl.Trace: self._value_assign_trace,
             pytsdl.tsdl.Env: self._value_assign_env,
@@ -1174,6 +1124,7 @@ class _DocCreatorVisitor:
             VariantFull: self._variant_full_to_obj,
             StructRef: self._struct_ref_to_obj,
             VariantRef: self._variant_ref_to_obj,
+            DeferredType: self._deferred_type_to_obj,
         }
 
         self._reset_state()
@@ -1219,6 +1170,8 @@ class _DocCreatorVisitor:
 
     @staticmethod
     def _uuid_from_str(s):
+        import uuid
+
         try:
             return uuid.UUID('{{{}}}'.format(s))
         except:
@@ -1241,53 +1194,40 @@ class _DocCreatorVisitor:
 
     def _reset_state(self):
         self._objs = []
-        self._scope_stores = []
+        self._symbols = _SymbolTable()
+        self._lazy_assignments = None
 
-    def _get_cur_scope_store(self):
-        return self._scope_stores[-1]
+    def _push_scope(self):
+        self._symbols.push_scope()
 
-    def _push_scope_store(self):
-        self._scope_stores.append({})
+    def _pop_scope(self):
+        self._symbols.pop_scope()
 
-    def _pop_scope_store(self):
-        return self._scope_stores.pop()
+    def _resolve(self, kind, name):
+        obj = self._symbols.lookup(kind, name)
 
-    def _store(self, prefix, name, obj):
-        ss = self._get_cur_scope_store()
-        ss[prefix + name] = obj
-
-    def _resolve(self, prefix, name):
-        search = prefix + name
-
-        for ss in reversed(self._scope_stores):
-            if search in ss:
-                return ss[search]
-
-        reftype = {
-            'a': 'alias',
-            's': 'struct',
-            'v': 'variant',
-        }
+        if obj is None:
+            raise ParseError('cannot resolve {}: {}'.format(kind, name))
 
-        raise ParseError('cannot resolve {}: {}'.format(reftype[prefix], name))
+        return obj
 
     def _store_alias(self, name, obj):
-        self._store('a', name, obj)
+        self._symbols.bind('alias', name, obj)
 
     def _resolve_alias(self, name):
-        return self._resolve('a', name)
+        return self._resolve('alias', name)
 
     def _store_struct(self, name, obj):
-        self._store('s', name, obj)
+        self._symbols.bind('struct', name, obj)
 
     def _resolve_struct(self, name):
-        return self._resolve('s', name)
+        return self._resolve('struct', name)
 
     def _store_variant(self, name, obj):
-        self._store('v', name, obj)
+        self._symbols.bind('variant', name, obj)
 
     def _resolve_variant(self, name):
-        return self._resolve('v', name)
+        return self._resolve('variant', name)
 
     def _get_cur_obj(self):
         return self._objs[-1]
@@ -1300,12 +1240,12 @@ class _DocCreatorVisitor:
 
     def _visit_scope(self, node, obj):
         self._push_obj(obj)
-        self._push_scope_store()
+        self._push_scope()
 
         for entry in node.entries:
             entry.accept(self)
 
-        self._pop_scope_store()
+        self._pop_scope()
         return self._pop_obj()
 
     def visit(self, node):
@@ -1346,23 +1286,176 @@ class _DocCreatorVisitor:
         else:
             self._set_byte_order(obj)
 
+    # Returns the canonical instance of a structurally identical integer
+    # or floating point number type (the first one seen), or the object
+    # itself for any other type.
+    def _intern_type(self, obj):
+        tobj = type(obj)
+
+        if tobj is pytsdl.tsdl.Integer:
+            imap = obj.map
+
+            if imap is not None:
+                imap = tuple(imap)
+
+            key = (tobj, obj.signed, obj.byte_order, obj.base, obj.encoding,
+                   obj.align, obj.size, imap)
+        elif tobj is pytsdl.tsdl.FloatingPoint:
+            key = (tobj, obj.exp_dig, obj.mant_dig, obj.align,
+                   obj.byte_order)
+        else:
+            self._intern_types(obj)
+
+            return obj
+
+        return self._interned.setdefault(key, obj)
+
+    def _intern_types(self, obj):
+        if obj is None or id(obj) in self._interned_visited:
+            return
+
+        self._interned_visited.add(id(obj))
+
+        if type(obj) is pytsdl.tsdl.Struct or type(obj) is pytsdl.tsdl.Variant:
+            fields = obj.fields
+
+            for name, f in list(fields.items()):
+                fields[name] = self._intern_type(f)
+        elif type(obj) is pytsdl.tsdl.Array or type(obj) is pytsdl.tsdl.Sequence:
+            obj.element = self._intern_type(obj.element)
+        elif type(obj) is pytsdl.tsdl.Enum:
+            obj.integer = self._intern_type(obj.integer)
+
+    # Calls `cb` with each scope of `trace` (if not None) and of
+    # `added`, a list of (stream, events, is the stream new) tuples.
+    @staticmethod
+    def _foreach_scope(trace, added, cb):
+        if trace is not None:
+            cb(trace.packet_header)
+
+        for stream, events, new_stream in added:
+            if new_stream:
+                cb(stream.packet_context)
+                cb(stream.event_context)
+                cb(stream.event_header)
+
+            for event in events:
+                # lazily parsed events are completed when built
+                if event.builder is None:
+                    cb(event.context)
+                    cb(event.fields)
+
     @staticmethod
-    def _foreach_scope(doc, cb):
-        cb(doc.trace.packet_header)
+    def _check_events(stream, events):
+        enames = set()
+        eids = set()
 
-        for stream in doc.streams.values():
-            cb(stream.packet_context)
-            cb(stream.event_context)
-            cb(stream.event_header)
+        for e in events:
+            if e.name in enames or stream.has_event(e.name):
+                raise ParseError('duplicate event: {}'.format(e.name))
 
-            for event in stream.events:
-                cb(event.context)
-                cb(event.fields)
+            enames.add(e.name)
 
-    def visit_Top(self, node):
+            if e.id in eids or stream.has_event(e.id):
+                raise ParseError('duplicate event: {}'.format(e.id))
+
+            eids.add(e.id)
+
+    # Runs one phase of the completion of a document (see
+    # _InstrumentedDocCreatorVisitor).
+    def _phase(self, name, fn, *args):
+        return fn(*args)
+
+    @staticmethod
+    def _check_added_events(added):
+        for stream, events, new_stream in added:
+            _DocCreatorVisitor._check_events(stream, events)
+
+    def _intern_added(self, trace, added):
+        self._interned_visited = set()
+        _DocCreatorVisitor._foreach_scope(trace, added, self._intern_types)
+        self._interned_visited = None
+
+    @staticmethod
+    def _analyze_added(trace, added):
+        if trace is not None and trace.packet_header is not None:
+            pytsdl.layout.layout_of(trace.packet_header)
+
+        for stream, events, new_stream in added:
+            if new_stream:
+                pytsdl.layout.analyze_stream_scopes(stream)
+
+            pytsdl.layout.analyze_events([e for e in events
+                                          if e.builder is None])
+
+    # `trace` is the trace of the document (may be None), and
+    # `new_trace` is true if it was just added.
+    @staticmethod
+    def _resolve_added(trace, new_trace, added, strict):
+        try:
+            if new_trace:
+                pytsdl.resolve.resolve_trace(trace, strict)
+
+            for stream, events, new_stream in added:
+                if new_stream:
+                    pytsdl.resolve.resolve_stream(trace, stream, strict)
+
+                pytsdl.resolve.resolve_events(trace, stream,
+                                              [e for e in events
+                                               if e.builder is None],
+                                              strict)
+        except pytsdl.resolve.ResolveError as e:
+            raise ParseError(str(e))
+
+    @staticmethod
+    def _update_events_dicts(added):
+        for stream, events, new_stream in added:
+            if new_stream:
+                stream.init_events_dict()
+            else:
+                stream.update_events_dict(events)
+
+    # Validates and completes the scopes of `trace` (if not None) and of
+    # `added` (see _foreach_scope()), which were just added to the
+    # document, and computes their layouts.
+    def _complete(self, trace, added):
+        self._phase('check', _DocCreatorVisitor._check_added_events, added)
+        self._complete_scopes(trace, added)
+
+    def _complete_scopes(self, trace, added):
+        # resolve byte orders
+        self._phase('byte_order', _DocCreatorVisitor._foreach_scope, trace,
+                    added, self._resolve_byte_order)
+
+        # share a single instance between identical scalar types (byte
+        # orders must be resolved first)
+        self._phase('intern', self._intern_added, trace, added)
+
+        # validate and resolve variant tags and sequence lengths (types
+        # must be interned first)
+        self._phase('resolve', _DocCreatorVisitor._resolve_added,
+                    self._doc.trace, trace is not None, added, self._strict)
+
+        # precompute alignments, static sizes and offsets
+        self._phase('layout', _DocCreatorVisitor._analyze_added, trace, added)
+
+    # Starts a new document, the top-level entries of which are then
+    # visited with add_entries() (possibly a few at a time) until
+    # finish() is called.
+    def begin(self):
         self._reset_state()
         self._doc = pytsdl.tsdl.Doc()
-        self._visit_scope(node, self._doc)
+        self._push_obj(self._doc)
+        self._push_scope()
+
+    def add_entries(self, node):
+        for entry in node.entries:
+            entry.accept(self)
+
+    def finish(self):
+        symbols = self._symbols.scope_bindings()
+        self._pop_scope()
+        self._pop_obj()
 
         # ensure at least one clock, at least one stream
         if not self._doc.clocks:
@@ -1371,26 +1464,111 @@ class _DocCreatorVisitor:
         if not self._doc.streams:
             raise ParseError('no streams defined')
 
-        for s in self._doc.streams.values():
-            enames = set()
-            eids = set()
+        added = [(s, s.events, True) for s in self._doc.streams.values()]
+        self._interned = {}
+        self._complete(self._doc.trace, added)
+
+        # safe to initialize the streams' events dicts now
+        self._phase('events_dict', _DocCreatorVisitor._update_events_dicts,
+                    added)
+
+        self._doc.parse_state = _ParseState(symbols, self._interned)
 
-            for e in s.events:
-                if e.name in enames:
-                    raise ParseError('duplicate event: {}'.format(e.name))
+    def visit_Top(self, node):
+        self.begin()
+        self.add_entries(node)
+        self.finish()
+
+    # Adds the top-level blocks of `node`, the AST of TSDL text appended
+    # to the one from which `doc` was created, to `doc`: new types are
+    # resolved against the top-level aliases, structures and variants
+    # of `doc`, new events are appended to their (new or existing)
+    # stream, and new streams and clocks are added.
+    #
+    # On error, `doc` is left unchanged.
+    def extend(self, doc, node):
+        state = doc.parse_state
 
-                enames.add(e.name)
+        if state is None:
+            raise ParseError('document was not created by the parser')
 
-                if e.id in eids:
-                    raise ParseError('duplicate event: {}'.format(e.id))
+        self._reset_state()
+        self._doc = doc
+        trace = doc.trace
+        env = doc.env
+        nclocks = len(doc.clocks)
+        nstreams = len(doc.streams)
+        nevents = [len(s.events) for s in doc.streams.values()]
 
-                eids.add(e.id)
+        # intern into a copy to keep the state as is on error
+        self._interned = dict(state.interned)
 
-            # safe to initialize stream's events dict now
-            s.init_events_dict()
+        try:
+            self._push_scope()
+            self._symbols.bind_all(state.symbols)
+            self._push_scope()
+            self._push_obj(doc)
+            self.add_entries(node)
 
-        # resolve byte orders
-        _DocCreatorVisitor._foreach_scope(self._doc, self._resolve_byte_order)
+            if doc.trace is not trace:
+                raise ParseError('cannot redefine the trace block')
+
+            added = []
+
+            for i, s in enumerate(doc.streams.values()):
+                if i >= nstreams:
+                    added.append((s, s.events, True))
+                elif len(s.events) > nevents[i]:
+                    added.append((s, s.events[nevents[i]:], False))
+
+            self._complete(None, added)
+        except:
+            doc.trace = trace
+            doc.env = env
+
+            while len(doc.clocks) > nclocks:
+                doc.clocks.popitem()
+
+            while len(doc.streams) > nstreams:
+                doc.streams.popitem()
+
+            for i, s in enumerate(doc.streams.values()):
+                del s.events[nevents[i]:]
+
+            raise
+
+        self._phase('events_dict', _DocCreatorVisitor._update_events_dicts,
+                    added)
+        for kind, bindings in self._symbols.scope_bindings().items():
+            state.symbols[kind].update(bindings)
+
+        state.interned = self._interned
+
+    # Builds the context and fields of `event`, an event of `doc` parsed
+    # lazily, from `assignments` (see _EventBuilder).
+    def build_event(self, doc, event, assignments):
+        self._reset_state()
+        self._doc = doc
+        self._interned = doc.parse_state.interned
+        self._push_obj(event)
+
+        for key, t, symbols in assignments:
+            if type(t) is DeferredType:
+                # even if the key is unknown, for syntax errors
+                t = t.parse()
+
+            self._push_scope()
+            self._symbols.bind_all(symbols)
+            self._type_assign_event(key, t)
+            self._pop_scope()
+
+        self._pop_obj()
+        sid = 0
+
+        if event.stream_id is not None:
+            sid = event.stream_id
+
+        self._complete_scopes(None, [(doc.streams[sid], [event], False)])
 
     def visit_TypeAlias(self, node):
         obj = self._type_to_obj(node.type)
@@ -1440,8 +1618,13 @@ class _DocCreatorVisitor:
         doc = self._get_cur_obj()
         event = pytsdl.tsdl.Event()
         event.stream_id = None
+        self._lazy_assignments = []
         event = self._visit_scope(node, event)
 
+        if self._lazy_assignments:
+            event.builder = _EventBuilder(doc, self._lazy_assignments,
+                                          self._strict)
+
         if event.id is None:
             raise ParseError('event is missing ID')
 
@@ -1818,6 +2001,9 @@ class _DocCreatorVisitor:
     def _variant_full_to_obj(self, t):
         variant = self._visit_scope(t, pytsdl.tsdl.Variant())
 
+        if t.tag is not None:
+            variant.tag = self._decode_unary(t.tag.value)
+
         # store this variant if it's named
         if t.name is not None:
             self._store_variant(t.name.value, variant)
@@ -1835,9 +2021,13 @@ class _DocCreatorVisitor:
 
         # assign tag to copy now
         variant_copy.tag = self._decode_unary(t.tag.value)
+        variant_copy.tag_ref = None
 
         return variant_copy
 
+    def _deferred_type_to_obj(self, t):
+        return self._type_to_obj(t.parse())
+
     def _type_to_obj(self, t):
         return self._type_to_obj_map[type(t)](t)
 
@@ -1866,6 +2056,12 @@ class _DocCreatorVisitor:
     def _type_assign_event(self, key, type):
         event = self._get_cur_obj()
 
+        if self._lazy:
+            # built later, with the bindings visible here
+            self._lazy_assignments.append((key, type,
+                                           self._symbols.snapshot()))
+            return
+
         if key == 'fields':
             event.fields = self._type_to_obj(type)
         elif key == 'context':
@@ -1885,25 +2081,509 @@ class _DocCreatorVisitor:
         return self._doc
 
 
+# Document visitor recording statistics (see pytsdl.stats.ParseStats):
+# kept apart so that the plain visitor has no instrumentation overhead.
+class _InstrumentedDocCreatorVisitor(_DocCreatorVisitor):
+    def __init__(self, stats, lazy=False, strict=True):
+        super().__init__(lazy, strict)
+        self._stats = stats
+
+    def _phase(self, name, fn, *args):
+        start = time.perf_counter()
+
+        try:
+            return fn(*args)
+        finally:
+            self._stats.add_time(name, time.perf_counter() - start)
+
+    def _push_scope(self):
+        super()._push_scope()
+        self._stats.add_scope_depth(self._symbols.depth)
+
+    def _resolve(self, kind, name):
+        self._stats.add_lookup()
+
+        return super()._resolve(kind, name)
+
+    @staticmethod
+    def _block_name(node):
+        if type(node) is TypeAlias:
+            return node.name.value
+
+        if node.is_scope():
+            assignments = {}
+
+            for entry in node.entries:
+                if type(entry) is ValueAssignment:
+                    assignments[entry.key.value] = entry.value.expr
+
+            for key in ['name', 'id']:
+                if key in assignments:
+                    expr = assignments[key]
+
+                    if type(expr) is PostfixExpr:
+                        return expr[0].value
+
+                    return expr.value
+
+        name = getattr(node, 'name', None)
+
+        if type(name) is Identifier:
+            return name.value
+
+        return None
+
+    def add_entries(self, node):
+        stats = self._stats
+
+        for entry in node.entries:
+            start = time.perf_counter()
+
+            try:
+                entry.accept(self)
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.add_time('visit', elapsed)
+                stats.add_block(type(entry).__name__,
+                                _InstrumentedDocCreatorVisitor._block_name(entry),
+                                elapsed)
+
+
+_slot_names_cache = {}
+
+
+# Returns the names of all the slots of the instances of `cls`.
+def _slot_names(cls):
+    names = _slot_names_cache.get(cls)
+
+    if names is None:
+        names = tuple(name for base in cls.__mro__
+                      for name in base.__dict__.get('__slots__', ()))
+        _slot_names_cache[cls] = names
+
+    return names
+
+
+# Returns the number of nodes of an AST.
+def _count_nodes(ast):
+    count = 0
+    stack = [ast]
+
+    while stack:
+        obj = stack.pop()
+
+        if type(obj) is list:
+            stack.extend(obj)
+        elif isinstance(obj, _AstObject):
+            count += 1
+            stack.extend(getattr(obj, name, None)
+                         for name in _slot_names(type(obj)))
+
+    return count
+
+
+# Generates the str chunks of `source` (see Parser.parse_stream()).
+def _text_chunks(source, chunk_size):
+    if hasattr(source, 'read'):
+        def read_chunks():
+            while True:
+                chunk = source.read(chunk_size)
+
+                if not chunk:
+                    return
+
+                yield chunk
+
+        chunks = read_chunks()
+    else:
+        chunks = source
+
+    decoder = None
+
+    for chunk in chunks:
+        if type(chunk) is not str:
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+
+            chunk = decoder.decode(chunk)
+
+        if chunk:
+            yield chunk
+
+    if decoder is not None:
+        chunk = decoder.decode(b'', True)
+
+        if chunk:
+            yield chunk
+
+
+# What the parser keeps with a document to extend it later: the
+# top-level aliases, structures and variants (see
+# _SymbolTable.scope_bindings()) and the canonical instances of
+# interned types.
+class _ParseState:
+    def __init__(self, symbols, interned):
+        self._symbols = symbols
+        self._interned = interned
+
+    @property
+    def symbols(self):
+        return self._symbols
+
+    @property
+    def interned(self):
+        return self._interned
+
+    @interned.setter
+    def interned(self, value):
+        self._interned = value
+
+
 class Parser:
-    def get_ast(self, tsdl):
+    _engines = [
+        'native',
+        'pypeg2',
+    ]
+
+    # smaller documents (e.g. the blocks of parse_stream()) are not
+    # worth sending to worker processes
+    _parallel_min_size = 128 * 1024
+
+    # When `cache_dir` is set, parsed documents are cached in this
+    # directory (see pytsdl.cache.DocCache), so that parsing the same
+    # TSDL text again only costs loading the cached document.
+    #
+    # With `stats`, each parse records statistics (see
+    # pytsdl.stats.ParseStats), available through the `stats` property
+    # afterwards. With `profile`, the parse also runs under cProfile.
+    #
+    # With `lazy`, the context and fields of each event are only built
+    # when first accessed (see pytsdl.tsdl.Event.builder), so that
+    # errors in those are raised then. A lazily parsed document is
+    # built completely when put to the cache.
+    #
+    # With `strict` (the default), a variant tag or sequence length
+    # which doesn't name a suitable field decoded before it is a parse
+    # error. Otherwise, such errors are only reported when decoding
+    # the variant or sequence, as documents used to be accepted before
+    # they were validated; the document cache isn't used then, so that
+    # strict parsers sharing the cache directory never get a document
+    # which wasn't validated.
+    #
+    # With the native engine and a nonzero `block_cache_size`, the ASTs
+    # of the top-level blocks parsed by this parser are kept in memory,
+    # up to this many characters of block text (see
+    # pytsdl.cache.BlockCache), so that parsing other documents sharing
+    # blocks with the previous ones (e.g. the metadata of another
+    # session of the same tracer) only costs parsing their distinct
+    # blocks. This cache is disabled by default: it keeps the ASTs
+    # alive, which defeats the bounded memory of parse_stream().
+    #
+    # With the native engine and more than one `ast_workers`, the ASTs
+    # of the top-level blocks of large documents are built by a pool of
+    # this many worker processes (see
+    # pytsdl.parallel.ParallelBlockParser), then visited in order as
+    # usual. The pool is kept until close(), which must then be called
+    # (or the parser used in a `with` block) not to leak the worker
+    # processes.
+    def __init__(self, engine='native', cache_dir=None,
+                 cache_max_size=64 * 1024 * 1024, stats=False,
+                 profile=False, lazy=False, block_cache_size=0,
+                 ast_workers=None, strict=True):
+        if engine not in Parser._engines:
+            raise ValueError('unknown parser engine: {}'.format(engine))
+
+        self._engine = engine
+        self._cache = None
+        self._block_cache = None
+        self._block_parser = None
+        self._collect_stats = stats or profile
+        self._profile = profile
+        self._lazy = lazy
+        self._strict = strict
+        self._stats = None
+        self._last_stats = None
+
+        if cache_dir is not None and strict:
+            import pytsdl.cache
+
+            self._cache = pytsdl.cache.DocCache(cache_dir, cache_max_size)
+
+        if block_cache_size and engine == 'native':
+            import pytsdl.cache
+
+            self._block_cache = pytsdl.cache.BlockCache(block_cache_size)
+
+        if ast_workers is not None and ast_workers > 1 and engine == 'native':
+            import pytsdl.parallel
+
+            self._block_parser = pytsdl.parallel.ParallelBlockParser(ast_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def block_cache(self):
+        return self._block_cache
+
+    @property
+    def ast_workers(self):
+        if self._block_parser is None:
+            return None
+
+        return self._block_parser.workers
+
+    # Stops the worker processes building ASTs, if any.
+    def close(self):
+        if self._block_parser is not None:
+            self._block_parser.close()
+
+    @property
+    def lazy(self):
+        return self._lazy
+
+    @property
+    def strict(self):
+        return self._strict
+
+    # statistics of the last parse (pytsdl.stats.ParseStats), or None
+    # if they're not enabled
+    @property
+    def stats(self):
+        return self._last_stats
+
+    # Calls `fn` with `args`, recording its statistics as one parse if
+    # they're enabled (and not already being recorded).
+    def _run(self, fn, *args):
+        if not self._collect_stats or self._stats is not None:
+            return fn(*args)
+
+        import pytsdl.stats
+
+        stats = pytsdl.stats.ParseStats()
+        self._stats = stats
+        profile = None
+
+        if self._profile:
+            import cProfile
+
+            profile = cProfile.Profile()
+
+        start = time.perf_counter()
+
         try:
-            ast = pypeg2.parse(tsdl, Top,
+            if profile is None:
+                return fn(*args)
+
+            return profile.runcall(fn, *args)
+        finally:
+            stats.total_time = time.perf_counter() - start
+            stats.profile = profile
+            self._stats = None
+            self._last_stats = stats
+
+    def _add_time(self, phase, start):
+        if self._stats is not None:
+            self._stats.add_time(phase, time.perf_counter() - start)
+
+    def _new_visitor(self):
+        if self._stats is None:
+            return _DocCreatorVisitor(self._lazy, self._strict)
+
+        return _InstrumentedDocCreatorVisitor(self._stats, self._lazy,
+                                              self._strict)
+
+    @staticmethod
+    def _get_ast_pypeg2(tsdl):
+        import pypeg2
+        import pytsdl.grammar
+
+        try:
+            ast = pypeg2.parse(tsdl, pytsdl.grammar.get_grammar(),
                                comment=[pypeg2.comment_c, pypeg2.comment_cpp])
         except (SyntaxError, Exception) as e:
             raise ParseError(str(e))
 
         return ast
 
+    def _get_ast(self, tsdl, line=1, col=1, memo=True):
+        stats = self._stats
+
+        if self._engine == 'pypeg2':
+            start = time.perf_counter()
+            ast = Parser._get_ast_pypeg2(tsdl)
+            self._add_time('parse', start)
+        else:
+            import pytsdl.rdparser
+
+            block_cache = self._block_cache if memo else None
+
+            if self._block_parser is not None and \
+                    len(tsdl) >= Parser._parallel_min_size:
+                start = time.perf_counter()
+                ast = self._block_parser.parse(tsdl, line, col, self._lazy,
+                                               block_cache)
+                self._add_time('parse', start)
+            else:
+                parser = pytsdl.rdparser.RecursiveDescentParser(stats,
+                                                                self._lazy,
+                                                                block_cache)
+                ast = parser.parse(tsdl, line, col)
+
+        if stats is not None:
+            stats.bytes += len(tsdl.encode())
+            stats.nodes += _count_nodes(ast)
+
+        return ast
+
+    # The block cache isn't used: the returned AST is not shared.
+    def get_ast(self, tsdl):
+        return self._get_ast(tsdl, memo=False)
+
     @staticmethod
     def _validate_magic(tsdl):
         if not tsdl.startswith('/* CTF 1.8'):
             raise ParseError('TSDL document must start with exactly "/* CTF 1.8"')
 
     def parse(self, tsdl):
+        return self._run(self._parse, tsdl)
+
+    def _parse(self, tsdl):
         Parser._validate_magic(tsdl)
-        ast = self.get_ast(tsdl)
-        visitor = _DocCreatorVisitor()
+
+        if self._cache is not None:
+            start = time.perf_counter()
+            doc = self._cache.get(tsdl)
+            self._add_time('cache', start)
+
+            if doc is not None:
+                return doc
+
+        ast = self._get_ast(tsdl)
+        visitor = self._new_visitor()
         ast.accept(visitor)
+        doc = visitor._doc
+
+        if self._cache is not None:
+            start = time.perf_counter()
+            self._cache.put(tsdl, doc)
+            self._add_time('cache', start)
+
+        return doc
+
+    # Parses a metadata stream (any object supporting the buffer
+    # protocol), either plain TSDL text or binary metadata packets (see
+    # pytsdl.metadata.MetadataReader). The UUID of the packets must be
+    # the UUID of the trace.
+    #
+    # Without a document cache, the text is parsed as it's decoded (see
+    # parse_stream()).
+    def parse_metadata(self, data):
+        return self._run(self._parse_metadata, data)
+
+    def _parse_metadata(self, data):
+        import pytsdl.metadata
+
+        reader = pytsdl.metadata.MetadataReader()
+
+        if self._cache is not None:
+            doc = self.parse(reader.read_text(data))
+        else:
+            doc = self.parse_stream(reader.text_chunks(data))
+
+        reader.validate_uuid(doc)
+
+        return doc
+
+    # Like parse_metadata(), but with a metadata file, which is mapped
+    # into memory.
+    def parse_metadata_file(self, path):
+        return self._run(self._parse_metadata_file, path)
+
+    def _parse_metadata_file(self, path):
+        import pytsdl.metadata
+
+        reader = pytsdl.metadata.MetadataReader()
+
+        if self._cache is not None:
+            doc = self.parse(reader.read_file(path))
+        else:
+            doc = self.parse_stream(reader.file_text_chunks(path))
+
+        reader.validate_uuid(doc)
+
+        return doc
+
+    # Parses a TSDL document read from `source`, a text or binary file
+    # object or an iterable of str or bytes chunks (bytes are UTF-8),
+    # one top-level block at a time: each block is split from the
+    # input as soon as it's complete, parsed, and visited into the
+    # document, after which its text and AST are dropped. Peak memory
+    # is thus about the AST of one block plus the resulting document,
+    # instead of the whole text plus its whole AST.
+    #
+    # The document cache, if any, is not used.
+    def parse_stream(self, source, chunk_size=64 * 1024):
+        return self._run(self._parse_stream, source, chunk_size)
+
+    def _parse_stream(self, source, chunk_size):
+        import pytsdl.lexer
+
+        visitor = self._new_visitor()
+        visitor.begin()
+        blocks = pytsdl.lexer.split_blocks(_text_chunks(source, chunk_size))
+        first = True
+
+        for block, line, col in blocks:
+            if first:
+                Parser._validate_magic(block)
+                first = False
+
+            visitor.add_entries(self._get_ast(block, line, col))
+
+        if first:
+            Parser._validate_magic('')
+
+        visitor.finish()
+
+        return visitor.doc
+
+    # Parses many documents (TSDL texts, metadata streams, or paths of
+    # metadata files) with a pool of worker processes, yielding their
+    # documents or errors (see pytsdl.parallel.parse_many()).
+    #
+    # Identical inputs are only parsed once when they are close to each
+    # other (within about twice as many inputs as workers).
+    #
+    # Statistics are not recorded.
+    def parse_many(self, sources, workers=None, ordered=True):
+        import pytsdl.parallel
+
+        return pytsdl.parallel.parse_many(self, sources, workers, ordered)
+
+    # Parses `appended_tsdl`, TSDL text appended to the one from which
+    # `doc` was parsed (e.g. the growing metadata stream of a live
+    # LTTng session), and extends `doc` in place with its new top-level
+    # blocks (see _DocCreatorVisitor.extend()). Only the appended text
+    # is parsed, so the cost of an update is proportional to its size.
+    #
+    # `appended_tsdl` must contain complete top-level blocks.
+    def parse_incremental(self, doc, appended_tsdl):
+        return self._run(self._parse_incremental, doc, appended_tsdl)
+
+    def _parse_incremental(self, doc, appended_tsdl):
+        ast = self._get_ast(appended_tsdl)
+        self._new_visitor().extend(doc, ast)
 
-        return visitor._doc
+        return doc
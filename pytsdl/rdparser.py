@@ -0,0 +1,744 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import time
+import pytsdl.lexer
+from pytsdl.parser import (
+    ParseError,
+    LiteralString,
+    ConstDecInteger,
+    ConstOctInteger,
+    ConstHexInteger,
+    ConstInteger,
+    ConstNumber,
+    Identifier,
+    PostfixExpr,
+    UnaryExpr,
+    UnaryExprSubscript,
+    ValueAssignment,
+    Integer,
+    FloatingPoint,
+    String,
+    Type,
+    TypeAlias,
+    EnumeratorValue,
+    ConstNumberRange,
+    EnumeratorRange,
+    Enumerator,
+    Enumerators,
+    EnumName,
+    Enum,
+    Dot,
+    Arrow,
+    TypeField,
+    IdentifierField,
+    StructVariantEntries,
+    StructRef,
+    StructAlign,
+    StructFull,
+    VariantTag,
+    VariantRef,
+    VariantFull,
+    TypeAssignment,
+    DeferredType,
+    Env,
+    Trace,
+    Clock,
+    Stream,
+    Event,
+    Top,
+)
+
+
+_top_level_scopes = {
+    'env': Env,
+    'trace': Trace,
+    'clock': Clock,
+    'stream': Stream,
+    'event': Event,
+}
+
+
+_type_keywords = frozenset([
+    'struct',
+    'variant',
+    'enum',
+    'integer',
+    'floating_point',
+    'string',
+])
+
+
+# Single-pass recursive descent parser building the very same AST as
+# the pyPEG2 grammar of pytsdl.grammar.
+#
+# The document is tokenized once and each grammar rule only looks at
+# the current token (sometimes the next one) to decide what to do, so
+# the parsing time is linear in the size of the document.
+#
+# `line` and `col` are the position of the first character of `tsdl`
+# within the whole document (when parsing one block of it at a time),
+# for error messages.
+#
+# With `stats` (pytsdl.stats.ParseStats), the tokenization and parsing
+# times are recorded.
+#
+# With `lazy`, the types assigned within event blocks are not parsed
+# (see _top_blocks()).
+#
+# With `memo` (pytsdl.cache.BlockCache), the AST of each top-level
+# block is looked up by its text before parsing it, and put to `memo`
+# afterwards (except lazily parsed event blocks, whose types are text
+# spans of their document).
+class RecursiveDescentParser:
+    def __init__(self, stats=None, lazy=False, memo=None):
+        self._stats = stats
+        self._lazy = lazy
+        self._memo = memo
+        self._tokenize_time = 0
+
+    def parse(self, tsdl, line=1, col=1):
+        self._text = tsdl
+        self._line = line
+        self._col = col
+        self._tokenize_time = 0
+        start = time.perf_counter()
+
+        try:
+            if self._lazy or self._memo is not None:
+                # tokenized while parsing
+                return self._top_blocks()
+
+            self._tokenize(0, len(tsdl))
+
+            return self._top()
+        finally:
+            self._text = None
+            self._tokens = None
+
+            if self._stats is not None:
+                elapsed = time.perf_counter() - start
+                self._stats.add_time('tokenize', self._tokenize_time)
+                self._stats.add_time('parse', elapsed - self._tokenize_time)
+
+    # Parses the type `tsdl[pos:end]` (see DeferredType), returning the
+    # same node as the type of a TypeAssignment.
+    def parse_type(self, tsdl, pos, end, line=1, col=1):
+        self._text = tsdl
+        self._line = line
+        self._col = col
+
+        try:
+            self._tokenize(pos, end)
+            t = self._type()
+            self._expect('eof')
+
+            return t.value
+        finally:
+            self._text = None
+            self._tokens = None
+
+    def _tokenize(self, pos, end):
+        if self._stats is not None:
+            start = time.perf_counter()
+
+        try:
+            self._tokens = list(pytsdl.lexer.tokenize(self._text, pos, end))
+        except pytsdl.lexer.LexError as e:
+            self._raise(str(e), e.pos)
+
+        self._i = 0
+
+        if self._stats is not None:
+            self._tokenize_time += time.perf_counter() - start
+
+    def _raise(self, msg, pos):
+        line, col = pytsdl.lexer.line_col(self._text, pos)
+
+        if line == 1:
+            col += self._col - 1
+
+        line += self._line - 1
+
+        raise ParseError('{}:{}: {}'.format(line, col, msg))
+
+    def _cur(self):
+        return self._tokens[self._i]
+
+    def _peek_kind(self, offset=1):
+        return self._tokens[self._i + offset].kind
+
+    def _next(self):
+        tok = self._tokens[self._i]
+        self._i += 1
+
+        return tok
+
+    def _accept(self, kind):
+        if self._tokens[self._i].kind == kind:
+            self._i += 1
+
+            return True
+
+        return False
+
+    def _expect(self, kind):
+        tok = self._tokens[self._i]
+
+        if tok.kind != kind:
+            self._unexpected(repr(kind))
+
+        self._i += 1
+
+        return tok
+
+    def _unexpected(self, expected):
+        tok = self._cur()
+
+        if tok.kind == 'eof':
+            got = 'end of document'
+        else:
+            got = repr(tok.value)
+
+        self._raise('expecting {}, got {}'.format(expected, got), tok.pos)
+
+    def _identifier(self):
+        return Identifier(self._expect('id').value)
+
+    @staticmethod
+    def _const_integer_from_str(s):
+        if s.startswith(('0x', '0X')):
+            integer = ConstHexInteger(s[2:])
+        elif len(s) > 1 and s[0] == '0':
+            try:
+                integer = ConstOctInteger(s[1:])
+            except ValueError:
+                # what the pyPEG2 grammar falls back to
+                integer = ConstDecInteger(s)
+        else:
+            integer = ConstDecInteger(s)
+
+        return ConstInteger(integer)
+
+    def _const_integer(self):
+        return self._const_integer_from_str(self._expect('num').value)
+
+    def _const_number(self):
+        args = []
+        kind = self._cur().kind
+
+        if kind == '-' or kind == '+':
+            args.append(self._next().value)
+
+        args.append(self._const_integer())
+
+        return ConstNumber(args)
+
+    def _literal_string(self):
+        return LiteralString(self._expect('str').value)
+
+    def _postfix_expr(self):
+        elements = [self._identifier()]
+
+        while True:
+            kind = self._cur().kind
+
+            if kind == '.':
+                self._i += 1
+                elements.append(Dot())
+                elements.append(self._identifier())
+            elif kind == '->':
+                self._i += 1
+                elements.append(Arrow())
+                elements.append(self._identifier())
+            elif kind == '[':
+                elements.append(self._unary_expr_subscript())
+            else:
+                break
+
+        return PostfixExpr(elements)
+
+    def _unary_expr(self):
+        kind = self._cur().kind
+
+        if kind == 'id':
+            expr = self._postfix_expr()
+        elif kind == 'num' or kind == '-' or kind == '+':
+            expr = self._const_number()
+        elif kind == 'str':
+            expr = self._literal_string()
+        elif kind == '(':
+            self._i += 1
+            expr = self._unary_expr()
+            self._expect(')')
+        else:
+            self._unexpected('unary expression')
+
+        return UnaryExpr(expr)
+
+    def _unary_expr_subscript(self):
+        self._expect('[')
+        expr = self._unary_expr()
+        self._expect(']')
+
+        return UnaryExprSubscript(expr)
+
+    def _value_assignment(self):
+        key = self._identifier()
+        self._expect('=')
+
+        return ValueAssignment([key, self._unary_expr()])
+
+    def _value_assignments(self):
+        self._expect('{')
+        assignments = []
+
+        while True:
+            assignments.append(self._value_assignment())
+            self._expect(';')
+
+            if self._accept('}'):
+                return assignments
+
+    def _integer(self):
+        self._expect('integer')
+
+        return Integer(self._value_assignments())
+
+    def _floating_point(self):
+        self._expect('floating_point')
+
+        return FloatingPoint(self._value_assignments())
+
+    def _string(self):
+        self._expect('string')
+
+        if not self._accept('{'):
+            return String()
+
+        encoding = self._value_assignment()
+        self._expect(';')
+        self._expect('}')
+
+        return String(encoding)
+
+    def _enumerator(self):
+        kind = self._cur().kind
+
+        if kind == 'id':
+            key = self._identifier()
+        elif kind == 'str':
+            key = self._literal_string()
+        else:
+            self._unexpected('enumerator')
+
+        if not self._accept('='):
+            return Enumerator(key)
+
+        kind = self._cur().kind
+
+        if kind == '-' or kind == '+':
+            low = self._const_number()
+        else:
+            low = self._const_integer()
+
+        if self._accept('...'):
+            if type(low) is not ConstNumber:
+                low = ConstNumber([low])
+
+            high = self._const_number()
+            rng = ConstNumberRange([low, high])
+
+            return Enumerator(EnumeratorRange([key, rng]))
+
+        return Enumerator(EnumeratorValue([key, low]))
+
+    def _enum(self):
+        self._expect('enum')
+        args = []
+
+        if self._cur().kind == 'id':
+            args.append(EnumName(self._identifier()))
+
+        self._expect(':')
+
+        if self._cur().kind == 'integer':
+            args.append(self._integer())
+        else:
+            args.append(self._identifier())
+
+            while self._cur().kind == 'id':
+                args.append(self._identifier())
+
+        self._expect('{')
+        items = [self._enumerator()]
+
+        while self._accept(','):
+            if self._cur().kind == '}':
+                break
+
+            items.append(self._enumerator())
+
+        self._expect('}')
+        args.append(Enumerators(items))
+
+        return Enum(args)
+
+    def _struct(self):
+        self._expect('struct')
+        args = []
+
+        if self._cur().kind == 'id':
+            args.append(self._identifier())
+
+        if self._cur().kind != '{':
+            if not args:
+                self._unexpected("'{'")
+
+            return StructRef(args[0])
+
+        args.append(StructVariantEntries(self._struct_variant_entries()))
+
+        tok = self._cur()
+
+        if tok.kind == 'id' and tok.value == 'align' and \
+                self._peek_kind() == '(':
+            self._i += 2
+            align = self._const_integer()
+            self._expect(')')
+            args.append(StructAlign(align))
+
+        return StructFull(args)
+
+    def _variant_tag(self):
+        self._expect('<')
+        expr = self._unary_expr()
+        self._expect('>')
+
+        return VariantTag(expr)
+
+    def _variant(self):
+        self._expect('variant')
+        args = []
+
+        if self._cur().kind == 'id':
+            args.append(self._identifier())
+
+        if self._cur().kind == '<':
+            args.append(self._variant_tag())
+
+        if self._cur().kind != '{':
+            if len(args) != 2:
+                self._unexpected("'{'")
+
+            return VariantRef(args)
+
+        args.append(StructVariantEntries(self._struct_variant_entries()))
+
+        return VariantFull(args)
+
+    def _type(self):
+        kind = self._cur().kind
+
+        if kind == 'struct':
+            t = self._struct()
+        elif kind == 'variant':
+            t = self._variant()
+        elif kind == 'enum':
+            t = self._enum()
+        elif kind == 'integer':
+            t = self._integer()
+        elif kind == 'floating_point':
+            t = self._floating_point()
+        elif kind == 'string':
+            t = self._string()
+        else:
+            self._unexpected('type')
+
+        return Type(t)
+
+    def _type_alias(self):
+        self._expect('typealias')
+        args = [self._type()]
+        self._expect(':=')
+        args.append(self._identifier())
+
+        while self._cur().kind == 'id':
+            args.append(self._identifier())
+
+        return TypeAlias(args)
+
+    def _subscripts(self, args):
+        while self._cur().kind == '[':
+            args.append(self._unary_expr_subscript())
+
+    def _struct_variant_entry(self):
+        kind = self._cur().kind
+
+        if kind == 'typealias':
+            return self._type_alias()
+
+        if kind in _type_keywords:
+            t = self._type()
+
+            if self._cur().kind == 'id':
+                args = [t, self._identifier()]
+                self._subscripts(args)
+
+                return TypeField(args)
+
+            if type(t.value) is StructFull or type(t.value) is VariantFull:
+                return t.value
+
+            self._unexpected('field name')
+
+        if kind == 'id':
+            args = [self._identifier()]
+
+            while self._cur().kind == 'id':
+                args.append(self._identifier())
+
+            self._subscripts(args)
+
+            return IdentifierField(args)
+
+        self._unexpected('field, type alias, structure or variant')
+
+    def _struct_variant_entries(self):
+        self._expect('{')
+        entries = []
+
+        while not self._accept('}'):
+            entries.append(self._struct_variant_entry())
+            self._expect(';')
+
+        return entries
+
+    def _scope_entry(self):
+        kind = self._cur().kind
+
+        if kind == 'typealias':
+            return self._type_alias()
+
+        if kind == 'struct':
+            t = self._type().value
+
+            if type(t) is not StructFull:
+                self._unexpected("'{'")
+
+            return t
+
+        if kind == 'variant':
+            t = self._type().value
+
+            if type(t) is not VariantFull:
+                self._unexpected("'{'")
+
+            return t
+
+        if kind == 'id' and self._peek_kind() == '=':
+            return self._value_assignment()
+
+        key = self._unary_expr()
+        self._expect(':=')
+
+        return TypeAssignment([key, self._type()])
+
+    def _top_level_scope(self, scope_cls):
+        self._i += 1
+        self._expect('{')
+        entries = []
+
+        while not self._accept('}'):
+            entries.append(self._scope_entry())
+            self._expect(';')
+
+        return scope_cls(entries)
+
+    def _top_entry(self):
+        tok = self._cur()
+        kind = tok.kind
+
+        if kind == 'id' and tok.value in _top_level_scopes and \
+                self._peek_kind() == '{':
+            return self._top_level_scope(_top_level_scopes[tok.value])
+
+        if kind == 'typealias':
+            return self._type_alias()
+
+        if kind == 'struct' or kind == 'variant':
+            return self._scope_entry()
+
+        self._unexpected('top-level block')
+
+    def _top(self):
+        entries = []
+
+        while self._cur().kind != 'eof':
+            entries.append(self._top_entry())
+            self._expect(';')
+
+        return Top(entries)
+
+    # Same as _top(), but one top-level block at a time: the document is
+    # tokenized block by block, and the AST of each block is looked up
+    # in the memo first, if any.
+    #
+    # When lazy, the types assigned within event blocks are kept as text
+    # spans (see DeferredType), without tokenizing them: only the
+    # entries of event blocks which aren't type assignments are parsed
+    # completely.
+    def _top_blocks(self):
+        text = self._text
+        end = len(text)
+        entries = []
+        pos = 0
+
+        while True:
+            block_end = pytsdl.lexer.find_entry_end(text, pos, end)
+
+            if block_end < end:
+                # include the terminating ';' (or unexpected '}')
+                block_end += 1
+
+            entry = None
+
+            if self._lazy:
+                try:
+                    entry = self._lazy_event(pos, block_end)
+                except pytsdl.lexer.LexError as e:
+                    self._raise(str(e), e.pos)
+
+            if entry is None:
+                entry = self._block(pos, block_end)
+
+                if entry is None:
+                    break
+
+            entries.append(entry)
+            pos = block_end
+
+        return Top(entries)
+
+    # Parses the top-level block `text[pos:end]` (with its terminating
+    # ';'), or gets its AST from the memo. Returns None if there's only
+    # whitespace and comments.
+    def _block(self, pos, end):
+        memo = self._memo
+
+        if memo is not None:
+            key = self._text[pos:end].strip()
+            entry = memo.get(key)
+
+            if entry is not None:
+                return entry
+
+        self._tokenize(pos, end)
+
+        if self._cur().kind == 'eof':
+            return None
+
+        entry = self._top_entry()
+        self._expect(';')
+        self._expect('eof')
+
+        if memo is not None:
+            memo.put(key, entry)
+
+        return entry
+
+    # Parses the event block `text[pos:end]` (with its terminating ';'),
+    # keeping its assigned types as text spans. Returns None if it's not
+    # an event block, or if it has a syntax error (for the caller to
+    # parse it completely and report it).
+    def _lazy_event(self, pos, end):
+        text = self._text
+        tokens = pytsdl.lexer.tokenize(text, pos, end)
+        tok = next(tokens)
+
+        if tok.kind != 'id' or tok.value != 'event':
+            return None
+
+        tok = next(tokens)
+
+        if tok.kind != '{':
+            return None
+
+        entries = []
+        pos = tok.pos + 1
+
+        while True:
+            entry_end = pytsdl.lexer.find_entry_end(text, pos, end)
+
+            if entry_end == end:
+                return None
+
+            tokens = pytsdl.lexer.tokenize(text, pos, entry_end)
+            first = next(tokens)
+
+            if first.kind == 'eof':
+                break
+
+            if text[entry_end] != ';':
+                return None
+
+            if first.kind == 'id':
+                second = next(tokens)
+            else:
+                second = first
+
+            if first.kind != 'id' or second.kind == '=':
+                # not a type assignment
+                self._tokenize(pos, entry_end + 1)
+                entries.append(self._scope_entry())
+                self._expect(';')
+                self._expect('eof')
+                pos = entry_end + 1
+                continue
+
+            key_tokens = [first, second]
+
+            while key_tokens[-1].kind != ':=':
+                if key_tokens[-1].kind == 'eof':
+                    return None
+
+                key_tokens.append(next(tokens))
+
+            type_pos = key_tokens[-1].pos + 2
+            key_tokens.append(pytsdl.lexer.Token('eof', None, type_pos))
+            self._tokens = key_tokens
+            self._i = 0
+            key = self._unary_expr()
+            self._expect(':=')
+            self._expect('eof')
+            deferred = DeferredType(text, type_pos, entry_end, self._line,
+                                    self._col)
+            entries.append(TypeAssignment([key, Type(deferred)]))
+            pos = entry_end + 1
+
+        if text[entry_end] != '}':
+            return None
+
+        self._tokenize(entry_end + 1, end)
+        self._expect(';')
+        self._expect('eof')
+
+        return Event(entries)
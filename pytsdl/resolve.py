@@ -0,0 +1,291 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import pytsdl.tsdl
+
+
+# Resolution of variant tags and sequence lengths.
+#
+# A variant tag or a sequence length is a path to an integer or
+# enumeration field which is decoded before the variant or sequence,
+# either absolute (starting with a scope prefix, e.g.
+# stream.event.header.id) or relative (looked up in the enclosing
+# structures, innermost first). Resolving it once the document is
+# complete validates it and sets a pytsdl.tsdl.FieldRef on the variant
+# (Variant.tag_ref) or sequence (Sequence.length_ref), so that decoders
+# find the decoded value without walking the scopes for each record.
+#
+# Types may be shared by several fields (aliases, named structures): a
+# path which resolves to different fields depending on where the type
+# is used is validated for each use, but its reference is False, in
+# which case decoders fall back to looking up the path.
+#
+# When not strict, an invalid path doesn't raise ResolveError: its
+# reference is also False, so that decoders report the error when
+# decoding the variant or sequence.
+
+
+# scope prefixes of absolute paths and the corresponding scope names,
+# in decoding order
+scope_paths = [
+    (('trace', 'packet', 'header'), 'trace.packet.header'),
+    (('stream', 'packet', 'context'), 'stream.packet.context'),
+    (('stream', 'event', 'header'), 'stream.event.header'),
+    (('stream', 'event', 'context'), 'stream.event.context'),
+    (('event', 'context'), 'event.context'),
+    (('event', 'fields'), 'event.fields'),
+]
+
+
+_scope_order = {scope_name: i for i, (prefix, scope_name)
+                in enumerate(scope_paths)}
+
+
+class ResolveError(RuntimeError):
+    def __init__(self, str):
+        super().__init__(str)
+
+
+# Returns the type of the field at `path` within the structure `t`, or
+# None. With `limit`, the first field of the path must be one of the
+# first `limit` fields of `t` (the ones decoded before).
+def _walk(t, path, limit=None):
+    for name in path:
+        if type(t) is not pytsdl.tsdl.Struct or name not in t.fields:
+            return None
+
+        if limit is not None:
+            if list(t.fields).index(name) >= limit:
+                return None
+
+            limit = None
+
+        t = t.fields[name]
+
+    return t
+
+
+class _Resolver:
+    # `scopes` maps the names of the scopes decoded up to the current
+    # one (`scope_name`) to their types.
+    def __init__(self, scopes, scope_name, strict=True):
+        self._scopes = scopes
+        self._scope_name = scope_name
+        self._strict = strict
+
+        # enclosing structures: [structure, index of the current field]
+        self._frames = []
+
+    def _find(self, path):
+        for prefix, scope_name in scope_paths:
+            if tuple(path[0:len(prefix)]) != prefix:
+                continue
+
+            root = self._scopes.get(scope_name)
+            limit = None
+
+            if root is None:
+                return None
+
+            if _scope_order[scope_name] > _scope_order[self._scope_name]:
+                # decoded later
+                return None
+
+            if scope_name == self._scope_name:
+                # scope currently being decoded
+                if not self._frames or self._frames[0][0] is not root:
+                    return None
+
+                limit = self._frames[0][1]
+
+            rest = tuple(path[len(prefix):])
+            t = _walk(root, rest, limit)
+
+            if t is None:
+                return None
+
+            return pytsdl.tsdl.FieldRef(scope_name, None, rest, t)
+
+        # relative path: innermost structure first
+        for level, (struct, index) in enumerate(reversed(self._frames)):
+            t = _walk(struct, path, index)
+
+            if t is not None:
+                return pytsdl.tsdl.FieldRef(None, level, tuple(path), t)
+
+        return None
+
+    def _resolve_path(self, path):
+        ref = self._find(path)
+
+        if ref is None:
+            raise ResolveError('cannot find field: {}'.format('.'.join(path)))
+
+        return ref
+
+    @staticmethod
+    def _merge_ref(old, ref):
+        if old is None:
+            return ref
+
+        if old is False or old != ref:
+            return False
+
+        return old
+
+    # Returns fn(t), or False if it raises ResolveError and this
+    # resolver isn't strict.
+    def _lenient(self, fn, t):
+        try:
+            return fn(t)
+        except ResolveError:
+            if self._strict:
+                raise
+
+            return False
+
+    def _tag_ref(self, t):
+        if t.tag is None:
+            raise ResolveError('variant has no tag')
+
+        ref = self._resolve_path(t.tag)
+
+        if type(ref.type) is not pytsdl.tsdl.Enum:
+            path = '.'.join(t.tag)
+            msg = 'variant tag is not an enumeration: {}'
+            raise ResolveError(msg.format(path))
+
+        return ref
+
+    def _length_ref(self, t):
+        ref = self._resolve_path(t.length)
+
+        if type(ref.type) not in (pytsdl.tsdl.Integer, pytsdl.tsdl.Enum):
+            path = '.'.join(t.length)
+            msg = 'sequence length is not an integer: {}'
+            raise ResolveError(msg.format(path))
+
+        return ref
+
+    def _resolve_variant(self, t):
+        ref = self._lenient(self._tag_ref, t)
+        ref = _Resolver._merge_ref(t.tag_ref, ref)
+
+        if ref is not t.tag_ref:
+            t.tag_ref = ref
+
+        for ft in t.fields.values():
+            self.resolve(ft)
+
+    def _resolve_sequence(self, t):
+        ref = self._lenient(self._length_ref, t)
+        ref = _Resolver._merge_ref(t.length_ref, ref)
+
+        if ref is not t.length_ref:
+            t.length_ref = ref
+
+        self.resolve(t.element)
+
+    def resolve(self, t):
+        tt = type(t)
+
+        if tt is pytsdl.tsdl.Struct:
+            frame = [t, 0]
+            self._frames.append(frame)
+
+            for ft in t.fields.values():
+                self.resolve(ft)
+                frame[1] += 1
+
+            self._frames.pop()
+        elif tt is pytsdl.tsdl.Variant:
+            self._resolve_variant(t)
+        elif tt is pytsdl.tsdl.Sequence:
+            self._resolve_sequence(t)
+        elif tt is pytsdl.tsdl.Array:
+            self.resolve(t.element)
+
+
+# Resolves the scopes named `scope_names`, `scopes` mapping the names of
+# all the scopes decoded up to the last one to their types.
+def _resolve_scopes(scopes, scope_names, strict):
+    for scope_name in scope_names:
+        t = scopes.get(scope_name)
+
+        if t is not None:
+            _Resolver(scopes, scope_name, strict).resolve(t)
+
+
+def _trace_scopes(trace):
+    scopes = {}
+
+    if trace is not None:
+        scopes['trace.packet.header'] = trace.packet_header
+
+    return scopes
+
+
+def _stream_scopes(trace, stream):
+    scopes = _trace_scopes(trace)
+    scopes['stream.packet.context'] = stream.packet_context
+    scopes['stream.event.header'] = stream.event_header
+    scopes['stream.event.context'] = stream.event_context
+
+    return scopes
+
+
+# Resolves the variant tags and sequence lengths of the packet header
+# of `trace`.
+def resolve_trace(trace, strict=True):
+    _resolve_scopes(_trace_scopes(trace), ['trace.packet.header'], strict)
+
+
+# Resolves the variant tags and sequence lengths of the scopes of
+# `stream` (not including the ones of its events), `trace` being the
+# trace of its document (may be None).
+def resolve_stream(trace, stream, strict=True):
+    _resolve_scopes(_stream_scopes(trace, stream), [
+        'stream.packet.context',
+        'stream.event.header',
+        'stream.event.context',
+    ], strict)
+
+
+# Resolves the variant tags and sequence lengths of the scopes of
+# `events`, which belong to `stream`.
+def resolve_events(trace, stream, events, strict=True):
+    scopes = _stream_scopes(trace, stream)
+
+    for event in events:
+        scopes['event.context'] = event.context
+        scopes['event.fields'] = event.fields
+        _resolve_scopes(scopes, ['event.context', 'event.fields'], strict)
+
+
+# Resolves the variant tags and sequence lengths of all the scopes of a
+# document.
+def resolve(doc, strict=True):
+    resolve_trace(doc.trace, strict)
+
+    for stream in doc.streams.values():
+        resolve_stream(doc.trace, stream, strict)
+        resolve_events(doc.trace, stream, stream.events, strict)
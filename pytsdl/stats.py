@@ -0,0 +1,165 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import collections
+
+
+# Statistics of the visit of one top-level block: `kind` is the name of
+# its AST node class (e.g. 'Event', 'TypeAlias'), `name` is its name,
+# ID or alias name when it has one (None otherwise), and `time` is the
+# time spent creating its objects (seconds).
+BlockStats = collections.namedtuple('BlockStats', ['kind', 'name', 'time'])
+
+
+# Statistics of a parse (see pytsdl.parser.Parser(stats=True)).
+#
+# Phases (wall time, in seconds, accumulated over the whole parse):
+#
+#   * 'cache': document cache lookup and store
+#   * 'tokenize': tokenization (native engine)
+#   * 'parse': grammar matching, building the AST
+#   * 'visit': creating the objects of the top-level blocks, including
+#     alias, structure and variant resolution
+#   * 'check': duplicate event validation
+#   * 'byte_order': native byte order resolution
+#   * 'intern': interning of identical scalar types
+#   * 'resolve': variant tag and sequence length resolution
+#   * 'layout': layout analysis
+#   * 'events_dict': initialization of the streams' events dicts
+class ParseStats:
+    def __init__(self):
+        self._phases = collections.OrderedDict()
+        self._total_time = 0
+        self._bytes = 0
+        self._nodes = 0
+        self._lookups = 0
+        self._max_scope_depth = 0
+        self._blocks = []
+        self._profile = None
+
+    # phase name -> wall time (seconds)
+    @property
+    def phases(self):
+        return self._phases
+
+    def add_time(self, phase, seconds):
+        self._phases[phase] = self._phases.get(phase, 0) + seconds
+
+    # wall time of the whole parse (seconds)
+    @property
+    def total_time(self):
+        return self._total_time
+
+    @total_time.setter
+    def total_time(self, value):
+        self._total_time = value
+
+    # size of the parsed TSDL text (UTF-8 bytes)
+    @property
+    def bytes(self):
+        return self._bytes
+
+    @bytes.setter
+    def bytes(self, value):
+        self._bytes = value
+
+    # number of AST nodes created
+    @property
+    def nodes(self):
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, value):
+        self._nodes = value
+
+    # number of alias, structure and variant lookups
+    @property
+    def lookups(self):
+        return self._lookups
+
+    def add_lookup(self):
+        self._lookups += 1
+
+    # maximum depth of nested scopes
+    @property
+    def max_scope_depth(self):
+        return self._max_scope_depth
+
+    def add_scope_depth(self, depth):
+        if depth > self._max_scope_depth:
+            self._max_scope_depth = depth
+
+    # BlockStats of each top-level block, in document order
+    @property
+    def blocks(self):
+        return self._blocks
+
+    def add_block(self, kind, name, seconds):
+        self._blocks.append(BlockStats(kind, name, seconds))
+
+    # cProfile.Profile of the parse (see pytsdl.parser.Parser(profile=True))
+    @property
+    def profile(self):
+        return self._profile
+
+    @profile.setter
+    def profile(self, value):
+        self._profile = value
+
+    # Writes the profile of the parse to `path`, in the format of
+    # cProfile (readable by pstats, snakeviz, etc.).
+    def dump_profile(self, path):
+        if self._profile is None:
+            raise ValueError('no profile was recorded (see Parser(profile=True))')
+
+        self._profile.dump_stats(path)
+
+    def slowest_blocks(self, count=10):
+        return sorted(self._blocks, key=lambda b: b.time,
+                      reverse=True)[:count]
+
+    # Returns a human-readable report.
+    def report(self, count=10):
+        lines = [
+            'total: {:.6f} s, {} bytes, {} AST nodes'.format(self._total_time,
+                                                             self._bytes,
+                                                             self._nodes),
+            'lookups: {}, max scope depth: {}'.format(self._lookups,
+                                                      self._max_scope_depth),
+            'phases:',
+        ]
+
+        for phase, seconds in self._phases.items():
+            lines.append('  {:>12}: {:.6f} s'.format(phase, seconds))
+
+        if self._blocks:
+            lines.append('slowest of {} blocks:'.format(len(self._blocks)))
+
+            for block in self.slowest_blocks(count):
+                name = ''
+
+                if block.name is not None:
+                    name = ' {}'.format(block.name)
+
+                lines.append('  {:.6f} s  {}{}'.format(block.time,
+                                                       block.kind, name))
+
+        return '\n'.join(lines)
@@ -20,6 +20,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 import collections
+import bisect
 import enum
 
 
@@ -37,8 +38,50 @@ class Encoding(enum.Enum):
     ASCII = 2
 
 
-class Integer:
+# Returns the values of the initialized slots of an object, in the
+# format expected by pickle and copy.
+def _slots_state(obj, names):
+    state = {}
+
+    for name in names:
+        if hasattr(obj, name):
+            state[name] = getattr(obj, name)
+
+    return state
+
+
+# Base of all the field types. `layout` is set by the layout analysis
+# (see pytsdl.layout) once the document is complete.
+class _Type:
+    __slots__ = (
+        '_layout',
+    )
+
     def __init__(self):
+        self._layout = None
+
+    @property
+    def layout(self):
+        return self._layout
+
+    @layout.setter
+    def layout(self, value):
+        self._layout = value
+
+
+class Integer(_Type):
+    __slots__ = (
+        '_signed',
+        '_byte_order',
+        '_base',
+        '_encoding',
+        '_align',
+        '_map',
+        '_size',
+    )
+
+    def __init__(self):
+        super().__init__()
         self._signed = False
         self._byte_order = ByteOrder.NATIVE
         self._base = 10
@@ -104,8 +147,16 @@ class Integer:
         self._map = value
 
 
-class FloatingPoint:
+class FloatingPoint(_Type):
+    __slots__ = (
+        '_exp_dig',
+        '_mant_dig',
+        '_align',
+        '_byte_order',
+    )
+
     def __init__(self):
+        super().__init__()
         self._exp_dig = None
         self._mant_dig = None
         self._align = None
@@ -144,9 +195,136 @@ class FloatingPoint:
         self._align = value
 
 
-class Enum:
+# Labels of an enumeration (label -> (low, high) value range, in label
+# order). `version` is incremented by each change, so that the interval
+# index of the enumeration (see Enum._get_index()) knows when it's
+# outdated.
+class _EnumLabels(collections.OrderedDict):
+    __slots__ = (
+        'version',
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.version = 0
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def __ior__(self, other):
+        self.update(other)
+
+        return self
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+
+        return self[key]
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self.version += 1
+
+        return value
+
+    def popitem(self, last=True):
+        item = super().popitem(last)
+        self.version += 1
+
+        return item
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+    def move_to_end(self, key, last=True):
+        super().move_to_end(key, last)
+        self.version += 1
+
+
+# Interval index of the labels of an enumeration.
+#
+# The value ranges of the labels are split into sorted, disjoint
+# segments, each one knowing all the labels of which the range contains
+# it (in label order), so that a lookup is a binary search. Values of
+# single-value labels are also in a dict, which is the common case.
+class _EnumIndex:
+    __slots__ = (
+        'version',
+        'starts',
+        'ends',
+        'labels',
+        'points',
+    )
+
+    def __init__(self, labels):
+        self.version = labels.version
+        items = list(labels.items())
+        bounds = set()
+
+        for label, (low, high) in items:
+            bounds.add(low)
+            bounds.add(high + 1)
+
+        bounds = sorted(bounds)
+        self.starts = []
+        self.ends = []
+        self.labels = []
+
+        # labels of each elementary segment [bounds[i], bounds[i + 1])
+        seg_labels = [[] for i in range(len(bounds))]
+
+        for label, (low, high) in items:
+            i = bisect.bisect_left(bounds, low)
+
+            while bounds[i] <= high:
+                seg_labels[i].append(label)
+                i += 1
+
+        for i in range(len(bounds) - 1):
+            if not seg_labels[i]:
+                continue
+
+            self.starts.append(bounds[i])
+            self.ends.append(bounds[i + 1] - 1)
+            self.labels.append(tuple(seg_labels[i]))
+
+        self.points = {}
+
+        for label, (low, high) in items:
+            if low == high and low not in self.points:
+                self.points[low] = self.all_labels_of(low)[0]
+
+    def all_labels_of(self, value):
+        i = bisect.bisect_right(self.starts, value) - 1
+
+        if i < 0 or value > self.ends[i]:
+            return ()
+
+        return self.labels[i]
+
+
+class Enum(_Type):
+    __slots__ = (
+        '_integer',
+        '_labels',
+        '_index',
+    )
+
     def __init__(self):
-        self._labels = collections.OrderedDict()
+        super().__init__()
+        self._labels = _EnumLabels()
+        self._index = None
 
     @property
     def integer(self):
@@ -162,15 +340,72 @@ class Enum:
 
     @labels.setter
     def labels(self, value):
-        self._labels = value
+        self._labels = _EnumLabels(value)
+        self._index = None
 
     def value_of(self, label):
         return self._labels[label]
 
+    # the index is outdated once the labels change
+    def _get_index(self):
+        index = self._index
+
+        if index is None or index.version != self._labels.version:
+            index = _EnumIndex(self._labels)
+            self._index = index
+
+        return index
+
+    # first label (in label order) of which the range contains `value`,
+    # or None
     def label_of(self, value):
-        for label, vrange in self._labels.items():
-            if value >= vrange[0] and value <= vrange[1]:
-                return label
+        index = self._get_index()
+        label = index.points.get(value)
+
+        if label is not None:
+            return label
+
+        labels = index.all_labels_of(value)
+
+        if labels:
+            return labels[0]
+
+        return None
+
+    # all the labels of which the range contains `value`, in label order
+    def all_labels_of(self, value):
+        return list(self._get_index().all_labels_of(value))
+
+    # label_of() for each value of a sequence (list result) or of a
+    # NumPy array or scalar (NumPy object array result of the same
+    # shape)
+    def labels_of(self, values):
+        if not hasattr(values, 'dtype'):
+            label_of = self.label_of
+
+            return [label_of(v) for v in values]
+
+        import numpy
+
+        index = self._get_index()
+        shape = numpy.shape(values)
+
+        if not index.starts:
+            return numpy.full(shape, None, dtype=object)
+
+        firsts = numpy.array([labels[0] for labels in index.labels] + [None],
+                             dtype=object)
+
+        values = numpy.atleast_1d(values)
+        starts = numpy.array(index.starts)
+        ends = numpy.array(index.ends)
+        i = numpy.searchsorted(starts, values, side='right') - 1
+        found = i >= 0
+        i[~found] = 0
+        found &= values <= ends[i]
+        i[~found] = len(index.labels)
+
+        return firsts[i].reshape(shape)
 
     def __getitem__(self, key):
         if type(key) is str:
@@ -181,8 +416,13 @@ class Enum:
         raise TypeError('wrong subscript type')
 
 
-class String:
+class String(_Type):
+    __slots__ = (
+        '_encoding',
+    )
+
     def __init__(self):
+        super().__init__()
         self._encoding = Encoding.NONE
 
     @property
@@ -194,9 +434,14 @@ class String:
         self._encoding = value
 
 
-class _ArraySequence:
+class _ArraySequence(_Type):
+    __slots__ = (
+        '_element',
+        '_length',
+    )
+
     def __init__(self):
-        pass
+        super().__init__()
 
     @property
     def element(self):
@@ -216,15 +461,81 @@ class _ArraySequence:
 
 
 class Array(_ArraySequence):
-    pass
+    __slots__ = ()
 
 
 class Sequence(_ArraySequence):
-    pass
+    __slots__ = (
+        '_length_ref',
+    )
 
+    def __init__(self):
+        super().__init__()
+        self._length_ref = None
+
+    # resolved length (FieldRef, see pytsdl.resolve), None if not
+    # resolved yet, or False if it resolves to different fields
+    # depending on where this sequence is used
+    @property
+    def length_ref(self):
+        return self._length_ref
+
+    @length_ref.setter
+    def length_ref(self, value):
+        self._length_ref = value
+
+
+# Resolved variant tag or sequence length (see pytsdl.resolve): the
+# field of type `type` at `path` (field names) within the scope named
+# `scope` (e.g. 'stream.event.header'), or, if `scope` is None, within
+# the structure enclosing the variant or sequence `level` levels up (0
+# being the innermost one).
+class FieldRef:
+    __slots__ = (
+        '_scope',
+        '_level',
+        '_path',
+        '_type',
+    )
+
+    def __init__(self, scope, level, path, type):
+        self._scope = scope
+        self._level = level
+        self._path = path
+        self._type = type
+
+    @property
+    def scope(self):
+        return self._scope
+
+    @property
+    def level(self):
+        return self._level
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def type(self):
+        return self._type
+
+    def __eq__(self, other):
+        return (type(other) is FieldRef and self._scope == other._scope and
+                self._level == other._level and self._path == other._path and
+                self._type is other._type)
+
+    def __hash__(self):
+        return hash((self._scope, self._level, self._path))
+
+
+class _StructVariant(_Type):
+    __slots__ = (
+        '_fields',
+    )
 
-class _StructVariant:
     def __init__(self):
+        super().__init__()
         self._fields = collections.OrderedDict()
 
     @property
@@ -236,6 +547,10 @@ class _StructVariant:
 
 
 class Struct(_StructVariant):
+    __slots__ = (
+        '_align',
+    )
+
     def __init__(self):
         self._align = None
         super().__init__()
@@ -250,8 +565,20 @@ class Struct(_StructVariant):
 
 
 class Variant(_StructVariant):
+    __slots__ = (
+        '_tag',
+        '_tag_ref',
+        '_selector',
+    )
+
+    # field_of() maps each value of the tag to a field directly when
+    # the tag enumeration has at most this number of values
+    _MAX_SELECTOR_VALUES = 4096
+
     def __init__(self):
         self._tag = None
+        self._tag_ref = None
+        self._selector = None
         super().__init__()
 
     @property
@@ -262,8 +589,71 @@ class Variant(_StructVariant):
     def tag(self, value):
         self._tag = value
 
+    # resolved tag (FieldRef, see pytsdl.resolve), None if not resolved
+    # yet, or False if it resolves to different fields depending on
+    # where this variant is used
+    @property
+    def tag_ref(self):
+        return self._tag_ref
+
+    @tag_ref.setter
+    def tag_ref(self, value):
+        self._tag_ref = value
+        self._selector = None
+
+    # tag value -> field, or False if there are too many values
+    def _make_selector(self):
+        labels = self._tag_ref.type.labels
+        nvalues = 0
+
+        for start, end in labels.values():
+            nvalues += end - start + 1
+
+        if nvalues > Variant._MAX_SELECTOR_VALUES:
+            return False
+
+        selector = {}
+
+        # the first label containing a value wins (see Enum.label_of())
+        for label, (start, end) in labels.items():
+            ft = self._fields.get(label)
+
+            for value in range(start, end + 1):
+                selector.setdefault(value, ft)
+
+        return selector
+
+    # Returns the field selected by the tag value `value`, or None if
+    # there's none. The tag must be resolved (see tag_ref).
+    #
+    # The selector is outdated once the labels of the tag enumeration
+    # change (see Enum._get_index()).
+    def field_of(self, value):
+        labels = self._tag_ref.type.labels
+        cached = self._selector
+
+        if cached is None or cached[0] is not labels or \
+                cached[1] != labels.version:
+            cached = (labels, labels.version, self._make_selector())
+            self._selector = cached
+
+        selector = cached[2]
+
+        if selector is not False:
+            return selector.get(value)
+
+        return self._fields.get(self._tag_ref.type.label_of(value))
+
 
 class Trace:
+    __slots__ = (
+        '_major',
+        '_minor',
+        '_uuid',
+        '_byte_order',
+        '_packet_header',
+    )
+
     def __init__(self):
         self._major = None
         self._minor = None
@@ -317,6 +707,17 @@ class Env(dict):
 
 
 class Clock:
+    __slots__ = (
+        '_name',
+        '_uuid',
+        '_description',
+        '_freq',
+        '_precision',
+        '_offset_s',
+        '_offset',
+        '_absolute',
+    )
+
     def __init__(self):
         self._name = None
         self._uuid = None
@@ -391,14 +792,39 @@ class Clock:
     def absolute(self, value):
         self._absolute = value
 
+    # converts a value of this clock (cycles) to nanoseconds from the
+    # clock's origin (the Epoch for LTTng's monotonic clock offsets)
+    def cycles_to_ns(self, cycles):
+        offset_s = self._offset_s or 0
+        cycles += self._offset or 0
+
+        if self._freq == 1000000000:
+            return offset_s * 1000000000 + cycles
+
+        return offset_s * 1000000000 + cycles * 1000000000 // self._freq
+
 
 class Event:
+    __slots__ = (
+        '_id',
+        '_name',
+        '_stream_id',
+        '_loglevel',
+        '_context',
+        '_fields',
+        '_builder',
+        '_compiled',
+    )
+
     def __init__(self):
         self._id = None
         self._name = None
+        self._stream_id = None
         self._loglevel = None
         self._context = None
         self._fields = None
+        self._builder = None
+        self._compiled = None
 
     @property
     def id(self):
@@ -416,6 +842,14 @@ class Event:
     def name(self, value):
         self._name = value
 
+    @property
+    def stream_id(self):
+        return self._stream_id
+
+    @stream_id.setter
+    def stream_id(self, value):
+        self._stream_id = value
+
     @property
     def loglevel(self):
         return self._loglevel
@@ -426,41 +860,169 @@ class Event:
 
     @property
     def context(self):
+        if self._builder is not None:
+            self.build()
+
         return self._context
 
     @context.setter
     def context(self, value):
+        if self._builder is not None:
+            self.build()
+
         self._context = value
 
     @property
     def fields(self):
+        if self._builder is not None:
+            self.build()
+
         return self._fields
 
     @fields.setter
     def fields(self, value):
+        if self._builder is not None:
+            self.build()
+
         self._fields = value
 
+    # Function called with this event to build its context and fields
+    # the first time either is accessed (see the `lazy` parameter of
+    # pytsdl.parser.Parser), or None if they're already built.
+    @property
+    def builder(self):
+        return self._builder
+
+    @builder.setter
+    def builder(self, value):
+        self._builder = value
+
+    # Builds the context and fields of this event now if they're not
+    # built yet. On error, the event is left unbuilt.
+    def build(self):
+        builder = self._builder
+
+        if builder is None:
+            return
+
+        self._builder = None
+
+        try:
+            builder(self)
+        except:
+            self._context = None
+            self._fields = None
+            self._builder = builder
+            raise
+
+    # generated decoding functions (see pytsdl.codegen) are not
+    # picklable; they are generated again when needed (a lazily parsed
+    # event is built first)
+    def __getstate__(self):
+        self.build()
+        state = _slots_state(self, Event.__slots__)
+        state['_compiled'] = None
+
+        return None, state
+
     def __getitem__(self, key):
-        if type(self.fields) is _StructVariant:
-            return self.fields[key]
+        fields = self.fields
+
+        if isinstance(fields, _StructVariant):
+            return fields[key]
 
-        raise TypeError('{} is not subscriptable')
+        msg = 'fields of event {} are not subscriptable'.format(self._name)
+        raise TypeError(msg)
 
 
 class Stream:
+    __slots__ = (
+        '_id',
+        '_packet_context',
+        '_event_header',
+        '_event_context',
+        '_events',
+        '_events_by_id',
+        '_events_by_name',
+        '_compiled_header',
+    )
+
     def __init__(self):
         self._id = 0
         self._packet_context = None
         self._event_header = None
         self._event_context = None
         self._events = []
+        self._events_by_id = []
+        self._events_by_name = {}
+        self._compiled_header = None
+
+    def __getstate__(self):
+        state = _slots_state(self, Stream.__slots__)
+        state['_compiled_header'] = None
+
+        return None, state
+
+    # Event IDs are looked up in a list indexed by ID (None for unused
+    # IDs) while they're dense enough, that is, while the list is at
+    # most this number of times the number of events (plus some slack
+    # for small streams); otherwise in a dict.
+    _MAX_ID_TABLE_RATIO = 2
+    _ID_TABLE_SLACK = 64
 
     def init_events_dict(self):
-        self._events_dict = {}
+        self._events_by_id = []
+        self._events_by_name = {}
+        self.update_events_dict(self._events)
+
+    # Adds events (already part of this stream's events) to the event
+    # indexes without rebuilding them.
+    def update_events_dict(self, events):
+        by_id = self._events_by_id
+        by_name = self._events_by_name
+
+        for ev in events:
+            by_name[ev.name] = ev
+
+        if type(by_id) is list:
+            max_id = -1
+
+            for ev in events:
+                if type(ev.id) is not int or ev.id < 0:
+                    max_id = None
+                    break
+
+                max_id = max(max_id, ev.id)
+
+            max_size = len(by_name) * Stream._MAX_ID_TABLE_RATIO + \
+                Stream._ID_TABLE_SLACK
+
+            if max_id is not None and max_id < max_size:
+                if max_id >= len(by_id):
+                    by_id.extend([None] * (max_id + 1 - len(by_id)))
+
+                for ev in events:
+                    by_id[ev.id] = ev
 
-        for ev in self._events:
-            self._events_dict[ev.id] = ev
-            self._events_dict[ev.name] = ev
+                return
+
+            # too sparse: switch to a dict
+            by_id = {ev.id: ev for ev in by_id if ev is not None}
+            self._events_by_id = by_id
+
+        for ev in events:
+            by_id[ev.id] = ev
+
+    def has_event(self, idname):
+        if type(idname) is str:
+            return idname in self._events_by_name
+
+        try:
+            self.get_event_by_id(idname)
+        except KeyError:
+            return False
+
+        return True
 
     @property
     def id(self):
@@ -502,17 +1064,79 @@ class Stream:
     def events(self, value):
         self._events = value
 
+    # Returns the event with ID or name `idname`; raises KeyError if
+    # there's none.
     def get_event(self, idname):
-        return self._events_dict[idname]
+        if type(idname) is str:
+            return self._events_by_name[idname]
+
+        return self.get_event_by_id(idname)
+
+    # Returns the event with ID `id`; raises KeyError if there's none.
+    def get_event_by_id(self, id):
+        try:
+            event = self._events_by_id[id]
+        except (IndexError, TypeError):
+            # not an ID of the ID list
+            raise KeyError(id) from None
+
+        if event is None or id < 0:
+            # unused ID, or negative index of the ID list
+            if type(self._events_by_id) is list:
+                raise KeyError(id)
+
+        return event
+
+    # Returns the event named `name`; raises KeyError if there's none.
+    def get_event_by_name(self, name):
+        return self._events_by_name[name]
+
+    # Returns the list of the events with the IDs of `ids` (any iterable
+    # of integers, for example a NumPy array); raises KeyError if one of
+    # them is unknown.
+    def get_events_by_id(self, ids):
+        if hasattr(ids, 'tolist'):
+            ids = ids.tolist()
+        else:
+            ids = list(ids)
+
+        by_id = self._events_by_id
+
+        try:
+            events = [by_id[id] for id in ids]
+        except (IndexError, KeyError, TypeError):
+            pass
+        else:
+            if type(by_id) is dict:
+                return events
+
+            # unused IDs and negative indexes of the ID list
+            if None not in events and (not ids or min(ids) >= 0):
+                return events
+
+        # raise KeyError for the first unknown ID
+        return [self.get_event_by_id(id) for id in ids]
 
 
 class Doc:
+    __slots__ = (
+        '_trace',
+        '_env',
+        '_clocks',
+        '_streams',
+        '_parse_state',
+    )
+
     def __init__(self):
         self._trace = None
         self._env = None
         self._clocks = collections.OrderedDict()
         self._streams = collections.OrderedDict()
 
+        # what the parser needs to extend this document later (see
+        # pytsdl.parser.Parser.parse_incremental())
+        self._parse_state = None
+
     @property
     def trace(self):
         return self._trace
@@ -544,3 +1168,11 @@ class Doc:
     @streams.setter
     def streams(self, value):
         self._streams = value
+
+    @property
+    def parse_state(self):
+        return self._parse_state
+
+    @parse_state.setter
+    def parse_state(self, value):
+        self._parse_state = value
@@ -44,6 +44,11 @@ install_requires = [
 ]
 
 
+extras_require = {
+    'columnar': ['numpy'],
+}
+
+
 setup(name='pytsdl',
       version='0.9.2',
       description='TSDL parser implemented entirely in Python 3',
@@ -53,4 +58,5 @@ setup(name='pytsdl',
       keywords='tsdl ctf metadata',
       url='https://github.com/efficios/pytsdl',
       packages=packages,
-      install_requires=install_requires)
+      install_requires=install_requires,
+      extras_require=extras_require)
@@ -0,0 +1,109 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2014 Philippe Proulx <philippe.proulx@efficios.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import unittest
+import tempfile
+import struct
+import os
+import pytsdl.parser
+import pytsdl.index
+
+
+_METADATA = '''/* CTF 1.8 */
+typealias integer { size = 32; align = 8; signed = false; } := uint32_t;
+typealias integer { size = 64; align = 8; signed = false; } := uint64_t;
+typealias integer { size = 64; align = 8; signed = true; } := int64_t;
+trace {
+    major = 1;
+    minor = 8;
+    byte_order = le;
+    packet.header := struct { uint32_t magic; };
+};
+clock { name = c; freq = 1000000000; };
+stream {
+    packet.context := struct {
+        uint64_t content_size;
+        uint64_t packet_size;
+        int64_t timestamp_begin;
+        int64_t timestamp_end;
+        int64_t cpu_id;
+    };
+    event.header := struct { uint32_t id; };
+};
+event { name = "e"; id = 0; fields := struct { uint32_t x; }; };
+'''
+
+
+# packets without events, with signed timestamps and CPU IDs
+def _make_stream(timestamps):
+    packets = []
+
+    for begin, end in timestamps:
+        size = struct.calcsize('<IQQqqq') * 8
+        packets.append(struct.pack('<IQQqqq', 0xc1fc1fc1, size, size, begin,
+                                   end, -1))
+
+    return b''.join(packets)
+
+
+class PacketIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self._doc = pytsdl.parser.Parser().parse(_METADATA)
+
+    def test_signed_context(self):
+        timestamps = [(-3000, -2000), (-1000, 5)]
+        data = _make_stream(timestamps)
+        index = pytsdl.index.PacketIndex.build(self._doc, data)
+
+        self.assertEqual([(e.timestamp_begin, e.timestamp_end)
+                          for e in index], timestamps)
+        self.assertEqual([e.cpu_id for e in index], [-1, -1])
+        self.assertIsNone(index[0].events_discarded)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index')
+            index.save(path)
+            loaded = pytsdl.index.PacketIndex.load(path)
+
+        self.assertEqual(loaded.entries, index.entries)
+        self.assertEqual(loaded.data_size, len(data))
+        self.assertEqual(loaded.find(-1500), 1)
+
+    def test_value_range(self):
+        entry = pytsdl.index.PacketIndexEntry(0, 64, 64, None,
+                                              -(1 << 63), (1 << 64) - 1,
+                                              None, 0)
+        index = pytsdl.index.PacketIndex([entry])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index')
+            index.save(path)
+            self.assertEqual(pytsdl.index.PacketIndex.load(path).entries,
+                             [entry])
+
+            entry = entry._replace(timestamp_end=1 << 64)
+
+            with self.assertRaises(ValueError):
+                pytsdl.index.PacketIndex([entry]).save(path)
+
+
+if __name__ == '__main__':
+    unittest.main()